@@ -0,0 +1,316 @@
+"""
+Measures the client-side overhead of lnd_grpc's wrappers against an in-process fake
+lnd (see fake_lnd.py): calls per second, p50/p99 latency and Python allocations per
+call, single-threaded and with concurrent callers.
+
+    python benchmarks/bench.py --output before.json
+    ... change something ...
+    python benchmarks/bench.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grpc
+
+import lnd_grpc
+import lnd_grpc.protos.rpc_pb2 as ln
+from lnd_grpc import bolt11
+from lnd_grpc.protos import descriptor_set
+from lnd_grpc.raw import RawMessage
+from benchmarks.fake_lnd import PAY_REQ, FakeLnd
+
+UNARY = "unary"
+SERVER_STREAMING = "server_streaming"
+BIDIRECTIONAL = "bidirectional"
+
+
+def payment_batch(client, size: int):
+    def run():
+        session = client.payment_session()
+        payments = [
+            session.send(ln.SendRequest(payment_hash=n.to_bytes(32, "big"), amt=1000))
+            for n in range(1, size + 1)
+        ]
+        session.close()
+        for payment in payments:
+            payment.result()
+
+    return run
+
+
+def benchmarks(fake: FakeLnd, client, loop_client) -> list:
+    """
+    :return: list of (name, kind, messages per operation, operation)
+    """
+    n = fake.stream_length
+    preimage = b"\x02" * 32
+    return [
+        ("get_info", UNARY, 1, client.get_info),
+        ("wallet_balance", UNARY, 1, client.wallet_balance),
+        ("add_invoice", UNARY, 1, lambda: client.add_invoice(value=1000)),
+        ("lookup_invoice", UNARY, 1, lambda: client.lookup_invoice(r_hash=preimage)),
+        ("list_channels", UNARY, 1, client.list_channels),
+        ("describe_graph", UNARY, 1, client.describe_graph),
+        ("describe_graph_raw", UNARY, 1, lambda: client.describe_graph(raw=True)),
+        (
+            "describe_graph_raw_aliases",
+            UNARY,
+            1,
+            lambda: [
+                node.alias
+                for node in RawMessage(
+                    client.describe_graph(raw=True), ln.ChannelGraph
+                ).nodes
+            ],
+        ),
+        ("export_all_channel_backups", UNARY, 1, client.export_all_channel_backups),
+        (
+            "export_all_channel_backups_raw",
+            UNARY,
+            1,
+            lambda: client.export_all_channel_backups(raw=True),
+        ),
+        # decoded locally, then served from the decoder's memo
+        ("decode_pay_req", UNARY, 1, lambda: client.decode_pay_req(PAY_REQ)),
+        ("bolt11_decode", UNARY, 1, lambda: bolt11.decode(PAY_REQ, "regtest")),
+        (
+            "send_payment_sync",
+            UNARY,
+            1,
+            lambda: client.send_payment_sync(payment_hash=preimage, amt=1000),
+        ),
+        (
+            "add_hold_invoice",
+            UNARY,
+            1,
+            lambda: client.add_hold_invoice(hash=preimage, value=1000),
+        ),
+        ("loop_out_terms", UNARY, 1, loop_client.loop_out_terms),
+        ("loop_out_quote", UNARY, 1, lambda: loop_client.loop_out_quote(amt=250000)),
+        (
+            "subscribe_invoices",
+            SERVER_STREAMING,
+            n,
+            lambda: sum(1 for _ in client.subscribe_invoices()),
+        ),
+        (
+            "subscribe_transactions",
+            SERVER_STREAMING,
+            n,
+            lambda: sum(1 for _ in client.subscribe_transactions()),
+        ),
+        (
+            "subscribe_single_invoice",
+            SERVER_STREAMING,
+            3,
+            lambda: sum(1 for _ in client.subscribe_single_invoice(preimage)),
+        ),
+        (
+            "loop_monitor",
+            SERVER_STREAMING,
+            n,
+            lambda: sum(1 for _ in loop_client.monitor()),
+        ),
+        ("payment_session", BIDIRECTIONAL, n, payment_batch(client, n)),
+    ]
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def timed_loop(operation, deadline: float, min_calls: int) -> list:
+    latencies = []
+    while len(latencies) < min_calls or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def measure(operation, threads: int, duration: float, min_calls: int) -> dict:
+    for _ in range(min(10, min_calls)):
+        operation()
+    started = time.perf_counter()
+    deadline = started + duration
+    if threads == 1:
+        latencies = timed_loop(operation, deadline, min_calls)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            runs = [
+                executor.submit(timed_loop, operation, deadline, min_calls // threads)
+                for _ in range(threads)
+            ]
+            latencies = [latency for run in runs for latency in run.result()]
+    elapsed = time.perf_counter() - started
+    return {
+        "calls": len(latencies),
+        "seconds": elapsed,
+        "calls_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+    }
+
+
+def measure_allocations(operation, calls: int) -> dict:
+    """
+    :return: Python memory allocated at peak and retained per call, as traced by
+    tracemalloc on every thread (gRPC's C core is not traced)
+    """
+    for _ in range(10):
+        operation()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        peaks = []
+        for _ in range(calls):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            operation()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc_peak_bytes": statistics.median(peaks),
+        "alloc_retained_bytes": max(0, after - before) / calls,
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    installed = descriptor_set.installed()
+    return {
+        "commit": commit or None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "grpc": grpc.__version__,
+        "protobuf_backend": lnd_grpc.protobuf_backend(),
+        "descriptor_set": installed.path if installed else None,
+    }
+
+
+def run(args) -> dict:
+    results = []
+    with FakeLnd(stream_length=args.stream_length) as fake:
+        client = fake.client()
+        loop_client = fake.loop_client()
+        for name, kind, messages, operation in benchmarks(fake, client, loop_client):
+            if args.filter and not any(f in name for f in args.filter):
+                continue
+            allocations = measure_allocations(operation, args.alloc_calls)
+            for threads in sorted(set([1] + args.threads)):
+                result = measure(operation, threads, args.duration, args.min_calls)
+                result.update(
+                    name=name,
+                    kind=kind,
+                    threads=threads,
+                    messages_per_call=messages,
+                    messages_per_sec=result["calls_per_sec"] * messages,
+                    **allocations
+                )
+                results.append(result)
+                report(result)
+    return {"environment": environment(), "args": vars(args), "results": results}
+
+
+def report(result: dict):
+    print(
+        "%-30s %-17s %3d thr %9.1f calls/s  p50 %8.3f ms  p99 %8.3f ms  "
+        "%8.0f B/call"
+        % (
+            result["name"],
+            result["kind"],
+            result["threads"],
+            result["calls_per_sec"],
+            result["p50_ms"],
+            result["p99_ms"],
+            result["alloc_peak_bytes"],
+        )
+    )
+
+
+def compare(results: dict, baseline: dict):
+    """
+    Print the change in throughput and p99 latency of each benchmark from baseline
+    """
+    previous = {(r["name"], r["threads"]): r for r in baseline["results"]}
+    print(
+        "\ncompared to %s (%s):"
+        % (baseline["environment"].get("commit"), baseline["environment"]["timestamp"])
+    )
+    for result in results["results"]:
+        before = previous.get((result["name"], result["threads"]))
+        if before is None:
+            continue
+        print(
+            "%-30s %3d thr  calls/s %+7.1f%%  p99 %+7.1f%%"
+            % (
+                result["name"],
+                result["threads"],
+                100 * (result["calls_per_sec"] / before["calls_per_sec"] - 1),
+                100 * (result["p99_ms"] / before["p99_ms"] - 1),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per run")
+    parser.add_argument(
+        "--min-calls", type=int, default=20, help="minimum calls per run"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="*",
+        default=[8],
+        help="concurrent callers, in addition to a single-threaded run",
+    )
+    parser.add_argument(
+        "--alloc-calls", type=int, default=50, help="calls traced for allocations"
+    )
+    parser.add_argument(
+        "--stream-length", type=int, default=100, help="messages per stream"
+    )
+    parser.add_argument(
+        "--filter", nargs="*", help="only run benchmarks whose name contains these"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+An in-process gRPC server standing in for lnd and loopd, answering every call with a
+canned response, so that the client's own overhead can be measured without lnd or
+bitcoind.
+"""
+
+import hashlib
+import os
+import tempfile
+from concurrent import futures
+from pathlib import Path
+
+import grpc
+
+import lnd_grpc
+import lnd_grpc.protos.invoices_pb2 as inv
+import lnd_grpc.protos.invoices_pb2_grpc as invrpc
+import lnd_grpc.protos.rpc_pb2 as ln
+import lnd_grpc.protos.rpc_pb2_grpc as lnrpc
+from loop_rpc import LoopClient
+from loop_rpc.protos import loop_client_pb2 as loop, loop_client_pb2_grpc as looprpc
+
+TEST_UTILS = Path(__file__).resolve().parent.parent / "tests" / "test_utils"
+TLS_CERT_PATH = str(TEST_UTILS / "test-tls.cert")
+TLS_KEY_PATH = str(TEST_UTILS / "test-tls.key")
+
+PUBKEY = "02" + "11" * 32
+
+# a real, signed regtest payment request for 1000 sat with payment hash aa...aa, which
+# the client can decode locally
+PAY_REQ = (
+    "lnbcrt10u1pw0hdsqpp5424242424242424242424242424242424242424242424242424qdq8veskkeg"
+    "xqrrsscqzpgme0xsalnwq88hreyz4t602jk4husvl5zd09sd760ynfufu649xws9d5g6yzd9d7jhc5u58"
+    "glv9zwph6x9xc37pkwtl3u89y5yj3gxvqqqup0ep"
+)
+
+
+def pubkey(n: int) -> str:
+    return "02%064x" % n
+
+
+def routing_policy(n: int) -> ln.RoutingPolicy:
+    return ln.RoutingPolicy(
+        time_lock_delta=40,
+        min_htlc=1000,
+        fee_base_msat=1000 + n,
+        fee_rate_milli_msat=1,
+        max_htlc_msat=10 ** 9,
+    )
+
+
+def channel_graph(nodes: int, edges: int) -> ln.ChannelGraph:
+    """
+    :return: a ChannelGraph of nodes nodes joined in a ring by edges channels
+    """
+    return ln.ChannelGraph(
+        nodes=[
+            ln.LightningNode(
+                pub_key=pubkey(i),
+                alias="node-%d" % i,
+                addresses=[ln.NodeAddress(network="tcp", addr="10.0.0.%d:9735" % i)],
+            )
+            for i in range(nodes)
+        ],
+        edges=[
+            ln.ChannelEdge(
+                channel_id=1000 + i,
+                chan_point="%064x:0" % i,
+                node1_pub=pubkey(i % nodes),
+                node2_pub=pubkey((i + 1) % nodes),
+                capacity=10 ** 6,
+                node1_policy=routing_policy(i),
+                node2_policy=routing_policy(i + 1),
+            )
+            for i in range(edges)
+        ],
+    )
+
+
+def channel_backups(channels: int) -> ln.ChanBackupSnapshot:
+    points = [
+        ln.ChannelPoint(funding_txid_bytes=i.to_bytes(32, "big"), output_index=0)
+        for i in range(channels)
+    ]
+    return ln.ChanBackupSnapshot(
+        single_chan_backups=ln.ChannelBackups(
+            chan_backups=[
+                ln.ChannelBackup(chan_point=point, chan_backup=os.urandom(512))
+                for point in points
+            ]
+        ),
+        multi_chan_backup=ln.MultiChanBackup(
+            chan_points=points, multi_chan_backup=os.urandom(512 * channels)
+        ),
+    )
+
+
+def invoice(n: int, state=ln.Invoice.OPEN) -> ln.Invoice:
+    preimage = n.to_bytes(32, "big")
+    return ln.Invoice(
+        memo="invoice %d" % n,
+        r_preimage=preimage,
+        r_hash=hashlib.sha256(preimage).digest(),
+        value=1000,
+        creation_date=1560000000 + n,
+        payment_request="lnbcrt10u1fake%d" % n,
+        expiry=3600,
+        cltv_expiry=40,
+        add_index=n,
+        state=state,
+    )
+
+
+class FakeLightning(lnrpc.LightningServicer):
+    def __init__(self, fake):
+        self.fake = fake
+
+    def GetInfo(self, request, context):
+        return ln.GetInfoResponse(
+            identity_pubkey=PUBKEY,
+            alias="fake-lnd",
+            num_active_channels=len(self.fake.channels.channels),
+            num_peers=3,
+            block_height=600000,
+            block_hash="00" * 32,
+            synced_to_chain=True,
+            chains=[ln.Chain(chain="bitcoin", network="regtest")],
+            version="0.7.1-beta commit=fake",
+        )
+
+    def WalletBalance(self, request, context):
+        return ln.WalletBalanceResponse(
+            total_balance=10 ** 8, confirmed_balance=10 ** 8
+        )
+
+    def AddInvoice(self, request, context):
+        return ln.AddInvoiceResponse(
+            r_hash=hashlib.sha256(request.r_preimage or os.urandom(32)).digest(),
+            payment_request=PAY_REQ,
+            add_index=1,
+        )
+
+    def LookupInvoice(self, request, context):
+        return self.fake.invoice
+
+    def ListChannels(self, request, context):
+        return self.fake.channels
+
+    def DescribeGraph(self, request, context):
+        return self.fake.graph
+
+    def ExportAllChannelBackups(self, request, context):
+        return self.fake.backups
+
+    def DecodePayReq(self, request, context):
+        return ln.PayReq(
+            destination=PUBKEY,
+            payment_hash="aa" * 32,
+            num_satoshis=1000,
+            timestamp=1560000000,
+            expiry=3600,
+            description="fake",
+            cltv_expiry=40,
+        )
+
+    def SendPaymentSync(self, request, context):
+        return ln.SendResponse(
+            payment_preimage=b"\x01" * 32,
+            payment_hash=request.payment_hash,
+            payment_route=ln.Route(total_amt=1000),
+        )
+
+    def SendPayment(self, request_iterator, context):
+        for request in request_iterator:
+            yield ln.SendResponse(
+                payment_preimage=b"\x01" * 32, payment_hash=request.payment_hash
+            )
+
+    def SubscribeInvoices(self, request, context):
+        for n in range(1, self.fake.stream_length + 1):
+            yield invoice(n)
+
+    def SubscribeTransactions(self, request, context):
+        for n in range(self.fake.stream_length):
+            yield ln.Transaction(tx_hash="%064x" % n, amount=1000, num_confirmations=1)
+
+
+class FakeInvoices(invrpc.InvoicesServicer):
+    def __init__(self, fake):
+        self.fake = fake
+
+    def AddHoldInvoice(self, request, context):
+        return inv.AddHoldInvoiceResp(payment_request="lnbcrt10u1fakehold")
+
+    def SettleInvoice(self, request, context):
+        return inv.SettleInvoiceResp()
+
+    def CancelInvoice(self, request, context):
+        return inv.CancelInvoiceResp()
+
+    def SubscribeSingleInvoice(self, request, context):
+        for state in (ln.Invoice.OPEN, ln.Invoice.ACCEPTED, ln.Invoice.SETTLED):
+            yield invoice(1, state)
+
+
+class FakeSwapClient(looprpc.SwapClientServicer):
+    def __init__(self, fake):
+        self.fake = fake
+
+    def LoopOutTerms(self, request, context):
+        return loop.TermsResponse(
+            swap_payment_dest=PUBKEY,
+            swap_fee_base=1000,
+            swap_fee_rate=100,
+            prepay_amt=1337,
+            min_swap_amount=250000,
+            max_swap_amount=10 ** 7,
+            cltv_delta=144,
+        )
+
+    def LoopOutQuote(self, request, context):
+        return loop.QuoteResponse(swap_fee=1250, prepay_amt=1337, miner_fee=5000)
+
+    def Monitor(self, request, context):
+        for n in range(self.fake.stream_length):
+            yield loop.SwapStatus(
+                amt=250000,
+                id="%064x" % n,
+                state=loop.SUCCESS,
+                initiation_time=1560000000,
+            )
+
+
+class FakeLnd:
+    """
+    Serves the Lightning and Invoices services over TLS, and the SwapClient service
+    without TLS on a second port, from one in-process server.
+
+    Streaming calls send stream_length messages and then end. Clients for the server
+    are built by client() and loop_client().
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 16,
+        stream_length: int = 100,
+        channels: int = 50,
+        graph_nodes: int = 1000,
+        graph_edges: int = 4000,
+    ):
+        self.stream_length = stream_length
+        self.invoice = invoice(1, ln.Invoice.SETTLED)
+        self.channels = ln.ListChannelsResponse(
+            channels=[
+                ln.Channel(
+                    active=True,
+                    remote_pubkey=pubkey(i),
+                    channel_point="%064x:0" % i,
+                    chan_id=1000 + i,
+                    capacity=10 ** 6,
+                    local_balance=5 * 10 ** 5,
+                    remote_balance=5 * 10 ** 5,
+                )
+                for i in range(channels)
+            ]
+        )
+        self.graph = channel_graph(graph_nodes, graph_edges)
+        self.backups = channel_backups(channels)
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+        lnrpc.add_LightningServicer_to_server(FakeLightning(self), self.server)
+        invrpc.add_InvoicesServicer_to_server(FakeInvoices(self), self.server)
+        looprpc.add_SwapClientServicer_to_server(FakeSwapClient(self), self.server)
+        with open(TLS_KEY_PATH, "rb") as key, open(TLS_CERT_PATH, "rb") as cert:
+            credentials = grpc.ssl_server_credentials([(key.read(), cert.read())])
+        self.port = self.server.add_secure_port("localhost:0", credentials)
+        self.loop_port = self.server.add_insecure_port("localhost:0")
+        self.lnd_dir = tempfile.mkdtemp(prefix="fake-lnd-")
+        self.macaroon_path = os.path.join(self.lnd_dir, "admin.macaroon")
+        with open(self.macaroon_path, "wb") as macaroon:
+            macaroon.write(b"fake macaroon")
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop(0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def client(self, **kwargs) -> lnd_grpc.Client:
+        return lnd_grpc.Client(
+            lnd_dir=self.lnd_dir,
+            macaroon_path=self.macaroon_path,
+            tls_cert_path=TLS_CERT_PATH,
+            grpc_host="localhost",
+            grpc_port=self.port,
+            network="regtest",
+            **kwargs
+        )
+
+    def loop_client(self) -> LoopClient:
+        return LoopClient(loop_host="localhost", loop_port=str(self.loop_port))
@@ -0,0 +1,114 @@
+"""
+Measures the cold-start cost of importing lnd_grpc: each statement is timed in a fresh
+interpreter, many times over, reporting the median and minimum wall time and the
+heaviest modules it loaded (from python -X importtime).
+
+    python benchmarks/import_time.py --output imports.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from bench import environment
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = [
+    ("import grpc", "import grpc"),
+    ("import lnd_grpc", "import lnd_grpc"),
+    ("lnd_grpc.Client", "import lnd_grpc; lnd_grpc.Client"),
+    ("lnd_grpc.Client()", "import lnd_grpc; lnd_grpc.Client(lnd_dir='/tmp')"),
+    (
+        "lnd_grpc.Client (set)",
+        "import os; os.environ['LND_GRPC_DESCRIPTOR_SET'] = '1'; "
+        "import lnd_grpc; lnd_grpc.Client",
+    ),
+    ("import lnd_grpc.bolt11", "import lnd_grpc.bolt11"),
+    ("import loop_rpc", "import loop_rpc"),
+]
+
+TIMER = (
+    "import time; _started = time.perf_counter(); %s; "
+    "print(time.perf_counter() - _started)"
+)
+
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def time_statement(statement: str, runs: int) -> list:
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", TIMER % statement],
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+            check=True,
+        ).stdout
+        times.append(float(output.split()[-1]))
+    return times
+
+
+def heaviest_modules(statement: str, count: int) -> list:
+    """
+    :return: the count top-level modules (as imported by the statement) with the
+    largest cumulative import time, as (module, milliseconds)
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        check=True,
+    ).stderr
+    modules = []
+    for self_us, cumulative_us, indent, module in IMPORTTIME.findall(stderr):
+        if not indent:
+            modules.append((module, int(cumulative_us) / 1000))
+    return sorted(modules, key=lambda m: m[1], reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=20, help="interpreters per case")
+    parser.add_argument(
+        "--top", type=int, default=5, help="heaviest modules to list per case"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for name, statement in STATEMENTS:
+        times = time_statement(statement, args.runs)
+        result = {
+            "name": name,
+            "statement": statement,
+            "median_ms": statistics.median(times) * 1000,
+            "min_ms": min(times) * 1000,
+            "heaviest_modules": heaviest_modules(statement, args.top),
+        }
+        results.append(result)
+        print(
+            "%-24s median %8.2f ms  min %8.2f ms  (%s)"
+            % (
+                name,
+                result["median_ms"],
+                result["min_ms"],
+                ", ".join("%s %.1f" % m for m in result["heaviest_modules"][:3]),
+            )
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"environment": environment(), "args": vars(args), "results": results},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
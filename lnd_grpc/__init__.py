@@ -1,3 +1,36 @@
-from lnd_grpc.lnd_grpc import *
+import importlib
 
 name = "lnd_grpc"
+
+# the clients are loaded on first access (PEP 562) rather than on import, as they pull
+# in grpc and the protobuf descriptors of every sub-system
+_LAZY_ATTRIBUTES = {
+    "BaseClient": "lnd_grpc.base_client",
+    "Client": "lnd_grpc.lnd_grpc",
+    "Invoices": "lnd_grpc.invoices",
+    "Lightning": "lnd_grpc.lightning",
+    "WalletUnlocker": "lnd_grpc.wallet_unlocker",
+    "protobuf_backend": "lnd_grpc.protos.descriptor_set",
+}
+
+__all__ = [
+    "BaseClient",
+    "WalletUnlocker",
+    "Lightning",
+    "Invoices",
+    "Client",
+    "protobuf_backend",
+]
+
+
+def __getattr__(attribute: str):
+    module = _LAZY_ATTRIBUTES.get(attribute)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, attribute))
+    value = getattr(importlib.import_module(module), attribute)
+    globals()[attribute] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
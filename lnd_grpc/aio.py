@@ -0,0 +1,859 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import grpc
+from grpc import aio
+
+import lnd_grpc.protos.rpc_pb2 as ln
+from lnd_grpc.bolt11 import Bolt11Error
+from lnd_grpc.channel_manager import ChannelManager, InFlightCalls
+from lnd_grpc.config import (
+    RESPONSE_CACHE_SIZE,
+    defaultNetwork,
+    defaultRPCHost,
+    defaultRPCPort,
+)
+from lnd_grpc.event_hub import AioEventHub
+from lnd_grpc.future_calls import AioFutureCalls
+from lnd_grpc.graph import AioGraphIndex
+from lnd_grpc.interceptors import ClientInterceptor
+from lnd_grpc.invoice_subscription import AioInvoiceSubscription
+from lnd_grpc.lnd_grpc import Client as SyncClient
+from lnd_grpc.pagination import AioPaginator
+from lnd_grpc.pathfinding import Pathfinder
+from lnd_grpc.response_cache import AioResponseCache, cached_call
+from lnd_grpc.snapshot import SNAPSHOT_CALLS, NodeSnapshot, make_snapshot
+
+# marks the end of the request or response stream
+_END = object()
+
+
+class _AioInFlightCalls:
+    """
+    Reports the calls made on a grpc.aio channel to an InFlightCalls
+    """
+
+    def __init__(self, calls: InFlightCalls):
+        self.calls = calls
+
+    async def _intercept(self, continuation, client_call_details, request):
+        self.calls.call_started(client_call_details.method)
+        try:
+            call = await continuation(client_call_details, request)
+        except BaseException:
+            self.calls.call_finished(None, None)
+            raise
+        call.add_done_callback(lambda _: self.calls.call_finished(None, None))
+        return call
+
+
+# grpc.aio files each interceptor under the first kind of call it intercepts, so one
+# is needed per kind
+class _AioUnaryUnaryInFlight(_AioInFlightCalls, aio.UnaryUnaryClientInterceptor):
+    intercept_unary_unary = _AioInFlightCalls._intercept
+
+
+class _AioUnaryStreamInFlight(_AioInFlightCalls, aio.UnaryStreamClientInterceptor):
+    intercept_unary_stream = _AioInFlightCalls._intercept
+
+
+class _AioStreamUnaryInFlight(_AioInFlightCalls, aio.StreamUnaryClientInterceptor):
+    intercept_stream_unary = _AioInFlightCalls._intercept
+
+
+class _AioStreamStreamInFlight(_AioInFlightCalls, aio.StreamStreamClientInterceptor):
+    intercept_stream_stream = _AioInFlightCalls._intercept
+
+
+class _AioClientInterceptor:
+    """
+    Reports the calls made on a grpc.aio channel to the hooks of a ClientInterceptor,
+    e.g. a MetricsInterceptor or TracingInterceptor.
+
+    The interceptor runs in a task created when the call is made, so it sees the
+    contextvars (e.g. the current span) of the code making it.
+    """
+
+    def __init__(self, interceptor: ClientInterceptor):
+        self.interceptor = interceptor
+
+    def _call_started(self, client_call_details):
+        method = client_call_details.method
+        # grpc.aio gives the method name as bytes
+        if isinstance(method, bytes):
+            method = method.decode()
+        return self.interceptor.call_started(method)
+
+    async def _requests(self, state, request_iterator):
+        if hasattr(request_iterator, "__aiter__"):
+            async for request in request_iterator:
+                self.interceptor.request_sent(state, request)
+                yield request
+        else:
+            for request in request_iterator:
+                self.interceptor.request_sent(state, request)
+                yield request
+
+    async def _responses(self, state, call):
+        async for response in call:
+            self.interceptor.response_received(state, response)
+            yield response
+
+    async def _call(self, continuation, client_call_details, state, request):
+        try:
+            return await continuation(client_call_details, request)
+        except BaseException:
+            self.interceptor.call_finished(state, grpc.StatusCode.UNKNOWN)
+            raise
+
+    async def _unary_response(self, state, call):
+        # the call is reported as finished before its response is handed over
+        try:
+            code = await call.code()
+        except asyncio.CancelledError:
+            self.interceptor.call_finished(state, grpc.StatusCode.CANCELLED)
+            raise
+        if code == grpc.StatusCode.OK:
+            self.interceptor.response_received(state, await call)
+        self.interceptor.call_finished(state, code)
+        return call
+
+    def _stream_response(self, state, call):
+        self.interceptor.stream_started(state)
+        # the status of a grpc.aio call can only be awaited
+        call.add_done_callback(
+            lambda _: asyncio.ensure_future(self._finished(state, call))
+        )
+        return self._responses(state, call)
+
+    async def _finished(self, state, call):
+        self.interceptor.call_finished(state, await call.code())
+
+
+class _AioUnaryUnaryInterceptor(_AioClientInterceptor, aio.UnaryUnaryClientInterceptor):
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        state = self._call_started(client_call_details)
+        self.interceptor.request_sent(state, request)
+        call = await self._call(continuation, client_call_details, state, request)
+        return await self._unary_response(state, call)
+
+
+class _AioUnaryStreamInterceptor(
+    _AioClientInterceptor, aio.UnaryStreamClientInterceptor
+):
+    async def intercept_unary_stream(self, continuation, client_call_details, request):
+        state = self._call_started(client_call_details)
+        self.interceptor.request_sent(state, request)
+        call = await self._call(continuation, client_call_details, state, request)
+        return self._stream_response(state, call)
+
+
+class _AioStreamUnaryInterceptor(
+    _AioClientInterceptor, aio.StreamUnaryClientInterceptor
+):
+    async def intercept_stream_unary(
+        self, continuation, client_call_details, request_iterator
+    ):
+        state = self._call_started(client_call_details)
+        requests = self._requests(state, request_iterator)
+        call = await self._call(continuation, client_call_details, state, requests)
+        return await self._unary_response(state, call)
+
+
+class _AioStreamStreamInterceptor(
+    _AioClientInterceptor, aio.StreamStreamClientInterceptor
+):
+    async def intercept_stream_stream(
+        self, continuation, client_call_details, request_iterator
+    ):
+        state = self._call_started(client_call_details)
+        requests = self._requests(state, request_iterator)
+        call = await self._call(continuation, client_call_details, state, requests)
+        return self._stream_response(state, call)
+
+
+def _aio_interceptors(interceptor) -> list:
+    """
+    :param interceptor: a ClientInterceptor, or a grpc.aio client interceptor which is
+    returned as is
+    :return: list of grpc.aio client interceptors reporting every kind of call to it
+    """
+    if isinstance(interceptor, aio.ClientInterceptor):
+        return [interceptor]
+    if not isinstance(interceptor, ClientInterceptor):
+        raise TypeError(
+            "the asyncio client takes grpc.aio interceptors or "
+            "lnd_grpc.interceptors.ClientInterceptors"
+        )
+    return [
+        _AioUnaryUnaryInterceptor(interceptor),
+        _AioUnaryStreamInterceptor(interceptor),
+        _AioStreamUnaryInterceptor(interceptor),
+        _AioStreamStreamInterceptor(interceptor),
+    ]
+
+
+class AioChannelManager(ChannelManager):
+    """
+    A ChannelManager handing out grpc.aio channels.
+
+    grpc.aio channels cannot be subscribed to, so their connectivity state is polled
+    each time the channel is requested, and they are never blocked on whilst
+    connecting as that would stall the event loop.
+
+    grpc.aio channels only take interceptors when they are created, so channels are
+    rebuilt on their next use whenever the interceptors change.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interceptors = []
+
+    def set_interceptors(self, interceptors: list):
+        """
+        Install grpc.aio client interceptors on every channel, replacing any existing
+        channels on their next use
+        """
+        with self._lock:
+            self.interceptors = list(interceptors)
+            for managed in self._channels.values():
+                managed.stale = True
+                # not a reconnection, so not subject to backoff
+                managed.next_rebuild = 0.0
+
+    def _create_channel(
+        self, address: str, credentials, options: list, calls: InFlightCalls
+    ) -> aio.Channel:
+        return aio.secure_channel(
+            target=address,
+            credentials=credentials,
+            options=options,
+            interceptors=[
+                _AioUnaryUnaryInFlight(calls),
+                _AioUnaryStreamInFlight(calls),
+                _AioStreamUnaryInFlight(calls),
+                _AioStreamStreamInFlight(calls),
+            ]
+            + self.interceptors,
+        )
+
+    @staticmethod
+    def _close_channel(channel):
+        asyncio.ensure_future(channel.close())
+
+    def channel(
+        self,
+        address: str,
+        credentials_key: tuple,
+        credentials,
+        options: list,
+        connectivity_callback=None,
+    ) -> aio.Channel:
+        # refresh the state of an existing channel before deciding whether to rebuild
+        with self._lock:
+            managed = self._channels.get((address, credentials_key))
+            if managed is not None:
+                self._poll_state(managed, connectivity_callback)
+        return super().channel(
+            address, credentials_key, credentials, options, connectivity_callback
+        )
+
+    def _watch_channel(self, managed, channel, callback):
+        self._poll_state(managed, callback)
+
+    def _poll_state(self, managed, callback):
+        state = managed.channel.get_state(try_to_connect=True)
+        if state != managed.state:
+            self._set_state(managed, state, callback)
+
+    def _wait_ready(self, channel):
+        pass
+
+    async def close(self):
+        """
+        Close all channels owned by the manager
+        """
+        with self._lock:
+            channels = [managed.channel for managed in self._channels.values()]
+            channels.extend(channel for channel, _ in self._retired)
+            self._channels.clear()
+            self._retired.clear()
+        for channel in channels:
+            await channel.close()
+
+
+class Client(SyncClient):
+    """
+    An asyncio client built on grpc.aio with the same method surface as
+    lnd_grpc.Client.
+
+    Unary methods return awaitables and response-streaming methods return async
+    iterators, e.g.:
+
+    info = await client.get_info()
+    async for invoice in client.subscribe_invoices():
+        ...
+
+    The custom functions of lnd_grpc.Client which rely on background threads run in
+    tasks instead: future returns asyncio.Tasks, graph_index() and pathfinder() are
+    coroutines, invoice_subscription(), event_hub() and enable_response_cache() return
+    asyncio variants, and bounded streams are async iterators. These must be called
+    with the event loop running.
+    """
+
+    def __init__(
+        self,
+        lnd_dir: str = None,
+        macaroon_path: str = None,
+        tls_cert_path: str = None,
+        network: str = defaultNetwork,
+        grpc_host: str = defaultRPCHost,
+        grpc_port: str = defaultRPCPort,
+    ):
+        super().__init__(
+            lnd_dir=lnd_dir,
+            macaroon_path=macaroon_path,
+            tls_cert_path=tls_cert_path,
+            network=network,
+            grpc_host=grpc_host,
+            grpc_port=grpc_port,
+        )
+        self.channel_manager = AioChannelManager()
+
+    def add_interceptor(self, interceptor):
+        """
+        Install an interceptor on the client's channels, which are rebuilt on their
+        next use so that every subsequent call passes through it. Calls already in
+        flight complete on the channels they were made on.
+
+        :param interceptor: a ClientInterceptor (e.g. a MetricsInterceptor or
+        TracingInterceptor), adapted to grpc.aio, or a grpc.aio client interceptor
+        """
+        interceptors = _aio_interceptors(interceptor)
+        self.interceptors.append(interceptor)
+        self.channel_manager.set_interceptors(
+            self.channel_manager.interceptors + interceptors
+        )
+
+    def _intercept(self, name: str, channel):
+        # the interceptors are installed when the channel manager creates the channel
+        return channel
+
+    async def close(self):
+        """
+        Turn the response cache off and close the client's channels
+        """
+        self.disable_response_cache()
+        await self.channel_manager.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def version(self):
+        """
+        :return: awaitable of the version of LND running
+        """
+        return self._get_version()
+
+    @version.setter
+    def version(self, version: str):
+        self._version = version
+
+    async def _get_version(self):
+        if self._version:
+            return self._version
+        self._version = (await self.get_info()).version.split(" ")[0]
+        return self._version
+
+    @property
+    def future(self) -> AioFutureCalls:
+        """
+        Variants of the client's unary methods which schedule the call at once, e.g.
+        client.future.get_info() returns an asyncio.Task of the GetInfoResponse
+
+        :return: AioFutureCalls
+        """
+        return AioFutureCalls(self)
+
+    async def graph_index(
+        self, live: bool = True, include_unannounced: bool = False
+    ) -> AioGraphIndex:
+        """
+        Custom function which builds a local AioGraphIndex of the channel graph from
+        describe_graph(). If live, the index is kept updated from
+        subscribe_channel_graph() in a task (stop it with stop()).
+
+        :return: AioGraphIndex with lookups by pubkey and chan_id and adjacency lists
+        """
+        index = AioGraphIndex(self)
+        if live:
+            return await index.start(include_unannounced=include_unannounced)
+        return await index.load(include_unannounced=include_unannounced)
+
+    async def pathfinder(self, graph: AioGraphIndex = None) -> Pathfinder:
+        """
+        Custom function which returns a Pathfinder computing routes from this node
+        locally, as lnd_grpc.Client.pathfinder()
+
+        :return: Pathfinder whose query_routes() returns lists of ln.Route objects
+        """
+        if graph is None:
+            graph = await self.graph_index(live=False)
+        info = await self.get_info()
+        return Pathfinder(graph, info.identity_pubkey, block_height=info.block_height)
+
+    def invoice_subscription(
+        self,
+        add_index: int = 0,
+        settle_index: int = 0,
+        callback=None,
+        queue_: asyncio.Queue = None,
+    ) -> AioInvoiceSubscription:
+        """
+        Custom function which follows subscribe_invoices() from the given indices,
+        re-subscribing with backoff from the last indices seen whenever the stream
+        drops, and delivering every add and settle event exactly once.
+
+        :param callback: callable called with each Invoice
+        :param queue_: asyncio.Queue to put each Invoice into
+        :return: a started AioInvoiceSubscription which, without a callback or queue_,
+        can be async iterated over for the Invoices
+        """
+        return AioInvoiceSubscription(
+            self,
+            add_index=add_index,
+            settle_index=settle_index,
+            callback=callback,
+            queue_=queue_,
+        ).start()
+
+    def event_hub(self, add_index: int = 0, settle_index: int = 0) -> AioEventHub:
+        """
+        Custom function which opens a single invoice, channel event and channel graph
+        subscription each, shared by any number of listeners keyed by payment hash or
+        channel point.
+
+        :return: a started AioEventHub
+        """
+        return AioEventHub(self, add_index=add_index, settle_index=settle_index).start()
+
+    def enable_response_cache(
+        self, ttls: dict = None, max_size: int = None, follow: bool = True
+    ) -> AioResponseCache:
+        """
+        Custom function which turns on caching of the responses of get_info(),
+        get_node_info(), get_chan_info(), get_network_info(), fee_report() and
+        decode_pay_req(), as lnd_grpc.Client.enable_response_cache()
+
+        :param ttls: dict of method name to seconds to cache its responses for
+        :return: AioResponseCache, whose stats() reports hit rates per method
+        """
+        self.disable_response_cache()
+        cache = AioResponseCache(ttls=ttls, max_size=max_size or RESPONSE_CACHE_SIZE)
+        if follow:
+            cache.follow(self)
+        self.response_cache = cache
+        return cache
+
+    # Methods which post-process the response need to await it first
+
+    async def list_peers(self):
+        """
+        returns a verbose listing of all currently active peers
+
+        :return: ListPeersResponse.peers with no attributes
+        """
+        request = ln.ListPeersRequest()
+        response = await self.lightning_stub.ListPeers(request)
+        return response.peers
+
+    async def list_channels(self, **kwargs):
+        """
+        returns a description of all the open channels that this node is a participant
+        in.
+
+        :return: ListChannelsResponse with 1 attribute: 'channels' that contains a list
+        of the channels queried
+        """
+        request = ln.ListChannelsRequest(**kwargs)
+        response = await self.lightning_stub.ListChannels(request)
+        return response.channels
+
+    async def closed_channels(self, **kwargs):
+        """
+        returns a description of all the closed channels that this node was a
+        participant in.
+
+        :return: ClosedChannelsResponse with 1 attribute: 'channels'
+        """
+        request = ln.ClosedChannelsRequest(**kwargs)
+        response = await self.lightning_stub.ClosedChannels(request)
+        return response.channels
+
+    async def close_all_channels(
+        self,
+        inactive_only: bool = 0,
+        max_parallel: int = 10,
+        follow_confirmations: bool = False,
+        **kwargs
+    ):
+        """
+        Custom function which closes all channels concurrently using close_channel(),
+        with at most max_parallel closes being initiated at once
+
+        :param follow_confirmations: wait for each close to confirm (its chan_close
+        update) rather than only for it to be initiated
+        :return: dict of channel point to the first (or, if following confirmations,
+        the chan_close) CloseStatusUpdate of its close, or the grpc.RpcError it failed
+        with
+        """
+        if inactive_only:
+            channels = await self.list_channels(inactive_only=1)
+        else:
+            channels = await self.list_channels()
+        semaphore = asyncio.Semaphore(max_parallel)
+
+        async def close(channel_point):
+            async with semaphore:
+                call = self.close_channel(channel_point=channel_point, **kwargs)
+                try:
+                    async for update in call:
+                        if not follow_confirmations or update.HasField("chan_close"):
+                            return update
+                except grpc.RpcError as e:
+                    return e
+                finally:
+                    call.cancel()
+
+        channel_points = [channel.channel_point for channel in channels]
+        updates = await asyncio.gather(*(close(cp) for cp in channel_points))
+        return dict(zip(channel_points, updates))
+
+    async def add_invoices_batch(self, specs, max_in_flight: int = 100) -> list:
+        """
+        Custom function which adds many invoices at once, with up to max_in_flight
+        AddInvoice calls outstanding at any time
+
+        :param specs: iterable of dicts of add_invoice() keyword arguments (or
+        ln.Invoice objects)
+        :return: list, in the order of specs, of AddInvoiceResponse for each invoice
+        added or the grpc.RpcError it failed with
+        """
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        async def add(request):
+            async with semaphore:
+                try:
+                    return await self.lightning_stub.AddInvoice(request)
+                except grpc.RpcError as e:
+                    return e
+
+        requests = [self.invoice_request(spec) for spec in specs]
+        return await asyncio.gather(*(add(request) for request in requests))
+
+    def iter_invoices(
+        self,
+        page_size: int = 100,
+        index_offset: int = 0,
+        reversed: bool = False,
+        pending_only: bool = False,
+        prefetch: bool = False,
+    ) -> AioPaginator:
+        """
+        Custom function which walks all invoices lazily, requesting them from
+        list_invoices() page_size at a time.
+
+        The returned AioPaginator's `offset` attribute is the add_index of the last
+        invoice yielded; pass it back as index_offset to resume a scan from that point.
+
+        :return: AioPaginator, an async iterable of Invoices
+        """
+
+        async def fetch(offset):
+            response = await self.list_invoices(
+                reversed=reversed,
+                index_offset=offset,
+                num_max_invoices=page_size,
+                pending_only=pending_only,
+            )
+            if reversed:
+                return response.invoices, response.first_index_offset
+            return response.invoices, response.last_index_offset
+
+        return AioPaginator(
+            fetch,
+            lambda page_offset, position, invoice: invoice.add_index,
+            page_size=page_size,
+            offset=index_offset,
+            prefetch=prefetch,
+        )
+
+    def iter_forwarding_events(
+        self,
+        start_time: int = None,
+        end_time: int = None,
+        page_size: int = 10000,
+        prefetch: bool = False,
+        index_offset: int = 0,
+    ) -> AioPaginator:
+        """
+        Custom function which walks all forwarding events between start_time and
+        end_time (unix timestamps, inclusive, defaulting to the past 24 hrs) lazily,
+        requesting them from forwarding_history() page_size at a time.
+
+        :param index_offset: number of events of the time range to skip, e.g. the
+        `offset` of an earlier scan of the same range to resume it
+        :return: AioPaginator, an async iterable of ForwardingEvents
+        """
+        if end_time is None:
+            end_time = int(time.time())
+        if start_time is None:
+            start_time = end_time - 24 * 60 * 60
+
+        async def fetch(offset):
+            response = await self.forwarding_history(
+                start_time=start_time,
+                end_time=end_time,
+                index_offset=offset,
+                num_max_events=page_size,
+            )
+            return response.forwarding_events, response.last_offset_index
+
+        return AioPaginator(
+            fetch,
+            lambda page_offset, position, event: page_offset + position + 1,
+            page_size=page_size,
+            offset=index_offset,
+            prefetch=prefetch,
+        )
+
+    async def snapshot(self, previous: NodeSnapshot = None) -> NodeSnapshot:
+        """
+        Custom function which fetches get_info(), wallet_balance(), channel_balance(),
+        list_channels(), pending_channels(), list_peers() and fee_report() concurrently
+
+        :param previous: an earlier snapshot to diff against
+        :return: NodeSnapshot, as lnd_grpc.Client.snapshot()
+        """
+        taken_at = time.time()
+        start = time.monotonic()
+        timings = {}
+
+        async def timed(name, method):
+            response = await getattr(self, method)()
+            timings[name] = time.monotonic() - start
+            return name, response
+
+        results = await asyncio.gather(
+            *(timed(name, method) for name, method, _ in SNAPSHOT_CALLS)
+        )
+        return make_snapshot(dict(results), timings, taken_at, previous=previous)
+
+    async def query_routes(self, pub_key: str, amt: int, **kwargs):
+        """
+        attempts to query the daemon’s Channel Router for a possible route to a target
+        destination capable of carrying a specific amount of satoshis.
+
+        :return: QueryRoutesResponse object with 1 attribute: 'routes' which contains a
+        single route
+        """
+        request = ln.QueryRoutesRequest(pub_key=pub_key, amt=amt, **kwargs)
+        response = await self.lightning_stub.QueryRoutes(request)
+        return response.routes
+
+    async def decode_pay_req(self, pay_req: str):
+        """
+        takes an encoded payment request string and attempts to decode it, locally
+        where possible and otherwise with the DecodePayReq RPC
+
+        :return: PayReq with 10 attributes
+        """
+        if self.pay_req_decoder is not None:
+            try:
+                return self.pay_req_decoder.decode(pay_req, network=self.network)
+            except Bolt11Error:
+                pass
+        request = ln.PayReqString(pay_req=pay_req)
+        return await cached_call(
+            self.response_cache,
+            "decode_pay_req",
+            request,
+            lambda: self.lightning_stub.DecodePayReq(request),
+        )
+
+    async def payment_hash_of(self, payment_request: str) -> bytes:
+        """
+        :return: the payment hash of a payment request as bytes
+        """
+        pay_req = await self.decode_pay_req(pay_req=payment_request)
+        return bytes.fromhex(pay_req.payment_hash)
+
+    def payment_session(self):
+        """
+        Opens a single bi-directional SendPayment stream which many SendRequests can be
+        pushed into, with responses correlated by payment hash.
+
+        :return: AioPaymentSession
+        """
+        return AioPaymentSession(self.lightning_stub.SendPayment, self.payment_hash_of)
+
+    def route_payment_session(self):
+        """
+        Opens a single bi-directional SendToRoute stream which many SendToRouteRequests
+        can be pushed into, with responses correlated by payment hash.
+
+        :return: AioPaymentSession
+        """
+        return AioPaymentSession(self.lightning_stub.SendToRoute)
+
+
+class AioPaymentSession:
+    """
+    The asyncio counterpart of lnd_grpc.payments.PaymentSession.
+
+    send() returns an asyncio.Future resolved with the SendResponse carrying the same
+    payment hash, and the session is an async iterator of responses in arrival order.
+    """
+
+    def __init__(self, stream_method, payment_hash_resolver=None):
+        """
+        :param payment_hash_resolver: coroutine function returning the payment hash
+        (bytes) of a payment request string
+        """
+        self.payment_hash_resolver = payment_hash_resolver
+        self._requests = asyncio.Queue()
+        self._responses = asyncio.Queue()
+        self._pending = OrderedDict()
+        self._unresolved = 0
+        self._closing = False
+        self._finished = False
+        self._call = stream_method(self._request_iterator())
+        self._reader = asyncio.ensure_future(self._read_responses())
+
+    async def _request_iterator(self):
+        while True:
+            request = await self._requests.get()
+            if request is _END:
+                return
+            yield request
+
+    async def _payment_hash(self, request) -> bytes:
+        if request.payment_hash:
+            return request.payment_hash
+        if request.payment_hash_string:
+            return bytes.fromhex(request.payment_hash_string)
+        payment_request = getattr(request, "payment_request", "")
+        if payment_request and self.payment_hash_resolver is not None:
+            return await self.payment_hash_resolver(payment_request)
+        raise ValueError(
+            "cannot correlate a payment without payment_hash, payment_hash_string "
+            "or a resolvable payment_request"
+        )
+
+    def send(self, request) -> asyncio.Future:
+        """
+        Push a SendRequest (or SendToRouteRequest) into the stream.
+
+        :return: asyncio.Future resolved with the matching SendResponse
+        """
+        if self._closing:
+            raise RuntimeError("cannot send on a closed payment session")
+        if self._finished:
+            raise RuntimeError("payment stream has already terminated")
+        future = asyncio.get_event_loop().create_future()
+        self._unresolved += 1
+        asyncio.ensure_future(self._enqueue(request, future))
+        return future
+
+    async def _enqueue(self, request, future):
+        try:
+            payment_hash = await self._payment_hash(request)
+            if payment_hash in self._pending:
+                raise ValueError(
+                    "payment %s is already in flight in this session"
+                    % payment_hash.hex()
+                )
+        except Exception as e:
+            future.set_exception(e)
+            self._settled()
+            return
+        self._pending[payment_hash] = future
+        await self._requests.put(request)
+
+    def _settled(self):
+        self._unresolved -= 1
+        if self._closing and not self._unresolved:
+            self._requests.put_nowait(_END)
+
+    def close(self):
+        """
+        Stop accepting payments and end the request stream once all outstanding
+        payments have been resolved
+        """
+        self._closing = True
+        if not self._unresolved:
+            self._requests.put_nowait(_END)
+
+    def cancel(self):
+        """
+        Cancel the stream immediately, failing any outstanding payments
+        """
+        self._call.cancel()
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: number of payments sent but not yet resolved
+        """
+        return self._unresolved
+
+    def _resolve(self, response):
+        future = self._pending.pop(response.payment_hash, None)
+        if future is None and not response.payment_hash and self._pending:
+            # responses without a hash are attributed to the oldest payment
+            _, future = self._pending.popitem(last=False)
+        if future is not None:
+            future.set_result(response)
+            self._settled()
+
+    async def _read_responses(self):
+        error = None
+        try:
+            async for response in self._call:
+                self._resolve(response)
+                await self._responses.put(response)
+        except (grpc.RpcError, asyncio.CancelledError) as e:
+            error = e
+        self._finished = True
+        pending = list(self._pending.values())
+        self._pending.clear()
+        self._requests.put_nowait(_END)
+        for future in pending:
+            if isinstance(error, grpc.RpcError):
+                future.set_exception(error)
+            else:
+                future.cancel()
+        await self._responses.put(error if isinstance(error, grpc.RpcError) else _END)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """
+        :return: the next SendResponse received on the stream
+        """
+        response = await self._responses.get()
+        if response is _END or isinstance(response, grpc.RpcError):
+            self._responses.put_nowait(response)
+            if response is _END:
+                raise StopAsyncIteration
+            raise response
+        return response
+
+
+__all__ = ["Client"]
@@ -0,0 +1,332 @@
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict
+
+import grpc
+
+from lnd_grpc.config import STREAM_QUEUE_SIZE
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, COALESCE)
+
+
+def graph_update_items(update) -> list:
+    """
+    :return: the NodeUpdates, ChannelEdgeUpdates and ClosedChannelUpdates of a
+    GraphTopologyUpdate as a flat list
+    """
+    return (
+        list(update.node_updates)
+        + list(update.channel_updates)
+        + list(update.closed_chans)
+    )
+
+
+def graph_update_key(item):
+    """
+    :return: coalescing key of an item of graph_update_items(): the node for node
+    updates, the channel and direction for policy updates and the channel for closes
+    """
+    if hasattr(item, "identity_key"):
+        return "node", item.identity_key
+    if hasattr(item, "routing_policy"):
+        return "policy", item.chan_id, item.advertising_node
+    return "closed", item.chan_id
+
+
+class _BoundedQueue:
+    """
+    The queue and overflow handling shared by BoundedStream and AioBoundedStream
+    """
+
+    def __init__(
+        self,
+        stream,
+        max_size: int = STREAM_QUEUE_SIZE,
+        overflow: str = BLOCK,
+        key=None,
+        split=None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                "unknown overflow policy %r, choose from %s"
+                % (overflow, ", ".join(OVERFLOW_POLICIES))
+            )
+        if overflow == COALESCE and key is None:
+            raise ValueError("the coalesce overflow policy needs a key")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.overflow = overflow
+        self.key = key
+        self.split = split
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water = 0
+        self.error = None
+        self._stream = stream
+        self._queue = OrderedDict()
+        self._sequence = itertools.count()
+        self._finished = False
+        self._cancelled = False
+
+    def _events(self, response):
+        return (response,) if self.split is None else self.split(response)
+
+    def _queue_key(self, event):
+        """
+        :return: the key to queue an event under, or None if it replaced a queued event
+        """
+        self.received += 1
+        if self.overflow == COALESCE:
+            key = self.key(event)
+            if key in self._queue:
+                self._queue[key] = event
+                self.coalesced += 1
+                return None
+            return key
+        return next(self._sequence)
+
+    def _full(self) -> bool:
+        """
+        :return: whether the queue is full and the reader has to wait, after making
+        room by dropping the oldest event if that is the overflow policy
+        """
+        if len(self._queue) < self.max_size or self._cancelled:
+            return False
+        if self.overflow == DROP_OLDEST:
+            self._queue.popitem(last=False)
+            self.dropped += 1
+            return False
+        return True
+
+    def _enqueue(self, key, event):
+        self._queue[key] = event
+        self.high_water = max(self.high_water, len(self._queue))
+
+    def _dequeue(self):
+        _, event = self._queue.popitem(last=False)
+        self.delivered += 1
+        return event
+
+    def _cancel_queue(self):
+        self._cancelled = True
+        self._queue.clear()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _stats(self) -> dict:
+        return {
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "pending": len(self._queue),
+            "high_water": self.high_water,
+        }
+
+
+class BoundedStream(_BoundedQueue):
+    """
+    Reads a response stream on a background thread into a queue of at most
+    `max_size` events, so a slow consumer cannot make events pile up without bound.
+
+    What happens when the queue is full depends on `overflow`:
+
+    block: stop reading from the stream until the consumer catches up, leaving gRPC
+    flow control to hold back the server. Nothing is lost.
+    drop_oldest: discard the oldest queued event to make room for the new one.
+    coalesce: an event whose key(event) matches a queued event replaces it in place,
+    so only the latest event per key is delivered; when the queue is full of distinct
+    keys, block.
+
+    If `split` is given, each response is split into the events split(response) before
+    being queued, e.g. graph_update_items to coalesce graph updates per channel.
+
+    Iterate over the BoundedStream for the events. A grpc.RpcError ending the stream is
+    raised once the queued events have been consumed.
+    """
+
+    def __init__(
+        self,
+        stream,
+        max_size: int = STREAM_QUEUE_SIZE,
+        overflow: str = BLOCK,
+        key=None,
+        split=None,
+    ):
+        """
+        :param stream: a response-streaming call, e.g. from subscribe_transactions()
+        :param overflow: one of OVERFLOW_POLICIES
+        :param key: callable returning the coalescing key of an event
+        :param split: callable returning the events of a response
+        """
+        super().__init__(stream, max_size, overflow=overflow, key=key, split=split)
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._read, name="bounded-stream", daemon=True
+        )
+        self._thread.start()
+
+    def _read(self):
+        try:
+            for response in self._stream:
+                for event in self._events(response):
+                    if not self._put(event):
+                        return
+        except grpc.RpcError as e:
+            if not self._cancelled:
+                self.error = e
+        finally:
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def _put(self, event) -> bool:
+        with self._condition:
+            key = self._queue_key(event)
+            if key is None:
+                return True
+            while self._full():
+                self._condition.wait()
+            if self._cancelled:
+                return False
+            self._enqueue(key, event)
+            self._condition.notify_all()
+            return True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._condition:
+            while not self._queue and not self._finished:
+                self._condition.wait()
+            if self._queue:
+                event = self._dequeue()
+                self._condition.notify_all()
+                return event
+        if self.error is not None:
+            raise self.error
+        raise StopIteration
+
+    def cancel(self):
+        """
+        Cancel the underlying stream and end iteration, discarding queued events
+        """
+        with self._condition:
+            self._cancel_queue()
+            self._condition.notify_all()
+        self._stream.cancel()
+
+    def stats(self) -> dict:
+        """
+        :return: dict of events received, delivered, dropped and coalesced, events
+        pending in the queue and the most ever pending (high_water)
+        """
+        with self._condition:
+            return self._stats()
+
+
+class AioBoundedStream(_BoundedQueue):
+    """
+    The asyncio counterpart of BoundedStream, reading a grpc.aio response stream in a
+    task. Iterate over it with `async for`.
+    """
+
+    def __init__(
+        self,
+        stream,
+        max_size: int = STREAM_QUEUE_SIZE,
+        overflow: str = BLOCK,
+        key=None,
+        split=None,
+    ):
+        """
+        :param stream: a grpc.aio response-streaming call
+        :param overflow: one of OVERFLOW_POLICIES
+        :param key: callable returning the coalescing key of an event
+        :param split: callable returning the events of a response
+        """
+        super().__init__(stream, max_size, overflow=overflow, key=key, split=split)
+        self._condition = asyncio.Condition()
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        try:
+            async for response in self._stream:
+                for event in self._events(response):
+                    if not await self._put(event):
+                        return
+        except grpc.RpcError as e:
+            if not self._cancelled:
+                self.error = e
+        except asyncio.CancelledError:
+            pass
+        finally:
+            async with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    async def _put(self, event) -> bool:
+        async with self._condition:
+            key = self._queue_key(event)
+            if key is None:
+                return True
+            while self._full():
+                await self._condition.wait()
+            if self._cancelled:
+                return False
+            self._enqueue(key, event)
+            self._condition.notify_all()
+            return True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        async with self._condition:
+            while not self._queue and not self._finished:
+                await self._condition.wait()
+            if self._queue:
+                event = self._dequeue()
+                self._condition.notify_all()
+                return event
+        if self.error is not None:
+            raise self.error
+        raise StopAsyncIteration
+
+    def cancel(self):
+        """
+        Cancel the underlying stream and end iteration, discarding queued events
+        """
+        self._cancel_queue()
+        self._stream.cancel()
+        self._reader.cancel()
+
+    def stats(self) -> dict:
+        """
+        :return: dict of events received, delivered, dropped and coalesced, events
+        pending in the queue and the most ever pending (high_water)
+        """
+        return self._stats()
+
+
+def bounded(stream, max_queue: int = None, overflow: str = BLOCK, key=None, split=None):
+    """
+    Wrap stream in a BoundedStream (or, for a grpc.aio stream, an AioBoundedStream) of
+    max_queue events, or return it as is if max_queue is None
+    """
+    if max_queue is None:
+        return stream
+    if hasattr(stream, "__aiter__"):
+        return AioBoundedStream(
+            stream, max_queue, overflow=overflow, key=key, split=split
+        )
+    return BoundedStream(stream, max_queue, overflow=overflow, key=key, split=split)
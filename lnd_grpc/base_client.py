@@ -1,11 +1,16 @@
-import codecs
 from pathlib import Path
 import sys
 from os import environ
 
 import grpc
 
+from lnd_grpc.channel_manager import ChannelManager
+from lnd_grpc.channel_pool import ChannelPool, ROUND_ROBIN
 from lnd_grpc.config import *
+from lnd_grpc.credentials import MacaroonCache
+from lnd_grpc.future_calls import FutureCalls
+from lnd_grpc.metrics import MetricsInterceptor, MetricsRegistry
+from lnd_grpc.tracing import Tracer, TracingInterceptor
 import lnd_grpc.protos.rpc_pb2 as ln
 from lnd_grpc.utilities import get_lnd_dir
 
@@ -35,6 +40,7 @@ class BaseClient:
         grpc_port: str = defaultRPCPort,
     ):
 
+        self.credential_cache = MacaroonCache()
         self.lnd_dir = lnd_dir
         self.macaroon_path = macaroon_path
         self.tls_cert_path = tls_cert_path
@@ -42,9 +48,16 @@ class BaseClient:
         self.grpc_host = grpc_host
         self.grpc_port = str(grpc_port)
         self.channel = None
+        self.channel_manager = ChannelManager()
+        self.channel_pool = None
+        self.pool_size = 1
+        self.pool_strategy = ROUND_ROBIN
         self.connection_status = None
         self.connection_status_change = False
         self.grpc_options = GRPC_OPTIONS
+        self.interceptors = []
+        self._intercepted_channels = {}
+        self.tracer = None
 
     @property
     def lnd_dir(self):
@@ -115,38 +128,103 @@ class BaseClient:
     @property
     def macaroon(self):
         """
-        try to open the macaroon and return it as a byte string
+        return the (cached) macaroon as a hex-encoded byte string
         """
-        try:
-            with open(self.macaroon_path, "rb") as f:
-                macaroon_bytes = f.read()
-                macaroon = codecs.encode(macaroon_bytes, "hex")
-                return macaroon
-        except FileNotFoundError:
-            sys.stderr.write(
-                f"Could not find macaroon in {self.macaroon_path}. This might happen"
-                f"in versions of lnd < v0.5-beta or those not using default"
-                f"installation path. Set client object's macaroon_path attribute"
-                f"manually."
-            )
+        return self.credential_cache.macaroon(self.macaroon_path)
+
+    def reload_credentials(self):
+        """
+        Force the macaroon to be re-read from disk on the next call
+        """
+        self.credential_cache.invalidate()
 
     def metadata_callback(self, context, callback):
         """
         automatically incorporate the macaroon into all requests
         :return: macaroon callback
         """
-        callback([("macaroon", self.macaroon)], None)
+        metadata = self.credential_cache.metadata(self.macaroon_path)
+        if metadata is None:
+            metadata = [("macaroon", None)]
+        callback(metadata, None)
 
     def connectivity_event_logger(self, channel_connectivity):
         """
-        Channel connectivity callback logger
+        Channel connectivity callback logger. Rebuilding the channel after a failure is
+        handled by the channel manager.
         """
         self.connection_status = channel_connectivity._name_
-        if (
-            self.connection_status == "SHUTDOWN"
-            or self.connection_status == "TRANSIENT_FAILURE"
-        ):
-            self.connection_status_change = True
+
+    @property
+    def reconnect_count(self) -> int:
+        """
+        :return: number of times this client's channels have been rebuilt
+        """
+        return self.channel_manager.reconnects()
+
+    @property
+    def future(self) -> FutureCalls:
+        """
+        Non-blocking variants of the client's unary methods, e.g.
+        client.future.get_info() returns a grpc.Future of the GetInfoResponse
+
+        :return: FutureCalls
+        """
+        return FutureCalls(self)
+
+    def add_interceptor(self, interceptor):
+        """
+        Install a grpc client interceptor on the client's channels. Stubs are rebuilt
+        on their next use so that every subsequent call passes through it.
+        """
+        self.interceptors.append(interceptor)
+
+    def enable_metrics(self, registry: MetricsRegistry = None) -> MetricsInterceptor:
+        """
+        Custom function which records per-method latency, message sizes, status codes
+        and calls in flight for every call made by the client
+
+        :param registry: MetricsRegistry to record into, e.g. one shared with a
+        LoopClient, otherwise a new one is created
+        :return: the MetricsInterceptor installed, see its exposition() for the metrics
+        in the Prometheus text format
+        """
+        interceptor = MetricsInterceptor(registry)
+        self.add_interceptor(interceptor)
+        return interceptor
+
+    def enable_tracing(
+        self, exporter=None, batch_size: int = TRACE_BATCH_SIZE
+    ) -> Tracer:
+        """
+        Custom function which opens a span for every call made by the client (and for
+        every batch_size responses of a stream), as a child of the current span.
+        Spans for the client's calls can be grouped under a span of your own with
+        client.tracer.span(name), and carried into worker threads with
+        lnd_grpc.tracing.propagate().
+
+        :param exporter: where ended spans are sent, e.g. a
+        lnd_grpc.tracing.JsonLinesExporter, by default an InMemoryExporter
+        :return: the Tracer, also available as client.tracer. If tracing is already
+        enabled the existing Tracer is returned.
+        """
+        if self.tracer is None:
+            self.tracer = Tracer(exporter)
+            self.add_interceptor(TracingInterceptor(self.tracer, batch_size))
+        return self.tracer
+
+    def _intercept(self, name: str, channel) -> grpc.Channel:
+        # the intercepted channel is kept for as long as the underlying channel and
+        # the interceptors stay the same, so that stubs built on it can be reused
+        if not self.interceptors:
+            return channel
+        interceptors = tuple(self.interceptors)
+        cached = self._intercepted_channels.get(name)
+        if cached is None or cached[0] is not channel or cached[1] != interceptors:
+            intercepted = grpc.intercept_channel(channel, *interceptors)
+            cached = (channel, interceptors, intercepted)
+            self._intercepted_channels[name] = cached
+        return cached[2]
 
     @property
     def combined_credentials(self) -> grpc.CallCredentials:
@@ -162,6 +240,76 @@ class BaseClient:
     def grpc_address(self) -> str:
         return str(self.grpc_host + ":" + self.grpc_port)
 
+    @property
+    def _macaroon_credentials_key(self) -> tuple:
+        return "macaroon", self.tls_cert_path, str(self.macaroon_path)
+
+    @property
+    def _tls_credentials_key(self) -> tuple:
+        return "tls", self.tls_cert_path
+
+    @property
+    def authenticated_channel(self) -> grpc.Channel:
+        """
+        The channel shared by all macaroon-authenticated sub-services (Lightning,
+        Invoices). Connectivity changes are reported to connectivity_event_logger.
+        Any interceptors are installed on it.
+
+        If pool_size is greater than 1 this is a ChannelPool spreading calls over that
+        many connections instead.
+
+        :return: grpc.Channel
+        """
+        if self.pool_size > 1:
+            if self.channel_pool is None:
+                self.channel_pool = ChannelPool(
+                    self.channel_manager,
+                    address=self.grpc_address,
+                    credentials_key=self._macaroon_credentials_key,
+                    credentials=lambda: self.combined_credentials,
+                    options=self.grpc_options,
+                    size=self.pool_size,
+                    strategy=self.pool_strategy,
+                    connectivity_callback=self.connectivity_event_logger,
+                )
+            self.channel = self._intercept("authenticated", self.channel_pool)
+            return self.channel
+        channel = self.channel_manager.channel(
+            address=self.grpc_address,
+            credentials_key=self._macaroon_credentials_key,
+            credentials=lambda: self.combined_credentials,
+            options=self.grpc_options,
+            connectivity_callback=self.connectivity_event_logger,
+        )
+        self.channel = self._intercept("authenticated", channel)
+        return self.channel
+
+    @property
+    def tls_channel(self) -> grpc.Channel:
+        """
+        The channel used by sub-services which are available before a macaroon exists
+        (WalletUnlocker), authenticated by the TLS cert only. Any interceptors are
+        installed on it.
+
+        :return: grpc.Channel
+        """
+        channel = self.channel_manager.channel(
+            address=self.grpc_address,
+            credentials_key=self._tls_credentials_key,
+            credentials=lambda: grpc.ssl_channel_credentials(self.tls_cert),
+            options=self.grpc_options,
+        )
+        return self._intercept("tls", channel)
+
+    def regenerate_channel(self):
+        """
+        Mark the shared authenticated channel as stale so that a fresh one is created on
+        next use
+        """
+        if self.channel_pool is not None:
+            self.channel_pool.discard()
+        self.channel_manager.discard(self.grpc_address, self._macaroon_credentials_key)
+
     @staticmethod
     def channel_point_generator(funding_txid, output_index):
         """
@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+
+import lnd_grpc.protos.rpc_pb2 as ln
+from lnd_grpc.config import PAY_REQ_CACHE_SIZE
+
+# BOLT11 human readable prefix of each lnd network
+NETWORK_PREFIXES = {
+    "mainnet": "lnbc",
+    "testnet": "lntb",
+    "regtest": "lnbcrt",
+    "simnet": "lnsb",
+}
+
+# lnd's defaults for invoices without an expiry (x) or min_final_cltv_expiry (c)
+DEFAULT_EXPIRY = 3600
+DEFAULT_MIN_FINAL_CLTV_EXPIRY = 9
+
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BECH32_VALUES = {char: value for value, char in enumerate(BECH32_CHARSET)}
+
+# msat per unit of each amount multiplier, as (numerator, denominator)
+MULTIPLIERS = {
+    "": (10 ** 11, 1),
+    "m": (10 ** 8, 1),
+    "u": (10 ** 5, 1),
+    "n": (10 ** 2, 1),
+    "p": (1, 10),
+}
+
+# tagged field types
+TAG_PAYMENT_HASH = 1
+TAG_ROUTE_HINT = 3
+TAG_EXPIRY = 6
+TAG_FALLBACK = 9
+TAG_DESCRIPTION = 13
+TAG_DESTINATION = 19
+TAG_DESCRIPTION_HASH = 23
+TAG_MIN_FINAL_CLTV_EXPIRY = 24
+
+# secp256k1 curve parameters
+_P = 2 ** 256 - 2 ** 32 - 977
+_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+_G = (
+    0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+    0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8,
+)
+
+
+class Bolt11Error(ValueError):
+    """
+    Raised when a payment request cannot be decoded locally
+    """
+
+    pass
+
+
+# Bech32
+
+
+def _bech32_polymod(values) -> int:
+    generator = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+    checksum = 1
+    for value in values:
+        top = checksum >> 25
+        checksum = (checksum & 0x1FFFFFF) << 5 ^ value
+        for i in range(5):
+            if (top >> i) & 1:
+                checksum ^= generator[i]
+    return checksum
+
+
+def bech32_decode(string: str) -> tuple:
+    """
+    Decode a bech32 string of any length.
+
+    :return: tuple of (human readable part, list of 5 bit data values without the
+    checksum)
+    """
+    if string.lower() != string and string.upper() != string:
+        raise Bolt11Error("mixed case bech32 string")
+    string = string.lower()
+    separator = string.rfind("1")
+    if separator < 1 or separator + 7 > len(string):
+        raise Bolt11Error("invalid bech32 separator position")
+    hrp = string[:separator]
+    try:
+        data = [BECH32_VALUES[char] for char in string[separator + 1 :]]
+    except KeyError:
+        raise Bolt11Error("invalid bech32 character")
+    expanded = [ord(char) >> 5 for char in hrp] + [0]
+    expanded += [ord(char) & 31 for char in hrp]
+    if _bech32_polymod(expanded + data) != 1:
+        raise Bolt11Error("invalid bech32 checksum")
+    return hrp, data[:-6]
+
+
+def _to_bytes(values: list, pad: bool = False) -> bytes:
+    """
+    Pack 5 bit values into bytes, dropping any trailing padding bits, or with pad=True
+    zero padding the last byte instead
+    """
+    accumulator = 0
+    for value in values:
+        accumulator = accumulator << 5 | value
+    bits = len(values) * 5
+    if pad:
+        length = -(-bits // 8)
+        return (accumulator << length * 8 - bits).to_bytes(length, "big")
+    return (accumulator >> bits % 8).to_bytes(bits // 8, "big")
+
+
+def _to_int(values: list) -> int:
+    result = 0
+    for value in values:
+        result = result << 5 | value
+    return result
+
+
+# secp256k1 public key recovery
+
+
+def _jacobian_double(point):
+    x, y, z = point
+    if not y:
+        return 0, 0, 0
+    ysq = y * y % _P
+    s = 4 * x * ysq % _P
+    m = 3 * x * x % _P
+    nx = (m * m - 2 * s) % _P
+    ny = (m * (s - nx) - 8 * ysq * ysq) % _P
+    return nx, ny, 2 * y * z % _P
+
+
+def _jacobian_add(p, q):
+    if not p[1]:
+        return q
+    if not q[1]:
+        return p
+    z1z1 = p[2] * p[2] % _P
+    z2z2 = q[2] * q[2] % _P
+    u1 = p[0] * z2z2 % _P
+    u2 = q[0] * z1z1 % _P
+    s1 = p[1] * z2z2 * q[2] % _P
+    s2 = q[1] * z1z1 * p[2] % _P
+    if u1 == u2:
+        if s1 != s2:
+            return 0, 0, 1
+        return _jacobian_double(p)
+    h = u2 - u1
+    r = s2 - s1
+    hh = h * h % _P
+    hhh = h * hh % _P
+    v = u1 * hh % _P
+    nx = (r * r - hhh - 2 * v) % _P
+    ny = (r * (v - nx) - s1 * hhh) % _P
+    return nx, ny, h * p[2] * q[2] % _P
+
+
+def _double_multiply(a: int, p: tuple, b: int, q: tuple) -> tuple:
+    """
+    :return: a*p + b*q of affine points p and q, using Shamir's trick
+    """
+    p, q = (p[0], p[1], 1), (q[0], q[1], 1)
+    pq = _jacobian_add(p, q)
+    result = (0, 0, 1)
+    for i in range(max(a.bit_length(), b.bit_length()) - 1, -1, -1):
+        result = _jacobian_double(result)
+        bits = (a >> i & 1, b >> i & 1)
+        if bits == (1, 1):
+            result = _jacobian_add(result, pq)
+        elif bits == (1, 0):
+            result = _jacobian_add(result, p)
+        elif bits == (0, 1):
+            result = _jacobian_add(result, q)
+    x, y, z = result
+    if not y:
+        raise Bolt11Error("invalid signature")
+    z_inverse = pow(z, _P - 2, _P)
+    return x * z_inverse ** 2 % _P, y * z_inverse ** 3 % _P
+
+
+def recover_pubkey(digest: bytes, signature: bytes, recovery_id: int) -> bytes:
+    """
+    Recover the public key which produced a compact ECDSA signature.
+
+    :return: 33 byte compressed public key
+    """
+    r = int.from_bytes(signature[:32], "big")
+    s = int.from_bytes(signature[32:], "big")
+    if not 0 < r < _N or not 0 < s < _N or not 0 <= recovery_id <= 3:
+        raise Bolt11Error("invalid signature")
+    x = r + _N if recovery_id & 2 else r
+    if x >= _P:
+        raise Bolt11Error("invalid signature")
+    y = pow((x * x * x + 7) % _P, (_P + 1) // 4, _P)
+    if (y * y - x * x * x - 7) % _P:
+        raise Bolt11Error("invalid signature")
+    if y & 1 != recovery_id & 1:
+        y = _P - y
+    e = int.from_bytes(digest, "big")
+    r_inverse = pow(r, _N - 2, _N)
+    qx, qy = _double_multiply(-e * r_inverse % _N, _G, s * r_inverse % _N, (x, y))
+    return bytes([2 + (qy & 1)]) + qx.to_bytes(32, "big")
+
+
+# Decoding
+
+
+def _amount_msat(amount: str) -> int:
+    if not amount:
+        return 0
+    multiplier = amount[-1] if amount[-1] in "munp" else ""
+    digits = amount[:-1] if multiplier else amount
+    if not digits.isdigit() or digits.startswith("0"):
+        raise Bolt11Error("invalid amount")
+    numerator, denominator = MULTIPLIERS[multiplier]
+    msat, remainder = divmod(int(digits) * numerator, denominator)
+    if remainder:
+        raise Bolt11Error("amount is not a whole number of msat")
+    return msat
+
+
+def _route_hint(data: bytes) -> ln.RouteHint:
+    if not data or len(data) % 51:
+        raise Bolt11Error("invalid route hint length")
+    hint = ln.RouteHint()
+    for i in range(0, len(data), 51):
+        hop = data[i : i + 51]
+        hint.hop_hints.add(
+            node_id=hop[:33].hex(),
+            chan_id=int.from_bytes(hop[33:41], "big"),
+            fee_base_msat=int.from_bytes(hop[41:45], "big"),
+            fee_proportional_millionths=int.from_bytes(hop[45:49], "big"),
+            cltv_expiry_delta=int.from_bytes(hop[49:51], "big"),
+        )
+    return hint
+
+
+def decode(pay_req: str, network: str = None) -> ln.PayReq:
+    """
+    Decode a BOLT11 payment request locally, verifying its signature, into the
+    ln.PayReq lnd's DecodePayReq would return.
+
+    :param network: lnd network name the payment request must be for, if given
+    :raises Bolt11Error: if the payment request cannot be decoded locally, including
+    requests lnd would reject and features (fallback addresses) which are not
+    supported locally
+    """
+    hrp, data = bech32_decode(pay_req.strip())
+    if network is not None:
+        prefix = NETWORK_PREFIXES.get(network)
+        if prefix is None or not hrp.startswith(prefix):
+            raise Bolt11Error("payment request is not for network %s" % network)
+        # lnbc is a prefix of lnbcrt, so the amount must start with a digit
+        amount = hrp[len(prefix) :]
+        if amount and not amount[0].isdigit():
+            raise Bolt11Error("payment request is not for network %s" % network)
+    else:
+        prefix = max(
+            (p for p in NETWORK_PREFIXES.values() if hrp.startswith(p)),
+            key=len,
+            default=None,
+        )
+        if prefix is None:
+            raise Bolt11Error("unknown payment request prefix")
+        amount = hrp[len(prefix) :]
+    if len(data) < 7 + 104:
+        raise Bolt11Error("payment request is too short")
+
+    signature = _to_bytes(data[-104:])
+    # the signed data is zero padded to a whole number of bytes
+    digest = sha256(hrp.encode() + _to_bytes(data[:-104], pad=True)).digest()
+    pubkey = recover_pubkey(digest, signature[:64], signature[64])
+
+    pay_req_message = ln.PayReq(
+        num_satoshis=_amount_msat(amount) // 1000,
+        timestamp=_to_int(data[:7]),
+        expiry=DEFAULT_EXPIRY,
+        cltv_expiry=DEFAULT_MIN_FINAL_CLTV_EXPIRY,
+    )
+    position = 7
+    fields = data[:-104]
+    while position < len(fields):
+        if position + 3 > len(fields):
+            raise Bolt11Error("truncated tagged field")
+        tag = fields[position]
+        length = fields[position + 1] << 5 | fields[position + 2]
+        value = fields[position + 3 : position + 3 + length]
+        if len(value) != length:
+            raise Bolt11Error("truncated tagged field")
+        position += 3 + length
+        # fields of the wrong length must be skipped (BOLT11)
+        if tag == TAG_PAYMENT_HASH and length == 52:
+            pay_req_message.payment_hash = _to_bytes(value).hex()
+        elif tag == TAG_DESCRIPTION_HASH and length == 52:
+            pay_req_message.description_hash = _to_bytes(value).hex()
+        elif tag == TAG_DESTINATION and length == 53:
+            if _to_bytes(value) != pubkey:
+                raise Bolt11Error("signature does not match destination")
+        elif tag == TAG_DESCRIPTION:
+            try:
+                pay_req_message.description = _to_bytes(value).decode()
+            except UnicodeDecodeError:
+                raise Bolt11Error("invalid description")
+        elif tag == TAG_EXPIRY:
+            pay_req_message.expiry = _to_int(value)
+        elif tag == TAG_MIN_FINAL_CLTV_EXPIRY:
+            pay_req_message.cltv_expiry = _to_int(value)
+        elif tag == TAG_ROUTE_HINT:
+            pay_req_message.route_hints.append(_route_hint(_to_bytes(value)))
+        elif tag == TAG_FALLBACK:
+            raise Bolt11Error("fallback addresses are not decoded locally")
+    if not pay_req_message.payment_hash:
+        raise Bolt11Error("payment request has no payment hash")
+    if not pay_req_message.description and not pay_req_message.description_hash:
+        raise Bolt11Error("payment request has no description or description hash")
+    if pay_req_message.description and pay_req_message.description_hash:
+        # lnd rejects requests with both
+        raise Bolt11Error("payment request has both a description and a hash")
+    pay_req_message.destination = pubkey.hex()
+    return pay_req_message
+
+
+class PayReqDecoder:
+    """
+    Decodes payment requests locally, remembering the most recently used `max_size`
+    results, so repeatedly decoding the same request costs a dictionary lookup.
+    """
+
+    def __init__(self, max_size: int = PAY_REQ_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, pay_req: str, network: str = None) -> ln.PayReq:
+        """
+        :raises Bolt11Error: as decode()
+        :return: a new ln.PayReq
+        """
+        key = (pay_req, network)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+        if cached is None:
+            cached = decode(pay_req, network)
+            with self._lock:
+                self.misses += 1
+                self._cache[key] = cached
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+        # callers get their own copy of the cached message
+        result = ln.PayReq()
+        result.CopyFrom(cached)
+        return result
+
+    def __len__(self):
+        return len(self._cache)
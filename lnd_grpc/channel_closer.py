@@ -0,0 +1,160 @@
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# a CloseStatusUpdate tagged with the channel point it belongs to
+CloseUpdate = namedtuple("CloseUpdate", ["channel_point", "update"])
+
+INITIATING = "initiating"
+PENDING = "pending"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+# marks the end of the merged update stream
+_END = object()
+
+
+class ChannelCloser:
+    """
+    Closes many channels concurrently.
+
+    CloseChannel streams are initiated with at most `max_parallel` in flight at once
+    (a slot is released as soon as lnd reports the close as pending) and all of their
+    CloseStatusUpdates are merged into a single iterator of CloseUpdate(channel_point,
+    update) tuples.
+
+    By default each stream is cancelled once the close is pending, as lnd carries on
+    with the close regardless. With follow_confirmations=True the streams are kept open
+    so that chan_close updates are also reported and closes are marked confirmed.
+    """
+
+    def __init__(
+        self,
+        close_channel,
+        channel_points: list,
+        max_parallel: int = 10,
+        follow_confirmations: bool = False,
+        **kwargs
+    ):
+        """
+        :param close_channel: callable taking a channel_point string (plus kwargs) and
+        returning a CloseChannel response iterator, e.g. Lightning.close_channel
+        :param kwargs: passed on to close_channel for every channel
+        """
+        # each channel is closed once, however often it is listed
+        channel_points = list(dict.fromkeys(channel_points))
+        self.close_channel = close_channel
+        self.follow_confirmations = follow_confirmations
+        self.kwargs = kwargs
+        self.status = {channel_point: INITIATING for channel_point in channel_points}
+        self.errors = {}
+        self._updates = queue.Queue()
+        self._lock = threading.Lock()
+        self._remaining = len(self.status)
+        self._done = threading.Event()
+        if not self._remaining:
+            self._finish()
+            return
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel)
+        for channel_point in channel_points:
+            self._executor.submit(self._initiate, channel_point)
+        self._executor.shutdown(wait=False)
+
+    def _initiate(self, channel_point: str):
+        stream = None
+        try:
+            stream = self.close_channel(channel_point=channel_point, **self.kwargs)
+            for update in stream:
+                self._publish(channel_point, update)
+                if update.HasField("close_pending"):
+                    break
+            else:
+                # the close may or may not have been initiated
+                self._fail(
+                    channel_point,
+                    RuntimeError("close stream ended before the close was pending"),
+                )
+                return
+        except Exception as e:
+            # e.g. a malformed channel point, as well as a grpc.RpcError
+            if stream is not None:
+                stream.cancel()
+            self._fail(channel_point, e)
+            return
+        if not self.follow_confirmations:
+            stream.cancel()
+            self._stream_done(channel_point)
+            return
+        # release the slot and keep following the stream until confirmation
+        threading.Thread(
+            target=self._follow, args=(channel_point, stream), daemon=True
+        ).start()
+
+    def _follow(self, channel_point: str, stream):
+        try:
+            for update in stream:
+                self._publish(channel_point, update)
+        except Exception as e:
+            stream.cancel()
+            self._fail(channel_point, e)
+            return
+        self._stream_done(channel_point)
+
+    def _publish(self, channel_point: str, update):
+        with self._lock:
+            if update.HasField("chan_close"):
+                self.status[channel_point] = CONFIRMED
+            elif update.HasField("close_pending"):
+                self.status[channel_point] = PENDING
+        self._updates.put(CloseUpdate(channel_point, update))
+
+    def _fail(self, channel_point: str, error: Exception):
+        with self._lock:
+            self.status[channel_point] = FAILED
+            self.errors[channel_point] = error
+        self._stream_done(channel_point)
+
+    def _stream_done(self, channel_point: str):
+        with self._lock:
+            self._remaining -= 1
+            finished = self._remaining == 0
+        if finished:
+            self._finish()
+
+    def _finish(self):
+        self._done.set()
+        self._updates.put(_END)
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until every close has been initiated (and confirmed, if following
+        confirmations) or has failed
+
+        :return: True if finished, False on timeout
+        """
+        return self._done.wait(timeout)
+
+    def summary(self) -> dict:
+        """
+        :return: dict of lists of channel points which are 'initiating', 'pending',
+        'confirmed' or 'failed'
+        """
+        summary = {INITIATING: [], PENDING: [], CONFIRMED: [], FAILED: []}
+        with self._lock:
+            for channel_point, status in self.status.items():
+                summary[status].append(channel_point)
+        return summary
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> CloseUpdate:
+        """
+        :return: the next CloseUpdate from any of the channels being closed
+        """
+        update = self._updates.get()
+        if update is _END:
+            self._updates.put(_END)
+            raise StopIteration
+        return update
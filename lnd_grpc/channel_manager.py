@@ -0,0 +1,259 @@
+import threading
+import time
+
+import grpc
+
+from lnd_grpc.config import (
+    CHANNEL_READY_TIMEOUT,
+    RECONNECT_BACKOFF_BASE,
+    RECONNECT_BACKOFF_MAX,
+)
+from lnd_grpc.interceptors import ClientInterceptor
+
+# connectivity states after which a channel is rebuilt
+FAILED_STATES = (
+    grpc.ChannelConnectivity.SHUTDOWN,
+    grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+)
+
+
+class InFlightCalls(ClientInterceptor):
+    """
+    Counts the calls in flight on a channel, so that once the channel has been replaced
+    it can be closed as soon as the last of them completes
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.retired = False
+        self.on_drained = None
+        self._lock = threading.Lock()
+
+    def call_started(self, method: str):
+        with self._lock:
+            self.count += 1
+
+    def call_finished(self, state, code: grpc.StatusCode):
+        with self._lock:
+            self.count -= 1
+            drained = self.retired and not self.count
+        if drained:
+            self.on_drained()
+
+    def retire(self, on_drained):
+        """
+        Call on_drained once no calls are in flight, which may be immediately
+        """
+        with self._lock:
+            self.retired = True
+            self.on_drained = on_drained
+            drained = not self.count
+        if drained:
+            on_drained()
+
+
+class ManagedChannel:
+    """
+    A channel together with the connection state machine used to decide when it
+    should be rebuilt.
+    """
+
+    def __init__(self, channel: grpc.Channel, calls: InFlightCalls, backoff: float):
+        self.channel = channel
+        self.calls = calls
+        self.state = None
+        self.stale = False
+        self.reconnects = 0
+        self.backoff = backoff
+        self.next_rebuild = 0.0
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self.stale or self.state in FAILED_STATES
+
+
+class ChannelManager:
+    """
+    Owns the gRPC channels of a client.
+
+    A single HTTP/2 channel is created per (address, credential set) and handed out to
+    every sub-service stub which needs it, so Lightning, Invoices and WalletUnlocker
+    stubs multiplex their calls over the same connection instead of each negotiating
+    their own TLS session.
+
+    Each channel's connectivity is tracked. A channel is reused while its state is
+    unknown, idle, connecting or ready, and only rebuilt after a real SHUTDOWN or
+    TRANSIENT_FAILURE (or when explicitly discarded). Consecutive rebuilds which do
+    not reach READY are spaced out with exponential backoff. A replaced channel is
+    closed once the calls in flight on it (e.g. open subscriptions) have completed.
+    """
+
+    def __init__(
+        self,
+        ready_timeout: float = CHANNEL_READY_TIMEOUT,
+        backoff_base: float = RECONNECT_BACKOFF_BASE,
+        backoff_max: float = RECONNECT_BACKOFF_MAX,
+    ):
+        self.ready_timeout = ready_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._channels = {}
+        self._retired = set()
+        self._lock = threading.Lock()
+
+    def channel(
+        self,
+        address: str,
+        credentials_key: tuple,
+        credentials,
+        options: list,
+        connectivity_callback=None,
+    ) -> grpc.Channel:
+        """
+        Return the channel for the address and credential set, creating or rebuilding
+        it if required. A newly created channel is given up to `ready_timeout` seconds
+        to connect before it is returned.
+
+        :param credentials: a callable returning grpc.ChannelCredentials, only called
+        when a new channel needs to be created
+        :param connectivity_callback: called with each connectivity update of the
+        channel
+        :return: grpc.Channel
+        """
+        key = (address, credentials_key)
+        with self._lock:
+            managed = self._channels.get(key)
+            if managed is not None and not managed.needs_rebuild:
+                return managed.channel
+            now = time.monotonic()
+            if managed is not None and now < managed.next_rebuild:
+                # still backing off from the previous rebuild
+                return managed.channel
+
+            calls = InFlightCalls()
+            channel = self._create_channel(address, credentials(), options, calls)
+            retired = None
+            if managed is None:
+                managed = ManagedChannel(channel, calls, self.backoff_base)
+                self._channels[key] = managed
+            else:
+                retired = (managed.channel, managed.calls)
+                self._retired.add(retired)
+                managed.channel = channel
+                managed.calls = calls
+                managed.state = None
+                managed.stale = False
+                managed.reconnects += 1
+                managed.next_rebuild = now + managed.backoff
+                managed.backoff = min(managed.backoff * 2, self.backoff_max)
+            backoff_end = managed.next_rebuild - now
+            self._watch_channel(managed, channel, connectivity_callback)
+
+        if retired is not None:
+            retired[1].retire(lambda: self._close_retired(retired))
+        self._wait_ready(channel)
+        # the backoff period starts once the new channel has had its chance to connect
+        if backoff_end > 0:
+            managed.next_rebuild = time.monotonic() + backoff_end
+        return channel
+
+    @staticmethod
+    def _create_channel(
+        address: str, credentials, options: list, calls: InFlightCalls
+    ) -> grpc.Channel:
+        channel = grpc.secure_channel(
+            target=address, credentials=credentials, options=options
+        )
+        return grpc.intercept_channel(channel, calls)
+
+    def _close_retired(self, retired: tuple):
+        with self._lock:
+            if retired not in self._retired:
+                # already closed along with the manager
+                return
+            self._retired.discard(retired)
+        self._close_channel(retired[0])
+
+    @staticmethod
+    def _close_channel(channel):
+        # the last call may complete on one of grpc's own threads, which must not
+        # close the channel it is serving
+        threading.Thread(target=channel.close, daemon=True).start()
+
+    def _set_state(self, managed, connectivity, callback):
+        managed.state = connectivity
+        if connectivity == grpc.ChannelConnectivity.READY:
+            managed.backoff = self.backoff_base
+        if callback is not None:
+            callback(connectivity)
+
+    def _watch_channel(self, managed, channel, callback):
+        """
+        Track the connectivity state of a newly created channel
+        """
+
+        def update_state(connectivity):
+            # ignore late updates from a channel which has since been replaced
+            if managed.channel is channel:
+                self._set_state(managed, connectivity, callback)
+
+        channel.subscribe(update_state)
+
+    def _wait_ready(self, channel):
+        try:
+            grpc.channel_ready_future(channel).result(timeout=self.ready_timeout)
+        except grpc.FutureTimeoutError:
+            # leave it to the call itself to fail or wait on the connection
+            pass
+
+    def discard(self, address: str, credentials_key: tuple):
+        """
+        Mark the channel for the address and credential set as stale so that it is
+        rebuilt on next use. The old channel is only closed once calls already in
+        flight on it (e.g. open subscriptions) have completed.
+        """
+        with self._lock:
+            managed = self._channels.get((address, credentials_key))
+            if managed is not None:
+                managed.stale = True
+
+    def reconnects(self, address: str = None, credentials_key: tuple = None) -> int:
+        """
+        :return: number of times channels have been rebuilt, optionally only for the
+        given address and credential set
+        """
+        with self._lock:
+            if address is not None:
+                managed = self._channels.get((address, credentials_key))
+                return managed.reconnects if managed is not None else 0
+            return sum(managed.reconnects for managed in self._channels.values())
+
+    def stats(self) -> dict:
+        """
+        :return: dict of connectivity state name and reconnect count per
+        (address, credential set)
+        """
+        with self._lock:
+            return {
+                key: {
+                    "state": managed.state._name_ if managed.state else None,
+                    "reconnects": managed.reconnects,
+                }
+                for key, managed in self._channels.items()
+            }
+
+    def close(self):
+        """
+        Close all channels owned by the manager, including replaced channels which
+        still have calls in flight
+        """
+        with self._lock:
+            channels = [managed.channel for managed in self._channels.values()]
+            channels.extend(channel for channel, _ in self._retired)
+            self._channels.clear()
+            self._retired.clear()
+        for channel in channels:
+            channel.close()
+
+    def __len__(self):
+        return len(self._channels)
@@ -0,0 +1,278 @@
+import threading
+
+import grpc
+
+ROUND_ROBIN = "round_robin"
+LEAST_IN_FLIGHT = "least_in_flight"
+STRATEGIES = (ROUND_ROBIN, LEAST_IN_FLIGHT)
+
+# stops grpc sharing one connection (subchannel) between the channels of a pool
+LOCAL_SUBCHANNEL_POOL = ("grpc.use_local_subchannel_pool", 1)
+
+
+class ChannelPool(grpc.Channel):
+    """
+    A pool of channels to the same lnd which stands in for a single grpc.Channel.
+
+    A single HTTP/2 connection caps the number of concurrent streams and serialises all
+    traffic over one TCP socket. A pool spreads calls over `size` independent
+    connections: each call made through a stub built on the pool picks a member
+    channel, either in turn (round_robin) or the one with the fewest calls in flight
+    (least_in_flight).
+
+    Member channels are owned by a ChannelManager, so each one is reused and rebuilt
+    after a failure exactly like the client's single shared channel.
+    """
+
+    def __init__(
+        self,
+        channel_manager,
+        address: str,
+        credentials_key: tuple,
+        credentials,
+        options: list,
+        size: int,
+        strategy: str = ROUND_ROBIN,
+        connectivity_callback=None,
+    ):
+        """
+        :param credentials: a callable returning grpc.ChannelCredentials
+        :param strategy: 'round_robin' or 'least_in_flight'
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(
+                "invalid pool strategy %s, supported strategies are: %s"
+                % (strategy, ", ".join(STRATEGIES))
+            )
+        if size < 1:
+            raise ValueError("pool size must be at least 1")
+        self.channel_manager = channel_manager
+        self.address = address
+        self.credentials_key = credentials_key
+        self.credentials = credentials
+        self.options = list(options) + [LOCAL_SUBCHANNEL_POOL]
+        self.size = size
+        self.strategy = strategy
+        self.connectivity_callback = connectivity_callback
+        self.calls = [0] * size
+        self._in_flight = [0] * size
+        self._next = 0
+        self._lock = threading.Lock()
+        self._callables = {}
+
+    def member_key(self, index: int) -> tuple:
+        """
+        :return: the channel manager credentials key of a member channel
+        """
+        return self.credentials_key + ("pool", index)
+
+    def member(self, index: int) -> grpc.Channel:
+        """
+        :return: the member channel at index, created or rebuilt if required
+        """
+        return self.channel_manager.channel(
+            address=self.address,
+            credentials_key=self.member_key(index),
+            credentials=self.credentials,
+            options=self.options,
+            connectivity_callback=self.connectivity_callback,
+        )
+
+    def discard(self):
+        """
+        Mark every member channel as stale so that they are rebuilt on next use
+        """
+        for index in range(self.size):
+            self.channel_manager.discard(self.address, self.member_key(index))
+
+    @property
+    def in_flight(self) -> list:
+        """
+        :return: number of calls currently in flight on each member channel
+        """
+        with self._lock:
+            return list(self._in_flight)
+
+    def stats(self) -> list:
+        """
+        :return: list of dicts of calls in flight and total calls per member channel
+        """
+        with self._lock:
+            return [
+                {"in_flight": in_flight, "calls": calls}
+                for in_flight, calls in zip(self._in_flight, self.calls)
+            ]
+
+    def _acquire(self) -> int:
+        with self._lock:
+            if self.strategy == LEAST_IN_FLIGHT:
+                # ties go to the next channel in turn so idle channels are all used
+                start = self._next
+                index = (
+                    min(
+                        range(start, start + self.size),
+                        key=lambda i: self._in_flight[i % self.size],
+                    )
+                    % self.size
+                )
+            else:
+                index = self._next
+            self._next = (index + 1) % self.size
+            self._in_flight[index] += 1
+            self.calls[index] += 1
+            return index
+
+    def _release(self, index: int):
+        with self._lock:
+            self._in_flight[index] -= 1
+
+    def _multi_callable(self, index: int, kind: str, method: str, serializers: tuple):
+        channel = self.member(index)
+        key = (index, kind, method)
+        cached = self._callables.get(key)
+        if cached is not None and cached[0] is channel:
+            return cached[1]
+        request_serializer, response_deserializer = serializers
+        multi_callable = getattr(channel, kind)(
+            method,
+            request_serializer=request_serializer,
+            response_deserializer=response_deserializer,
+        )
+        self._callables[key] = (channel, multi_callable)
+        return multi_callable
+
+    # grpc.Channel interface
+
+    def subscribe(self, callback, try_to_connect=False):
+        for index in range(self.size):
+            self.member(index).subscribe(callback, try_to_connect=try_to_connect)
+
+    def unsubscribe(self, callback):
+        for index in range(self.size):
+            self.member(index).unsubscribe(callback)
+
+    def unary_unary(
+        self,
+        method,
+        request_serializer=None,
+        response_deserializer=None,
+        *args,
+        **kwargs
+    ):
+        return _UnaryResponseMultiCallable(
+            self, "unary_unary", method, (request_serializer, response_deserializer)
+        )
+
+    def stream_unary(
+        self,
+        method,
+        request_serializer=None,
+        response_deserializer=None,
+        *args,
+        **kwargs
+    ):
+        return _UnaryResponseMultiCallable(
+            self, "stream_unary", method, (request_serializer, response_deserializer)
+        )
+
+    def unary_stream(
+        self,
+        method,
+        request_serializer=None,
+        response_deserializer=None,
+        *args,
+        **kwargs
+    ):
+        return _StreamResponseMultiCallable(
+            self, "unary_stream", method, (request_serializer, response_deserializer)
+        )
+
+    def stream_stream(
+        self,
+        method,
+        request_serializer=None,
+        response_deserializer=None,
+        *args,
+        **kwargs
+    ):
+        return _StreamResponseMultiCallable(
+            self, "stream_stream", method, (request_serializer, response_deserializer)
+        )
+
+    def close(self):
+        """
+        Stop using the current member channels. The channels themselves are owned (and
+        closed) by the channel manager.
+        """
+        self.discard()
+        self._callables.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+class _PooledMultiCallable:
+    """
+    Picks a member channel of the pool for each call and tracks it while in flight
+    """
+
+    def __init__(self, pool: ChannelPool, kind: str, method: str, serializers: tuple):
+        self._pool = pool
+        self._kind = kind
+        self._method = method
+        self._serializers = serializers
+
+    def _acquire(self):
+        index = self._pool._acquire()
+        try:
+            multi_callable = self._pool._multi_callable(
+                index, self._kind, self._method, self._serializers
+            )
+        except Exception:
+            self._pool._release(index)
+            raise
+        return index, multi_callable
+
+
+class _UnaryResponseMultiCallable(_PooledMultiCallable):
+    def __call__(self, request, *args, **kwargs):
+        index, multi_callable = self._acquire()
+        try:
+            return multi_callable(request, *args, **kwargs)
+        finally:
+            self._pool._release(index)
+
+    def with_call(self, request, *args, **kwargs):
+        index, multi_callable = self._acquire()
+        try:
+            return multi_callable.with_call(request, *args, **kwargs)
+        finally:
+            self._pool._release(index)
+
+    def future(self, request, *args, **kwargs):
+        index, multi_callable = self._acquire()
+        try:
+            future = multi_callable.future(request, *args, **kwargs)
+        except Exception:
+            self._pool._release(index)
+            raise
+        future.add_done_callback(lambda _: self._pool._release(index))
+        return future
+
+
+class _StreamResponseMultiCallable(_PooledMultiCallable):
+    def __call__(self, request, *args, **kwargs):
+        index, multi_callable = self._acquire()
+        try:
+            call = multi_callable(request, *args, **kwargs)
+        except Exception:
+            self._pool._release(index)
+            raise
+        if not call.add_callback(lambda: self._pool._release(index)):
+            # the call has already terminated
+            self._pool._release(index)
+        return call
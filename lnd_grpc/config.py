@@ -31,3 +31,60 @@ GRPC_OPTIONS = [
     ("grpc.max_receive_message_length", 33554432),
     ("grpc.max_send_message_length", 33554432),
 ]
+
+# seconds between checks of the macaroon file for changes
+MACAROON_STAT_INTERVAL = 1.0
+
+# seconds to wait for a new channel to become ready before using it anyway
+CHANNEL_READY_TIMEOUT = 5.0
+
+# exponential backoff (seconds) between consecutive channel rebuilds
+RECONNECT_BACKOFF_BASE = 0.5
+RECONNECT_BACKOFF_MAX = 30.0
+
+# seconds to cache responses of read-mostly RPCs for, when the response cache is on
+RESPONSE_CACHE_TTLS = {
+    "get_info": 5.0,
+    "get_node_info": 60.0,
+    "get_chan_info": 60.0,
+    "get_network_info": 60.0,
+    "fee_report": 30.0,
+    "decode_pay_req": 3600.0,
+}
+RESPONSE_CACHE_SIZE = 1024
+
+# number of decoded payment requests remembered by the local BOLT11 decoder
+PAY_REQ_CACHE_SIZE = 1024
+
+# default number of events a BoundedStream queues before its overflow policy applies
+STREAM_QUEUE_SIZE = 1024
+
+# seconds between lookups of the hold invoices watched by an event hub, and the number
+# of those lookups in flight at once
+HOLD_INVOICE_POLL_INTERVAL = 1.0
+HOLD_INVOICE_POLL_BATCH = 100
+
+# threads running `future` variants of wrappers built on several RPCs
+FUTURE_WORKERS = 8
+
+# histogram buckets of the metrics interceptor, in seconds and bytes
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# streamed responses grouped into each batch span by the tracing interceptor
+TRACE_BATCH_SIZE = 100
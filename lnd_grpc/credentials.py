@@ -0,0 +1,103 @@
+import codecs
+import os
+import sys
+import threading
+import time
+
+from lnd_grpc.config import MACAROON_STAT_INTERVAL
+
+
+class MacaroonCache:
+    """
+    Loads a macaroon from disk once and keeps the hex-encoded gRPC metadata ready for
+    every subsequent call.
+
+    The file is only stat()ed at most once per `stat_interval` seconds, and only
+    re-read if its inode or mtime has changed (e.g. macaroon re-baked or lnd re-created
+    its data dir). Hits and misses are counted so callers can confirm that the hot path
+    no longer touches the disk.
+    """
+
+    def __init__(self, stat_interval: float = MACAROON_STAT_INTERVAL):
+        self.stat_interval = stat_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._path = None
+        self._file_id = None
+        self._macaroon = None
+        self._metadata = None
+        self._next_check = 0.0
+
+    def invalidate(self):
+        """
+        Drop the cached macaroon so that it is re-read on the next call
+        """
+        with self._lock:
+            self._path = None
+            self._file_id = None
+            self._macaroon = None
+            self._metadata = None
+            self._next_check = 0.0
+
+    def metadata(self, path: str):
+        """
+        :return: gRPC metadata tuple containing the hex-encoded macaroon, or None if
+        the macaroon could not be read
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._metadata is not None and self._path == path:
+                if now < self._next_check:
+                    self.hits += 1
+                    return self._metadata
+                self._next_check = now + self.stat_interval
+                try:
+                    if self._stat(path) == self._file_id:
+                        self.hits += 1
+                        return self._metadata
+                except FileNotFoundError:
+                    pass
+            return self._load(path, now)
+
+    def macaroon(self, path: str) -> bytes:
+        """
+        :return: the hex-encoded macaroon as a byte string
+        """
+        if self.metadata(path) is None:
+            return None
+        return self._macaroon
+
+    def _load(self, path: str, now: float):
+        self.misses += 1
+        try:
+            file_id = self._stat(path)
+            with open(path, "rb") as f:
+                macaroon_bytes = f.read()
+        except FileNotFoundError:
+            sys.stderr.write(
+                f"Could not find macaroon in {path}. This might happen"
+                f"in versions of lnd < v0.5-beta or those not using default"
+                f"installation path. Set client object's macaroon_path attribute"
+                f"manually."
+            )
+            self._metadata = None
+            return None
+        self._path = path
+        self._file_id = file_id
+        self._macaroon = codecs.encode(macaroon_bytes, "hex")
+        self._metadata = (("macaroon", self._macaroon),)
+        self._next_check = now + self.stat_interval
+        return self._metadata
+
+    @staticmethod
+    def _stat(path: str):
+        stat = os.stat(path)
+        return stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @property
+    def stats(self) -> dict:
+        """
+        :return: dict of cache 'hits' and 'misses'
+        """
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,454 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import traceback
+from collections import defaultdict
+
+import grpc
+
+import lnd_grpc.protos.rpc_pb2 as ln
+from lnd_grpc.config import (
+    HOLD_INVOICE_POLL_BATCH,
+    HOLD_INVOICE_POLL_INTERVAL,
+    RECONNECT_BACKOFF_BASE,
+    RECONNECT_BACKOFF_MAX,
+)
+from lnd_grpc.invoice_subscription import AioInvoiceSubscription, InvoiceSubscription
+
+INVOICE = "invoice"
+HOLD_INVOICE = "hold_invoice"
+CHANNEL = "channel"
+GRAPH = "graph"
+
+# Invoice states by value, so that the module imports with a descriptor set trimmed of
+# the Invoice message
+INVOICE_OPEN = 0
+INVOICE_SETTLED = 1
+INVOICE_CANCELED = 2
+INVOICE_ACCEPTED = 3
+# states after which an invoice will not change again
+FINAL_INVOICE_STATES = (INVOICE_SETTLED, INVOICE_CANCELED)
+# states reported by the shared SubscribeInvoices stream. Hold invoices being accepted
+# and canceled are only found by looking them up.
+SHARED_INVOICE_STATES = (INVOICE_OPEN, INVOICE_SETTLED)
+
+
+def channel_point_str(channel_point) -> str:
+    """
+    :return: a ChannelPoint message as a "funding_txid:output_index" string
+    """
+    if channel_point.WhichOneof("funding_txid") == "funding_txid_bytes":
+        # txids are displayed byte-reversed
+        txid = channel_point.funding_txid_bytes[::-1].hex()
+    else:
+        txid = channel_point.funding_txid_str
+    return "%s:%d" % (txid, channel_point.output_index)
+
+
+def _payment_hash(payment_hash) -> bytes:
+    if isinstance(payment_hash, str):
+        return bytes.fromhex(payment_hash)
+    return bytes(payment_hash)
+
+
+def _channel_event_point(event: ln.ChannelEventUpdate) -> str:
+    channel = event.WhichOneof("channel")
+    if channel in ("open_channel", "closed_channel"):
+        return getattr(event, channel).channel_point
+    if channel in ("active_channel", "inactive_channel"):
+        return channel_point_str(getattr(event, channel))
+    return None
+
+
+class EventHub:
+    """
+    Shares one SubscribeInvoices, one SubscribeChannelEvents and one
+    SubscribeChannelGraph stream between any number of in-process listeners.
+
+    Listeners are callables registered against a payment hash (for invoices), a
+    channel point (for channel events and graph updates of that channel) or against
+    None to receive every event of their kind, so watching thousands of invoices costs
+    a dictionary entry each rather than a stream and a thread each.
+
+    SubscribeInvoices only reports invoices being added and settled. The invoices of
+    hold invoice listeners (hold=True) are also looked up every
+    HOLD_INVOICE_POLL_INTERVAL seconds, HOLD_INVOICE_POLL_BATCH lookups at a time, by
+    a single thread, which reports their current state and them being accepted and
+    canceled. They stop being looked up once settled or canceled.
+
+    Channel point listeners receive ChannelEventUpdates as well as the
+    ChannelEdgeUpdates and ClosedChannelUpdates found in graph updates for the channel.
+    Listeners are called on the hub's threads and should return promptly; an exception
+    raised by a listener is printed to stderr and does not affect other listeners.
+    """
+
+    def __init__(self, client, add_index: int = 0, settle_index: int = 0):
+        """
+        :param client: a Lightning client
+        :param add_index: resume invoice events after this add_index
+        :param settle_index: resume invoice events after this settle_index
+        """
+        self.client = client
+        self.invoices = InvoiceSubscription(
+            client,
+            add_index=add_index,
+            settle_index=settle_index,
+            callback=self._dispatch_invoice,
+        )
+        self.dispatched = {INVOICE: 0, HOLD_INVOICE: 0, CHANNEL: 0, GRAPH: 0}
+        self._listeners = {
+            INVOICE: defaultdict(list),
+            HOLD_INVOICE: defaultdict(list),
+            CHANNEL: defaultdict(list),
+            GRAPH: defaultdict(list),
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        # subscribe function to its current subscription
+        self._subscriptions = {}
+        # payment hash of each invoice with hold listeners to the last state they were
+        # given, or None
+        self._held = {}
+
+    def start(self):
+        """
+        Open the shared subscriptions on daemon threads
+        """
+        if self._threads:
+            return self
+        self._stop.clear()
+        self.invoices.start()
+        for subscribe, dispatch in (
+            (self.client.subscribe_channel_events, self._dispatch_channel_event),
+            (self.client.subscribe_channel_graph, self._dispatch_graph_update),
+        ):
+            thread = threading.Thread(
+                target=self._follow,
+                args=(subscribe, dispatch),
+                name="event-hub",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._poll_held, name="event-hub", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def _follow(self, subscribe, dispatch):
+        backoff = RECONNECT_BACKOFF_BASE
+        while not self._stop.is_set():
+            try:
+                subscription = subscribe()
+                self._subscriptions[subscribe] = subscription
+                if self._stop.is_set():
+                    subscription.cancel()
+                for event in subscription:
+                    backoff = RECONNECT_BACKOFF_BASE
+                    dispatch(event)
+            except grpc.RpcError:
+                pass
+            if self._stop.wait(backoff):
+                return
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    def stop(self):
+        """
+        Close the shared subscriptions. Registered listeners are kept.
+        """
+        self._stop.set()
+        self.invoices.stop()
+        for subscription in list(self._subscriptions.values()):
+            subscription.cancel()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._subscriptions = {}
+
+    def _held_batches(self) -> list:
+        """
+        :return: the payment hashes of the hold invoices still to be looked up, in
+        lists of at most HOLD_INVOICE_POLL_BATCH
+        """
+        with self._lock:
+            payment_hashes = [
+                payment_hash
+                for payment_hash, state in self._held.items()
+                if state not in FINAL_INVOICE_STATES
+            ]
+        return [
+            payment_hashes[start : start + HOLD_INVOICE_POLL_BATCH]
+            for start in range(0, len(payment_hashes), HOLD_INVOICE_POLL_BATCH)
+        ]
+
+    def _poll_held(self):
+        while not self._stop.wait(HOLD_INVOICE_POLL_INTERVAL):
+            for batch in self._held_batches():
+                lookups = [
+                    self.client.future.lookup_invoice(r_hash=payment_hash)
+                    for payment_hash in batch
+                ]
+                for payment_hash, lookup in zip(batch, lookups):
+                    try:
+                        invoice = lookup.result()
+                    except grpc.RpcError:
+                        # not added yet, or lnd is unavailable until the next round
+                        continue
+                    self._dispatch_held(payment_hash, invoice)
+
+    def _dispatch_held(self, payment_hash: bytes, invoice: ln.Invoice):
+        """
+        Hand an invoice to its hold listeners unless they were already given its state
+        """
+        with self._lock:
+            if payment_hash not in self._held:
+                return
+            if self._held[payment_hash] == invoice.state:
+                return
+            self._held[payment_hash] = invoice.state
+        self.dispatched[HOLD_INVOICE] += 1
+        self._dispatch(HOLD_INVOICE, payment_hash, invoice, wildcard=False)
+
+    # Listeners
+
+    def _add_listener(self, kind: str, key, callback):
+        with self._lock:
+            self._listeners[kind][key].append(callback)
+        return kind, key, callback
+
+    def add_invoice_listener(self, callback, payment_hash=None, hold: bool = False):
+        """
+        Call callback(invoice) for every update to the invoice with payment_hash, or
+        for every invoice update if payment_hash is None
+
+        :param payment_hash: bytes or hex string
+        :param hold: also look the invoice up periodically, reporting its current
+        state and it being accepted and canceled. Requires a payment_hash.
+        :return: a listener handle for remove_listener()
+        """
+        if payment_hash is not None:
+            payment_hash = _payment_hash(payment_hash)
+        if not hold:
+            return self._add_listener(INVOICE, payment_hash, callback)
+        if payment_hash is None:
+            raise ValueError("hold invoice listeners require a payment_hash")
+        with self._lock:
+            self._listeners[HOLD_INVOICE][payment_hash].append(callback)
+            self._held.setdefault(payment_hash, None)
+        return HOLD_INVOICE, payment_hash, callback
+
+    def add_channel_listener(self, callback, channel_point: str = None):
+        """
+        Call callback(update) for every channel event or graph update of the channel
+        with channel_point ("funding_txid:output_index"), or callback(event) for every
+        channel event if channel_point is None
+
+        :return: a listener handle for remove_listener()
+        """
+        return self._add_listener(CHANNEL, channel_point, callback)
+
+    def add_graph_listener(self, callback):
+        """
+        Call callback(update) for every GraphTopologyUpdate
+
+        :return: a listener handle for remove_listener()
+        """
+        return self._add_listener(GRAPH, None, callback)
+
+    def remove_listener(self, listener):
+        """
+        Unregister a listener returned by one of the add_*_listener() methods
+        """
+        kind, key, callback = listener
+        with self._lock:
+            callbacks = self._listeners[kind].get(key)
+            if callbacks and callback in callbacks:
+                callbacks.remove(callback)
+                if not callbacks:
+                    del self._listeners[kind][key]
+                    if kind == HOLD_INVOICE:
+                        del self._held[key]
+
+    def listener_count(self, kind: str = None) -> int:
+        """
+        :return: number of registered listeners, optionally of one kind only
+        """
+        kinds = self._listeners if kind is None else (kind,)
+        with self._lock:
+            return sum(
+                len(callbacks)
+                for k in kinds
+                for callbacks in self._listeners[k].values()
+            )
+
+    def wait_invoice(
+        self, payment_hash, states=FINAL_INVOICE_STATES, timeout: float = None
+    ) -> ln.Invoice:
+        """
+        Block until the invoice with payment_hash reaches one of states.
+
+        Waiting for states which SubscribeInvoices does not report (the default
+        includes Invoice.CANCELED) follows the invoice through a hold listener, which
+        returns on its first lookup if the invoice is already in one of states.
+
+        :return: the Invoice update, or None if timeout elapsed first
+        """
+        hold = any(state not in SHARED_INVOICE_STATES for state in states)
+        reached = threading.Event()
+        result = []
+
+        def on_update(invoice):
+            if invoice.state in states and not reached.is_set():
+                result.append(invoice)
+                reached.set()
+
+        listener = self.add_invoice_listener(on_update, payment_hash, hold=hold)
+        try:
+            reached.wait(timeout)
+        finally:
+            self.remove_listener(listener)
+        return result[0] if result else None
+
+    # Dispatch
+
+    def _dispatch(self, kind: str, key, event, wildcard: bool = True):
+        with self._lock:
+            callbacks = list(self._listeners[kind].get(key, ()))
+            if wildcard and key is not None:
+                callbacks.extend(self._listeners[kind].get(None, ()))
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                traceback.print_exc()
+
+    def _dispatch_invoice(self, invoice: ln.Invoice):
+        self.dispatched[INVOICE] += 1
+        self._dispatch(INVOICE, invoice.r_hash, invoice)
+        self._dispatch_held(invoice.r_hash, invoice)
+
+    def _dispatch_channel_event(self, event: ln.ChannelEventUpdate):
+        self.dispatched[CHANNEL] += 1
+        self._dispatch(CHANNEL, _channel_event_point(event), event)
+
+    def _dispatch_graph_update(self, update: ln.GraphTopologyUpdate):
+        self.dispatched[GRAPH] += 1
+        self._dispatch(GRAPH, None, update)
+        with self._lock:
+            watched = {key for key in self._listeners[CHANNEL] if key is not None}
+        if not watched:
+            return
+        for channel_update in list(update.channel_updates) + list(update.closed_chans):
+            channel_point = channel_point_str(channel_update.chan_point)
+            if channel_point in watched:
+                # wildcard channel listeners only receive ChannelEventUpdates
+                self._dispatch(CHANNEL, channel_point, channel_update, wildcard=False)
+
+
+class AioEventHub(EventHub):
+    """
+    The asyncio counterpart of EventHub, for lnd_grpc.aio.Client. The shared
+    subscriptions are followed, and hold invoices looked up, in tasks, listeners are
+    called on the event loop and wait_invoice() is a coroutine.
+    """
+
+    def __init__(self, client, add_index: int = 0, settle_index: int = 0):
+        """
+        :param client: an asyncio Lightning client
+        :param add_index: resume invoice events after this add_index
+        :param settle_index: resume invoice events after this settle_index
+        """
+        super().__init__(client, add_index=add_index, settle_index=settle_index)
+        self.invoices = AioInvoiceSubscription(
+            client,
+            add_index=add_index,
+            settle_index=settle_index,
+            callback=self._dispatch_invoice,
+        )
+        self._tasks = []
+
+    def start(self):
+        """
+        Open the shared subscriptions in tasks
+        """
+        if self._tasks:
+            return self
+        self.invoices.start()
+        self._tasks = [
+            asyncio.ensure_future(self._follow(subscribe, dispatch))
+            for subscribe, dispatch in (
+                (self.client.subscribe_channel_events, self._dispatch_channel_event),
+                (self.client.subscribe_channel_graph, self._dispatch_graph_update),
+            )
+        ]
+        self._tasks.append(asyncio.ensure_future(self._poll_held()))
+        return self
+
+    async def _follow(self, subscribe, dispatch):
+        backoff = RECONNECT_BACKOFF_BASE
+        while True:
+            try:
+                subscription = subscribe()
+                self._subscriptions[subscribe] = subscription
+                async for event in subscription:
+                    backoff = RECONNECT_BACKOFF_BASE
+                    dispatch(event)
+            except grpc.RpcError:
+                pass
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    def stop(self):
+        """
+        Close the shared subscriptions. Registered listeners are kept.
+        """
+        self.invoices.stop()
+        for subscription in list(self._subscriptions.values()):
+            subscription.cancel()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._subscriptions = {}
+
+    async def _poll_held(self):
+        async def lookup(payment_hash):
+            try:
+                return await self.client.lookup_invoice(r_hash=payment_hash)
+            except grpc.RpcError:
+                # not added yet, or lnd is unavailable until the next round
+                return None
+
+        while True:
+            await asyncio.sleep(HOLD_INVOICE_POLL_INTERVAL)
+            for batch in self._held_batches():
+                lookups = [lookup(payment_hash) for payment_hash in batch]
+                invoices = await asyncio.gather(*lookups)
+                for payment_hash, invoice in zip(batch, invoices):
+                    if invoice is not None:
+                        self._dispatch_held(payment_hash, invoice)
+
+    async def wait_invoice(
+        self, payment_hash, states=FINAL_INVOICE_STATES, timeout: float = None
+    ) -> ln.Invoice:
+        """
+        Wait until the invoice with payment_hash reaches one of states, as
+        EventHub.wait_invoice()
+
+        :return: the Invoice update, or None if timeout elapsed first
+        """
+        hold = any(state not in SHARED_INVOICE_STATES for state in states)
+        reached = asyncio.get_running_loop().create_future()
+
+        def on_update(invoice):
+            if invoice.state in states and not reached.done():
+                reached.set_result(invoice)
+
+        listener = self.add_invoice_listener(on_update, payment_hash, hold=hold)
+        try:
+            return await asyncio.wait_for(reached, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.remove_listener(listener)
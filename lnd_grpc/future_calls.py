@@ -0,0 +1,290 @@
+import asyncio
+import inspect
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+
+from lnd_grpc.config import FUTURE_WORKERS
+
+# client attributes holding stubs, swapped for their future-returning counterparts
+STUB_ATTRIBUTES = (
+    "lightning_stub",
+    "raw_lightning_stub",
+    "invoice_stub",
+    "wallet_unlocker_stub",
+)
+
+# wrapper methods which make exactly one unary RPC through the stubs above, so that
+# running them against future stubs gives a future of their result
+SINGLE_RPC_METHODS = frozenset(
+    (
+        "abandon_channel",
+        "add_hold_invoice",
+        "add_invoice",
+        "cancel_invoice",
+        "channel_balance",
+        "closed_channels",
+        "connect_peer",
+        "debug_level",
+        "decode_pay_req",
+        "delete_all_payments",
+        "describe_graph",
+        "disconnect_peer",
+        "export_all_channel_backups",
+        "export_chan_backup",
+        "fee_report",
+        "forwarding_history",
+        "gen_seed",
+        "get_chan_info",
+        "get_info",
+        "get_network_info",
+        "get_node_info",
+        "get_transactions",
+        "list_channels",
+        "list_invoices",
+        "list_payments",
+        "list_peers",
+        "list_unspent",
+        "lookup_invoice",
+        "new_address",
+        "open_channel_sync",
+        "pending_channels",
+        "query_routes",
+        "restore_chan_backup",
+        "send_coins",
+        "send_many",
+        "send_payment_sync",
+        "send_to_route_sync",
+        "settle_invoice",
+        "sign_message",
+        "stop_daemon",
+        "update_channel_policy",
+        "verify_chan_backup",
+        "verify_message",
+        "wallet_balance",
+    )
+)
+
+# runs wrapper methods which cannot be expressed as a single future of an RPC
+_executor = None
+
+
+class ResponseFuture(grpc.Future):
+    """
+    A grpc.Future, optionally mapping the response before it is returned.
+
+    Attribute access on the future itself returns a new ResponseFuture of that
+    attribute of the response, so wrapper methods which return e.g. `response.peers`
+    produce a future of the peers.
+    """
+
+    def __init__(self, future: grpc.Future, transform=None):
+        self._future = future
+        self._transform = transform
+
+    def cancel(self):
+        return self._future.cancel()
+
+    def cancelled(self):
+        return self._future.cancelled()
+
+    def running(self):
+        return self._future.running()
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        response = self._future.result(timeout=timeout)
+        if self._transform is not None:
+            return self._transform(response)
+        return response
+
+    def exception(self, timeout=None):
+        return self._future.exception(timeout=timeout)
+
+    def traceback(self, timeout=None):
+        return self._future.traceback(timeout=timeout)
+
+    def add_done_callback(self, fn):
+        self._future.add_done_callback(lambda _: fn(self))
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        transform = self._transform
+
+        def get(response):
+            if transform is not None:
+                response = transform(response)
+            return getattr(response, name)
+
+        return ResponseFuture(self._future, get)
+
+
+class ExecutorFuture(grpc.Future):
+    """
+    A grpc.Future of a call running on a concurrent.futures executor
+    """
+
+    def __init__(self, future: futures.Future):
+        self._future = future
+
+    def cancel(self):
+        return self._future.cancel()
+
+    def cancelled(self):
+        return self._future.cancelled()
+
+    def running(self):
+        return self._future.running()
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        try:
+            return self._future.result(timeout=timeout)
+        except futures.TimeoutError:
+            raise grpc.FutureTimeoutError()
+        except futures.CancelledError:
+            raise grpc.FutureCancelledError()
+
+    def exception(self, timeout=None):
+        try:
+            return self._future.exception(timeout=timeout)
+        except futures.TimeoutError:
+            raise grpc.FutureTimeoutError()
+        except futures.CancelledError:
+            raise grpc.FutureCancelledError()
+
+    def traceback(self, timeout=None):
+        exception = self.exception(timeout=timeout)
+        return exception.__traceback__ if exception is not None else None
+
+    def add_done_callback(self, fn):
+        self._future.add_done_callback(lambda _: fn(self))
+
+
+class _FutureStub:
+    """
+    Wraps a stub so that calling any of its unary methods returns a ResponseFuture
+    """
+
+    def __init__(self, stub):
+        self._stub = stub
+
+    def __getattr__(self, name):
+        multi_callable = getattr(self._stub, name)
+        if not hasattr(multi_callable, "future"):
+            raise TypeError("%s is not a unary RPC and has no future variant" % name)
+
+        def call(request, *args, **kwargs):
+            return ResponseFuture(multi_callable.future(request, *args, **kwargs))
+
+        return call
+
+
+class _FutureClient:
+    """
+    Stands in for the client while a wrapper method runs, handing out future stubs
+    """
+
+    # futures always go to lnd, cached or locally decoded responses are not futures
+    response_cache = None
+    pay_req_decoder = None
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        value = getattr(self._client, name)
+        if name in STUB_ATTRIBUTES:
+            return _FutureStub(value)
+        return value
+
+
+def _submit(fn, *args, **kwargs) -> ExecutorFuture:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=FUTURE_WORKERS, thread_name_prefix="lnd_grpc-future"
+        )
+    return ExecutorFuture(_executor.submit(fn, *args, **kwargs))
+
+
+class FutureCalls:
+    """
+    Non-blocking variants of a client's unary wrapper methods.
+
+    Each method takes the same arguments as the client method of the same name but
+    returns a grpc.Future of its result instead of blocking on the RPC, so many
+    independent calls can be issued from one thread and then joined:
+
+    info = lnd_rpc.future.get_info()
+    balance = lnd_rpc.future.wallet_balance()
+    info.result(), balance.result()
+
+    Only the wrappers in SINGLE_RPC_METHODS are issued as gRPC futures. All others,
+    e.g. those built on several RPCs such as pay_invoice() or close_all_channels(), are
+    run on a shared pool of FUTURE_WORKERS threads instead, and still return a
+    grpc.Future.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        method = inspect.getattr_static(type(self._client), name, None)
+        if not inspect.isfunction(method) or name.startswith("_"):
+            raise AttributeError("%s has no future variant" % name)
+
+        if name in SINGLE_RPC_METHODS:
+
+            def call(*args, **kwargs):
+                return method(_FutureClient(self._client), *args, **kwargs)
+
+        else:
+
+            def call(*args, **kwargs):
+                return _submit(method, self._client, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+
+class AioFutureCalls:
+    """
+    The asyncio counterpart of FutureCalls, for lnd_grpc.aio.Client.
+
+    Each method takes the same arguments as the client method of the same name and
+    schedules it at once, returning an asyncio.Task of its result, so many independent
+    calls can be issued before any is awaited:
+
+    info = lnd_rpc.future.get_info()
+    balance = lnd_rpc.future.wallet_balance()
+    await info, await balance
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        method = inspect.getattr_static(type(self._client), name, None)
+        if not inspect.isfunction(method) or name.startswith("_"):
+            raise AttributeError("%s has no future variant" % name)
+
+        def call(*args, **kwargs):
+            awaitable = method(self._client, *args, **kwargs)
+            if not inspect.isawaitable(awaitable):
+                if hasattr(awaitable, "cancel"):
+                    # e.g. a response stream, which has already been started
+                    awaitable.cancel()
+                raise TypeError("%s does not return an awaitable" % name)
+            return asyncio.ensure_future(awaitable)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from array import array
+
+import grpc
+
+import lnd_grpc.protos.rpc_pb2 as ln
+from lnd_grpc.config import RECONNECT_BACKOFF_BASE, RECONNECT_BACKOFF_MAX
+
+# array typecodes of the per-direction policy columns
+POLICY_COLUMNS = (
+    ("time_lock_delta", "I"),
+    ("min_htlc", "q"),
+    ("fee_base_msat", "q"),
+    ("fee_rate_milli_msat", "q"),
+    ("disabled", "B"),
+    ("max_htlc_msat", "Q"),
+    ("last_update", "I"),
+)
+
+
+def chan_point_string(chan_point: ln.ChannelPoint) -> str:
+    """
+    :return: "funding_txid:output_index" string of a ChannelPoint
+    """
+    if chan_point.funding_txid_str:
+        txid = chan_point.funding_txid_str
+    else:
+        # txids are displayed in reverse byte order
+        txid = chan_point.funding_txid_bytes[::-1].hex()
+    return "%s:%d" % (txid, chan_point.output_index)
+
+
+class GraphIndex:
+    """
+    A local, incrementally updated copy of the channel graph.
+
+    The graph is downloaded once with describe_graph() and then kept up to date by
+    applying GraphTopologyUpdates from subscribe_channel_graph(), so lookups never need
+    another round trip to lnd.
+
+    Nodes are kept as LightningNode messages keyed by pubkey. Edges are kept in compact
+    array-backed columns (one slot per channel, with the two directional routing
+    policies stored column-wise), indexed by chan_id, with adjacency sets per node.
+    ChannelEdge messages are only built on request.
+    """
+
+    def __init__(self, client):
+        """
+        :param client: a Lightning client
+        """
+        self.client = client
+        self.updates_applied = 0
+        self.error = None
+        self._lock = threading.RLock()
+        self._thread = None
+        self._start_error = None
+        self._subscription = None
+        self._stop = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self.nodes = {}
+        self._slots = {}
+        self._free_slots = []
+        self._adjacency = {}
+        self.chan_ids = array("Q")
+        self.capacity = array("q")
+        self.last_update = array("I")
+        self.node1 = []
+        self.node2 = []
+        self.chan_points = []
+        self.has_policy = [array("B"), array("B")]
+        self.policies = [
+            {name: array(typecode) for name, typecode in POLICY_COLUMNS},
+            {name: array(typecode) for name, typecode in POLICY_COLUMNS},
+        ]
+
+    def load(self, include_unannounced: bool = False):
+        """
+        (Re)load the full graph using describe_graph()
+        """
+        graph = self.client.describe_graph(include_unannounced=include_unannounced)
+        return self._load(graph)
+
+    def _load(self, graph: ln.ChannelGraph):
+        with self._lock:
+            self._reset()
+            for node in graph.nodes:
+                self.nodes[node.pub_key] = node
+            for edge in graph.edges:
+                slot = self._slot(
+                    edge.channel_id,
+                    edge.node1_pub,
+                    edge.node2_pub,
+                    edge.capacity,
+                    edge.chan_point,
+                )
+                self.last_update[slot] = edge.last_update
+                if edge.HasField("node1_policy"):
+                    self._set_policy(slot, 0, edge.node1_policy)
+                if edge.HasField("node2_policy"):
+                    self._set_policy(slot, 1, edge.node2_policy)
+        return self
+
+    # Storage
+
+    def _slot(self, chan_id, node1, node2, capacity, chan_point) -> int:
+        slot = self._slots.get(chan_id)
+        if slot is not None:
+            self.capacity[slot] = capacity
+            return slot
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self.chan_ids[slot] = chan_id
+            self.capacity[slot] = capacity
+            self.last_update[slot] = 0
+            self.node1[slot] = node1
+            self.node2[slot] = node2
+            self.chan_points[slot] = chan_point
+            for direction in (0, 1):
+                self.has_policy[direction][slot] = 0
+        else:
+            slot = len(self.chan_ids)
+            self.chan_ids.append(chan_id)
+            self.capacity.append(capacity)
+            self.last_update.append(0)
+            self.node1.append(node1)
+            self.node2.append(node2)
+            self.chan_points.append(chan_point)
+            for direction in (0, 1):
+                self.has_policy[direction].append(0)
+                for name, column in self.policies[direction].items():
+                    column.append(0)
+        self._slots[chan_id] = slot
+        self._adjacency.setdefault(node1, set()).add(chan_id)
+        self._adjacency.setdefault(node2, set()).add(chan_id)
+        return slot
+
+    def _set_policy(self, slot: int, direction: int, policy: ln.RoutingPolicy):
+        columns = self.policies[direction]
+        for name, _ in POLICY_COLUMNS:
+            columns[name][slot] = int(getattr(policy, name))
+        self.has_policy[direction][slot] = 1
+
+    def _remove(self, chan_id):
+        slot = self._slots.pop(chan_id, None)
+        if slot is None:
+            return
+        for node in (self.node1[slot], self.node2[slot]):
+            channels = self._adjacency.get(node)
+            if channels is not None:
+                channels.discard(chan_id)
+                if not channels:
+                    del self._adjacency[node]
+        self.node1[slot] = self.node2[slot] = self.chan_points[slot] = None
+        self._free_slots.append(slot)
+
+    # Updates
+
+    def apply_update(self, update: ln.GraphTopologyUpdate):
+        """
+        Apply a GraphTopologyUpdate from subscribe_channel_graph()
+        """
+        with self._lock:
+            for node_update in update.node_updates:
+                node = self.nodes.get(node_update.identity_key)
+                if node is None:
+                    node = ln.LightningNode(pub_key=node_update.identity_key)
+                    self.nodes[node.pub_key] = node
+                node.alias = node_update.alias
+                node.color = node_update.color
+                del node.addresses[:]
+                node.addresses.extend(
+                    ln.NodeAddress(network="tcp", addr=addr)
+                    for addr in node_update.addresses
+                )
+            for channel_update in update.channel_updates:
+                node1, node2 = sorted(
+                    (channel_update.advertising_node, channel_update.connecting_node)
+                )
+                slot = self._slot(
+                    channel_update.chan_id,
+                    node1,
+                    node2,
+                    channel_update.capacity,
+                    chan_point_string(channel_update.chan_point),
+                )
+                direction = 0 if channel_update.advertising_node == node1 else 1
+                policy = channel_update.routing_policy
+                self._set_policy(slot, direction, policy)
+                self.last_update[slot] = max(self.last_update[slot], policy.last_update)
+            for closed in update.closed_chans:
+                self._remove(closed.chan_id)
+            self.updates_applied += 1
+
+    def start(self, include_unannounced: bool = False):
+        """
+        Load the graph and keep it updated from subscribe_channel_graph() on a daemon
+        thread. If the subscription drops, the graph is reloaded and re-subscribed with
+        exponential backoff, the error being kept in `error`. Any other error ends the
+        thread.
+
+        If the graph cannot be loaded in the first place, the thread is stopped and the
+        error raised.
+        """
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+        ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._follow,
+            args=(include_unannounced, ready),
+            name="graph-index",
+            daemon=True,
+        )
+        self._thread.start()
+        ready.wait()
+        if self._start_error is not None:
+            error, self._start_error = self._start_error, None
+            self.stop()
+            raise error
+        return self
+
+    def _follow(self, include_unannounced: bool, ready: threading.Event):
+        backoff = RECONNECT_BACKOFF_BASE
+        while not self._stop.is_set():
+            try:
+                # subscribe before loading so that no update is missed in between
+                self._subscription = self.client.subscribe_channel_graph()
+                self.load(include_unannounced)
+                self.error = None
+                ready.set()
+                backoff = RECONNECT_BACKOFF_BASE
+                for update in self._subscription:
+                    self.apply_update(update)
+            except grpc.RpcError as e:
+                self.error = e
+                if not ready.is_set():
+                    self._start_error = e
+            finally:
+                ready.set()
+                # the stream is still open if an update could not be applied
+                if self._subscription is not None:
+                    self._subscription.cancel()
+            if self._stop.wait(backoff):
+                return
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    def stop(self):
+        """
+        Stop following graph updates
+        """
+        self._stop.set()
+        if self._subscription is not None:
+            self._subscription.cancel()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Lookups
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, chan_id):
+        return chan_id in self._slots
+
+    def node(self, pub_key: str) -> ln.LightningNode:
+        """
+        :return: the LightningNode with the pubkey, or None
+        """
+        return self.nodes.get(pub_key)
+
+    def slot(self, chan_id: int) -> int:
+        """
+        :return: the column index of the channel's data, or None
+        """
+        return self._slots.get(chan_id)
+
+    def edge(self, chan_id: int) -> ln.ChannelEdge:
+        """
+        :return: the ChannelEdge with the chan_id, or None
+        """
+        with self._lock:
+            slot = self._slots.get(chan_id)
+            if slot is None:
+                return None
+            edge = ln.ChannelEdge(
+                channel_id=chan_id,
+                chan_point=self.chan_points[slot],
+                last_update=self.last_update[slot],
+                node1_pub=self.node1[slot],
+                node2_pub=self.node2[slot],
+                capacity=self.capacity[slot],
+            )
+            if self.has_policy[0][slot]:
+                edge.node1_policy.CopyFrom(self.policy(chan_id, 0))
+            if self.has_policy[1][slot]:
+                edge.node2_policy.CopyFrom(self.policy(chan_id, 1))
+            return edge
+
+    def policy(self, chan_id: int, direction) -> ln.RoutingPolicy:
+        """
+        :param direction: 0 or 1 for the node1 or node2 policy, or the pubkey of the
+        node which advertised it
+        :return: RoutingPolicy, or None if the channel or policy is unknown
+        """
+        with self._lock:
+            slot = self._slots.get(chan_id)
+            if slot is None:
+                return None
+            if isinstance(direction, str):
+                direction = 0 if direction == self.node1[slot] else 1
+            if not self.has_policy[direction][slot]:
+                return None
+            columns = self.policies[direction]
+            return ln.RoutingPolicy(
+                **{name: columns[name][slot] for name, _ in POLICY_COLUMNS}
+            )
+
+    def channels(self, pub_key: str) -> set:
+        """
+        :return: set of chan_ids of the node's channels
+        """
+        return set(self._adjacency.get(pub_key, ()))
+
+    def neighbours(self, pub_key: str) -> dict:
+        """
+        :return: dict of neighbouring node pubkey to the list of chan_ids connecting it
+        to the node
+        """
+        neighbours = {}
+        with self._lock:
+            for chan_id in self._adjacency.get(pub_key, ()):
+                slot = self._slots[chan_id]
+                peer = (
+                    self.node2[slot]
+                    if self.node1[slot] == pub_key
+                    else self.node1[slot]
+                )
+                neighbours.setdefault(peer, []).append(chan_id)
+        return neighbours
+
+
+class AioGraphIndex(GraphIndex):
+    """
+    The asyncio counterpart of GraphIndex, for lnd_grpc.aio.Client: load() and start()
+    are coroutines, and updates are followed in a task rather than a thread. Lookups
+    are the same.
+    """
+
+    def __init__(self, client):
+        """
+        :param client: an asyncio Lightning client
+        """
+        super().__init__(client)
+        self._task = None
+
+    async def load(self, include_unannounced: bool = False):
+        """
+        (Re)load the full graph using describe_graph()
+        """
+        graph = await self.client.describe_graph(
+            include_unannounced=include_unannounced
+        )
+        return self._load(graph)
+
+    async def start(self, include_unannounced: bool = False):
+        """
+        Load the graph and keep it updated from subscribe_channel_graph() in a task. If
+        the subscription drops, the graph is reloaded and re-subscribed with
+        exponential backoff, the error being kept in `error`. Any other error ends the
+        task.
+
+        If the graph cannot be loaded in the first place, the error is raised.
+        """
+        if self._task is not None:
+            return self
+        # subscribe before loading so that no update is missed in between
+        subscription = self.client.subscribe_channel_graph()
+        try:
+            await self.load(include_unannounced)
+        except BaseException:
+            subscription.cancel()
+            raise
+        self._task = asyncio.ensure_future(
+            self._follow(include_unannounced, subscription)
+        )
+        return self
+
+    async def _follow(self, include_unannounced: bool, subscription):
+        backoff = RECONNECT_BACKOFF_BASE
+        while True:
+            try:
+                if subscription is None:
+                    subscription = self.client.subscribe_channel_graph()
+                    self._subscription = subscription
+                    await self.load(include_unannounced)
+                    self.error = None
+                    backoff = RECONNECT_BACKOFF_BASE
+                self._subscription = subscription
+                async for update in subscription:
+                    self.apply_update(update)
+            except grpc.RpcError as e:
+                self.error = e
+            finally:
+                # the stream is still open if an update could not be applied
+                subscription.cancel()
+            subscription = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    def stop(self):
+        """
+        Stop following graph updates
+        """
+        if self._subscription is not None:
+            self._subscription.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,130 @@
+import grpc
+
+
+def split_method(method: str) -> tuple:
+    """
+    :return: (service, method) of a full method name, e.g. "/lnrpc.Lightning/GetInfo"
+    gives ("lnrpc.Lightning", "GetInfo")
+    """
+    service, _, name = method.lstrip("/").rpartition("/")
+    return service, name
+
+
+def message_size(message) -> int:
+    """
+    :return: serialized size of a message, or of a response received in raw mode (as a
+    memoryview of the serialized message)
+    """
+    if isinstance(message, memoryview):
+        return message.nbytes
+    return message.ByteSize()
+
+
+class ClientInterceptor(
+    grpc.UnaryUnaryClientInterceptor,
+    grpc.UnaryStreamClientInterceptor,
+    grpc.StreamUnaryClientInterceptor,
+    grpc.StreamStreamClientInterceptor,
+):
+    """
+    Base class for interceptors which observe every call made on a channel, whatever
+    its cardinality, without altering it.
+
+    Subclasses override the hooks below. call_started() returns a per-call state object
+    which is passed to the other hooks; stream_started() is called for calls with
+    streamed responses, request_sent() and response_received() for every message, and
+    call_finished() exactly once with the call's status code. For unary responses hooks
+    may run on a gRPC thread, and for streamed responses on the thread consuming the
+    stream.
+    """
+
+    def call_started(self, method: str):
+        """
+        :param method: full method name, e.g. "/lnrpc.Lightning/GetInfo"
+        :return: state passed to the other hooks for this call
+        """
+        return None
+
+    def stream_started(self, state):
+        pass
+
+    def request_sent(self, state, request):
+        pass
+
+    def response_received(self, state, response):
+        pass
+
+    def call_finished(self, state, code: grpc.StatusCode):
+        pass
+
+    def _requests(self, state, request_iterator):
+        for request in request_iterator:
+            self.request_sent(state, request)
+            yield request
+
+    def _unary_response(self, state, outcome):
+        def done(call):
+            code = call.code()
+            if code == grpc.StatusCode.OK:
+                self.response_received(state, call.result())
+            self.call_finished(state, code)
+
+        outcome.add_done_callback(done)
+        return outcome
+
+    def _stream_response(self, state, call):
+        self.stream_started(state)
+        stream = InterceptedStream(call, lambda r: self.response_received(state, r))
+        if not call.add_callback(lambda: self.call_finished(state, call.code())):
+            # the call has already terminated
+            self.call_finished(state, call.code())
+        return stream
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        state = self.call_started(client_call_details.method)
+        self.request_sent(state, request)
+        return self._unary_response(state, continuation(client_call_details, request))
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        state = self.call_started(client_call_details.method)
+        self.request_sent(state, request)
+        return self._stream_response(state, continuation(client_call_details, request))
+
+    def intercept_stream_unary(
+        self, continuation, client_call_details, request_iterator
+    ):
+        state = self.call_started(client_call_details.method)
+        requests = self._requests(state, request_iterator)
+        return self._unary_response(state, continuation(client_call_details, requests))
+
+    def intercept_stream_stream(
+        self, continuation, client_call_details, request_iterator
+    ):
+        state = self.call_started(client_call_details.method)
+        requests = self._requests(state, request_iterator)
+        return self._stream_response(state, continuation(client_call_details, requests))
+
+
+class InterceptedStream:
+    """
+    A response-streaming call which reports each response to on_response as it is
+    consumed. Everything else (cancel(), code(), add_callback() etc.) is passed through
+    to the call.
+    """
+
+    def __init__(self, call, on_response):
+        self._call = call
+        self._on_response = on_response
+
+    def __getattr__(self, name):
+        return getattr(self._call, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        response = next(self._call)
+        self._on_response(response)
+        return response
+
+    next = __next__
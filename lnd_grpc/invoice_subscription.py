@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import traceback
+
+import grpc
+
+import lnd_grpc.protos.rpc_pb2 as ln
+from lnd_grpc.config import RECONNECT_BACKOFF_BASE, RECONNECT_BACKOFF_MAX
+
+# marks the end of the subscription in delivery queues
+_END = object()
+
+
+class InvoiceSubscription:
+    """
+    A subscribe_invoices() stream which survives disconnections.
+
+    The highest add_index and settle_index seen are tracked, and whenever the stream
+    drops it is re-opened with exponential backoff from those indices, so that lnd
+    replays exactly the events which were missed. Events at or below the indices
+    already delivered are dropped, so each add and settle event is delivered once. An
+    invoice which was added and settled whilst disconnected is delivered (settled) with
+    its add event, and its replayed settle event is dropped.
+
+    Invoices are delivered to a callback (called on the subscription's thread, with
+    any exception it raises printed and counted in callback_errors), to a
+    queue.Queue, or, if neither is given, to an internal queue consumed by iterating
+    over the subscription. The subscription can also be consumed with `async for`
+    from any event loop, in which case the internal queue is drained into the async
+    iterator and bypassed while it is running.
+    """
+
+    def __init__(
+        self,
+        client,
+        add_index: int = 0,
+        settle_index: int = 0,
+        callback=None,
+        queue_: queue.Queue = None,
+    ):
+        """
+        :param client: a Lightning client
+        :param add_index: resume after this add_index
+        :param settle_index: resume after this settle_index
+        :param callback: callable called with each Invoice
+        :param queue_: queue.Queue to put each Invoice into
+        """
+        self.client = client
+        self.add_index = add_index
+        self.settle_index = settle_index
+        # settle indices above settle_index already delivered with their add event
+        self._settles_delivered = set()
+        self.callback = callback
+        self._internal = queue_ is None and callback is None
+        self.queue = queue.Queue() if self._internal else queue_
+        self.reconnects = 0
+        self.duplicates = 0
+        self.callback_errors = 0
+        self.error = None
+        self._async_queues = []
+        self._lock = threading.Lock()
+        self._stream = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """
+        Start following invoices on a daemon thread
+        """
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._follow, name="invoice-subscription", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _follow(self):
+        backoff = RECONNECT_BACKOFF_BASE
+        connected = False
+        while not self._stop.is_set():
+            if connected:
+                self.reconnects += 1
+            try:
+                self._stream = self.client.subscribe_invoices(
+                    add_index=self.add_index, settle_index=self.settle_index
+                )
+                if self._stop.is_set():
+                    self._stream.cancel()
+                connected = True
+                for invoice in self._stream:
+                    backoff = RECONNECT_BACKOFF_BASE
+                    self._process(invoice)
+            except grpc.RpcError as e:
+                self.error = e
+            if self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+        self._deliver(_END)
+
+    def _process(self, invoice: ln.Invoice):
+        if invoice.add_index > self.add_index:
+            # an add event, carrying the invoice in whatever state it is in now
+            self.add_index = invoice.add_index
+            if (
+                invoice.state == ln.Invoice.SETTLED
+                and invoice.settle_index > self.settle_index
+            ):
+                # lnd replays the add backlog before the settle backlog, so earlier
+                # settles may still be to come and settle_index cannot advance yet
+                self._settles_delivered.add(invoice.settle_index)
+        elif invoice.state == ln.Invoice.SETTLED:
+            duplicate = (
+                invoice.settle_index <= self.settle_index
+                or invoice.settle_index in self._settles_delivered
+            )
+            self.settle_index = max(self.settle_index, invoice.settle_index)
+            self._settles_delivered = {
+                index for index in self._settles_delivered if index > self.settle_index
+            }
+            if duplicate:
+                self.duplicates += 1
+                return
+        elif invoice.state == ln.Invoice.OPEN:
+            self.duplicates += 1
+            return
+        # other state changes (accepted, canceled) are never replayed
+        self._deliver(invoice)
+
+    def _call_back(self, invoice: ln.Invoice):
+        try:
+            self.callback(invoice)
+        except Exception:
+            # a failing callback must not end the subscription
+            self.callback_errors += 1
+            traceback.print_exc()
+
+    def _deliver(self, item):
+        if item is not _END and self.callback is not None:
+            self._call_back(item)
+        with self._lock:
+            async_queues = list(self._async_queues)
+            if self.queue is not None and not (self._internal and async_queues):
+                self.queue.put(item)
+        for loop, async_queue in async_queues:
+            loop.call_soon_threadsafe(async_queue.put_nowait, item)
+
+    def stop(self):
+        """
+        Stop following invoices, ending any iteration over the subscription
+        """
+        self._stop.set()
+        if self._stream is not None:
+            self._stream.cancel()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __iter__(self):
+        if self.queue is None:
+            raise TypeError("invoices are delivered to the callback only")
+        while True:
+            invoice = self.queue.get()
+            if invoice is _END:
+                # leave the marker in place for any other consumer
+                self.queue.put(_END)
+                return
+            yield invoice
+
+    async def __aiter__(self):
+        async_queue = asyncio.Queue()
+        entry = (asyncio.get_running_loop(), async_queue)
+        with self._lock:
+            self._async_queues.append(entry)
+            if self._internal:
+                # hand over anything buffered before async iteration started
+                while not self.queue.empty():
+                    async_queue.put_nowait(self.queue.get_nowait())
+            if self._stop.is_set() and self._thread is None:
+                async_queue.put_nowait(_END)
+        try:
+            while True:
+                invoice = await async_queue.get()
+                if invoice is _END:
+                    return
+                yield invoice
+        finally:
+            with self._lock:
+                self._async_queues.remove(entry)
+
+
+class AioInvoiceSubscription(InvoiceSubscription):
+    """
+    The asyncio counterpart of InvoiceSubscription, for lnd_grpc.aio.Client.
+
+    The stream is followed in a task. Invoices are delivered to a callback (called on
+    the event loop), to an asyncio.Queue, or, if neither is given, to an internal one
+    consumed with `async for`. Queues are put to without waiting, so a given queue_
+    should be unbounded.
+    """
+
+    def __init__(
+        self,
+        client,
+        add_index: int = 0,
+        settle_index: int = 0,
+        callback=None,
+        queue_: asyncio.Queue = None,
+    ):
+        """
+        :param client: an asyncio Lightning client
+        :param add_index: resume after this add_index
+        :param settle_index: resume after this settle_index
+        :param callback: callable called with each Invoice
+        :param queue_: asyncio.Queue to put each Invoice into
+        """
+        super().__init__(
+            client,
+            add_index=add_index,
+            settle_index=settle_index,
+            callback=callback,
+            queue_=queue_,
+        )
+        if self._internal:
+            self.queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        """
+        Start following invoices in a task
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._follow())
+        return self
+
+    async def _follow(self):
+        backoff = RECONNECT_BACKOFF_BASE
+        connected = False
+        try:
+            while True:
+                if connected:
+                    self.reconnects += 1
+                self._stream = self.client.subscribe_invoices(
+                    add_index=self.add_index, settle_index=self.settle_index
+                )
+                connected = True
+                try:
+                    async for invoice in self._stream:
+                        backoff = RECONNECT_BACKOFF_BASE
+                        self._process(invoice)
+                except grpc.RpcError as e:
+                    self.error = e
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+        finally:
+            self._deliver(_END)
+
+    def _deliver(self, item):
+        if item is not _END and self.callback is not None:
+            self._call_back(item)
+        if self.queue is not None:
+            self.queue.put_nowait(item)
+
+    def stop(self):
+        """
+        Stop following invoices, ending any iteration over the subscription
+        """
+        if self._stream is not None:
+            self._stream.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def __iter__(self):
+        raise TypeError("iterate over an asyncio invoice subscription with async for")
+
+    async def __aiter__(self):
+        if self.queue is None:
+            raise TypeError("invoices are delivered to the callback only")
+        while True:
+            invoice = await self.queue.get()
+            if invoice is _END:
+                # leave the marker in place for any other consumer
+                self.queue.put_nowait(_END)
+                return
+            yield invoice
@@ -1,6 +1,6 @@
-from os import environ
+from __future__ import annotations
 
-import grpc
+from os import environ
 
 import lnd_grpc.protos.invoices_pb2 as inv
 import lnd_grpc.protos.invoices_pb2_grpc as invrpc
@@ -32,6 +32,7 @@ class Invoices(BaseClient):
         grpc_port: str = defaultRPCPort,
     ):
         self._inv_stub: invrpc.InvoicesStub = None
+        self._inv_channel = None
 
         super().__init__(
             lnd_dir=lnd_dir,
@@ -44,13 +45,11 @@ class Invoices(BaseClient):
 
     @property
     def invoice_stub(self) -> invrpc.InvoicesStub:
-        if self._inv_stub is None:
-            ssl_creds = grpc.ssl_channel_credentials(self.tls_cert)
-            self._inv_channel = grpc.secure_channel(
-                target=self.grpc_address,
-                credentials=self.combined_credentials,
-                options=self.grpc_options,
-            )
+        # the channel is shared with the Lightning sub-system, so follow it if it has
+        # been regenerated
+        channel = self.authenticated_channel
+        if self._inv_stub is None or self._inv_channel is not channel:
+            self._inv_channel = channel
             self._inv_stub = invrpc.InvoicesStub(self._inv_channel)
         return self._inv_stub
 
@@ -1,12 +1,40 @@
+from __future__ import annotations
+
+import queue
+import threading
 import time
+import warnings
 from os import environ
 
 import grpc
 
 import lnd_grpc.protos.rpc_pb2 as ln
 import lnd_grpc.protos.rpc_pb2_grpc as lnrpc
+from lnd_grpc.backpressure import (
+    BLOCK,
+    COALESCE,
+    bounded,
+    graph_update_items,
+    graph_update_key,
+)
 from lnd_grpc.base_client import BaseClient
-from lnd_grpc.config import defaultNetwork, defaultRPCHost, defaultRPCPort
+from lnd_grpc.bolt11 import Bolt11Error, PayReqDecoder
+from lnd_grpc.channel_closer import ChannelCloser
+from lnd_grpc.config import (
+    RESPONSE_CACHE_SIZE,
+    defaultNetwork,
+    defaultRPCHost,
+    defaultRPCPort,
+)
+from lnd_grpc.event_hub import EventHub
+from lnd_grpc.graph import GraphIndex
+from lnd_grpc.invoice_subscription import InvoiceSubscription
+from lnd_grpc.pagination import Paginator, ShardedPaginator
+from lnd_grpc.pathfinding import Pathfinder
+from lnd_grpc.payments import PaymentSession
+from lnd_grpc.raw import RawStub
+from lnd_grpc.response_cache import ResponseCache, cached_call
+from lnd_grpc.snapshot import NodeSnapshot, take_snapshot
 
 # tell gRPC which cypher suite to use
 environ["GRPC_SSL_CIPHER_SUITES"] = (
@@ -32,6 +60,10 @@ class Lightning(BaseClient):
     ):
 
         self._lightning_stub: lnrpc.LightningStub = None
+        self._lightning_channel = None
+        self._raw_lightning_stub: RawStub = None
+        self.response_cache = None
+        self.pay_req_decoder = PayReqDecoder()
         self.version = None
         super().__init__(
             lnd_dir=lnd_dir,
@@ -73,40 +105,42 @@ class Lightning(BaseClient):
         """
         Create the lightning stub used to interface with the Lightning sub-system.
 
-        Connectivity to LND is monitored using a callback to the channel and if
-        connection status changes the stub will be dynamically regenerated on next call.
+        The stub is bound to the client's shared channel. Connectivity to LND is
+        monitored by the channel manager, which rebuilds the channel after a SHUTDOWN or
+        TRANSIENT_FAILURE (with exponential backoff), in which case the stub is
+        regenerated on next call. Setting connection_status_change forces the same.
 
         This helps to overcome issues where a sub-system is not active when the stub is
         created (e.g. calling Lightning sub-system when wallet not yet unlocked) which
         otherwise requires manual monitoring and regeneration
         """
+        if self.connection_status_change:
+            self.regenerate_channel()
+            self.connection_status_change = False
 
-        # if the stub is already created and channel might recover, return current stub
-        if self._lightning_stub is not None and self.connection_status_change is False:
-            return self._lightning_stub
-
-        # otherwise, start by creating a fresh channel
-        self.channel = grpc.secure_channel(
-            target=self.grpc_address,
-            credentials=self.combined_credentials,
-            options=self.grpc_options,
-        )
-
-        # subscribe to channel connectivity updates with callback
-        self.channel.subscribe(self.connectivity_event_logger)
-
-        # create the new stub
-        self._lightning_stub = lnrpc.LightningStub(self.channel)
-
-        # 'None' is channel_status's initialization state.
-        # ensure connection_status_change is True to keep regenerating fresh stubs until
-        # channel comes online
-        if self.connection_status is None:
-            self.connection_status_change = True
-            return self._lightning_stub
-        self.connection_status_change = False
+        channel = self.authenticated_channel
+        if self._lightning_stub is None or self._lightning_channel is not channel:
+            self._lightning_channel = channel
+            self._lightning_stub = lnrpc.LightningStub(channel)
         return self._lightning_stub
 
+    @property
+    def raw_lightning_stub(self) -> RawStub:
+        """
+        A stub for the Lightning sub-system whose unary methods return the serialized
+        response, as a memoryview, without decoding it. It follows the channel of
+        lightning_stub, being regenerated with it.
+        """
+        # regenerates the channel first if the connection status changed
+        self.lightning_stub
+        channel = self._lightning_channel
+        if (
+            self._raw_lightning_stub is None
+            or self._raw_lightning_stub.channel is not channel
+        ):
+            self._raw_lightning_stub = RawStub(channel, "lnrpc.Lightning")
+        return self._raw_lightning_stub
+
     def wallet_balance(self):
         """
         Get (bitcoin) wallet balance, not in channels
@@ -167,16 +201,26 @@ class Lightning(BaseClient):
         return response
 
     # Response-streaming RPC
-    def subscribe_transactions(self):
+    def subscribe_transactions(
+        self, max_queue: int = None, overflow: str = BLOCK, key=None
+    ):
         """
         Creates a uni-directional stream from the server to the client in which any
         newly discovered transactions relevant to the wallet are sent over
 
+        :param max_queue: if set, read the stream into a BoundedStream of at most this
+        many transactions, handling overflow with the given policy (coalescing by
+        tx_hash unless another key is given)
         :return: iterable of Transactions with 8 attributes per response. See the notes
         on threading and iterables in README.md
         """
         request = ln.GetTransactionsRequest()
-        return self.lightning_stub.SubscribeTransactions(request)
+        return bounded(
+            self.lightning_stub.SubscribeTransactions(request),
+            max_queue,
+            overflow=overflow,
+            key=key or (lambda transaction: transaction.tx_hash),
+        )
 
     def send_many(self, addr_to_amount: ln.SendManyRequest.AddrToAmountEntry, **kwargs):
         """
@@ -290,8 +334,12 @@ class Lightning(BaseClient):
         :return: GetInfoResponse with 14 attributes
         """
         request = ln.GetInfoRequest()
-        response = self.lightning_stub.GetInfo(request)
-        return response
+        return cached_call(
+            self.response_cache,
+            "get_info",
+            request,
+            lambda: self.lightning_stub.GetInfo(request),
+        )
 
     def pending_channels(self):
         """
@@ -387,20 +435,34 @@ class Lightning(BaseClient):
         request = ln.CloseChannelRequest(channel_point=_channel_point, **kwargs)
         return self.lightning_stub.CloseChannel(request)
 
-    def close_all_channels(self, inactive_only: bool = 0):
+    def close_all_channels(
+        self,
+        inactive_only: bool = 0,
+        max_parallel: int = 10,
+        follow_confirmations: bool = False,
+        **kwargs,
+    ):
         """
-        Custom function which iterates over all channels and closes them sequentially
-        using close_channel()
+        Custom function which closes all channels concurrently using close_channel(),
+        with at most max_parallel closes being initiated at once. Extra kwargs are
+        passed on to close_channel(), e.g. force=True.
 
-        :return: CloseChannelStatusUpdate for each channel close, with 2 attributes:
-        'close_pending' and 'chan_close'
+        :return: ChannelCloser, an iterable of CloseUpdates (channel_point, update)
+        where update is a CloseStatusUpdate with 2 attributes: 'close_pending' and
+        'chan_close'. Use wait() to block until done and summary() for the state of
+        each close
         """
-        if not inactive_only:
-            for channel in self.list_channels():
-                self.close_channel(channel_point=channel.channel_point).next()
         if inactive_only:
-            for channel in self.list_channels(inactive_only=1):
-                self.close_channel(channel_point=channel.channel_point).next()
+            channels = self.list_channels(inactive_only=1)
+        else:
+            channels = self.list_channels()
+        return ChannelCloser(
+            self.close_channel,
+            [channel.channel_point for channel in channels],
+            max_parallel=max_parallel,
+            follow_confirmations=follow_confirmations,
+            **kwargs,
+        )
 
     def abandon_channel(self, channel_point: ln.ChannelPoint):
         """
@@ -419,21 +481,68 @@ class Lightning(BaseClient):
         response = self.lightning_stub.AbandonChannel(request)
         return response
 
+    @staticmethod
+    def send_request(**kwargs):
+        """
+        Creates the SendRequest object for send_payment() or a payment session, using the
+        payment request as first choice and converting hex payment hash and destination
+        strings to bytes automatically
+
+        :return: SendRequest
+        """
+        if "payment_request" in kwargs:
+            params = {"payment_request": kwargs["payment_request"]}
+            if "amt" in kwargs:
+                params["amt"] = kwargs["amt"]
+            return ln.SendRequest(**params)
+        if "payment_hash" not in kwargs:
+            kwargs["payment_hash"] = bytes.fromhex(kwargs["payment_hash_string"])
+        if "dest" not in kwargs:
+            kwargs["dest"] = bytes.fromhex(kwargs["dest_string"])
+        return ln.SendRequest(**kwargs)
+
     @staticmethod
     def send_request_generator(**kwargs):
         """
         Creates the SendRequest object for the synchronous streaming send_payment() as a
         generator
 
+        Deprecated: use send_request() with payment_session(), which keeps the stream
+        open until the payment has resolved rather than for 5 seconds.
+
         :return: generator object for the request
         """
-        # Commented out to complement the magic sleep below...
-        # while True:
-        request = ln.SendRequest(**kwargs)
-        yield request
-        # Magic sleep which tricks the response to the send_payment() method to actually
-        # contain data...
-        time.sleep(5)
+        warnings.warn(
+            "send_request_generator() is deprecated, use send_request() with "
+            "payment_session()",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+
+        def generator():
+            request = ln.SendRequest(**kwargs)
+            yield request
+            # Magic sleep which tricks the response to the send_payment() method to
+            # actually contain data...
+            time.sleep(5)
+
+        return generator()
+
+    def payment_hash_of(self, payment_request: str) -> bytes:
+        """
+        :return: the payment hash of a payment request as bytes
+        """
+        return bytes.fromhex(self.decode_pay_req(pay_req=payment_request).payment_hash)
+
+    # Bi-directional streaming RPC
+    def payment_session(self) -> PaymentSession:
+        """
+        Opens a single bi-directional SendPayment stream which many SendRequests can be
+        pushed into, with responses correlated by payment hash. See PaymentSession.
+
+        :return: PaymentSession
+        """
+        return PaymentSession(self.lightning_stub.SendPayment, self.payment_hash_of)
 
     # Bi-directional streaming RPC
     def send_payment(self, **kwargs):
@@ -443,28 +552,16 @@ class Lightning(BaseClient):
         stream allowing clients to rapidly send payments through the Lightning Network
         with a single persistent connection.
 
+        This sends a single payment and closes the stream once it has resolved; use
+        payment_session() to send many payments over one stream.
+
         :return: an iterable of SendResponses with 4 attributes per response.
         See the notes on threading and iterables in README.md
         """
-        # Use payment request as first choice
-        if "payment_request" in kwargs:
-            params = {"payment_request": kwargs["payment_request"]}
-            if "amt" in kwargs:
-                params["amt"] = kwargs["amt"]
-            request_iterable = self.send_request_generator(**params)
-        else:
-            # Helper to convert hex to bytes automatically
-            try:
-                if "payment_hash" not in kwargs:
-                    kwargs["payment_hash"] = bytes.fromhex(
-                        kwargs["payment_hash_string"]
-                    )
-                if "dest" not in kwargs:
-                    kwargs["dest"] = bytes.fromhex(kwargs["dest_string"])
-            except ValueError as e:
-                raise e
-            request_iterable = self.send_request_generator(**kwargs)
-        return self.lightning_stub.SendPayment(request_iterable)
+        session = self.payment_session()
+        session.send(self.send_request(**kwargs))
+        session.close()
+        return session
 
     # Synchronous non-streaming RPC
     def send_payment_sync(self, **kwargs):
@@ -504,15 +601,35 @@ class Lightning(BaseClient):
         """
         create SendToRouteRequest generator
 
+        Deprecated: use route_payment_session(), which keeps the stream open until the
+        payment has resolved rather than for 5 seconds.
+
         :return: generator of SendToRouteRequest
         """
-        # Commented out to complement the magic sleep below...
-        # while True:
-        request = ln.SendToRouteRequest(payment_hash=invoice.r_hash, route=route)
-        yield request
-        # Magic sleep which tricks the response to the send_to_route() method to
-        # actually contain data...
-        time.sleep(5)
+        warnings.warn(
+            "send_to_route_generator() is deprecated, use route_payment_session()",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+
+        def generator():
+            request = ln.SendToRouteRequest(payment_hash=invoice.r_hash, route=route)
+            yield request
+            # Magic sleep which tricks the response to the send_to_route() method to
+            # actually contain data...
+            time.sleep(5)
+
+        return generator()
+
+    # Bi-directional streaming RPC
+    def route_payment_session(self) -> PaymentSession:
+        """
+        Opens a single bi-directional SendToRoute stream which many SendToRouteRequests
+        can be pushed into, with responses correlated by payment hash.
+
+        :return: PaymentSession
+        """
+        return PaymentSession(self.lightning_stub.SendToRoute)
 
     # Bi-directional streaming RPC
     def send_to_route(self, invoice, route):
@@ -525,8 +642,10 @@ class Lightning(BaseClient):
         :return: an iterable of SendResponses with 4 attributes per response.
         See the notes on threading and iterables in README.md
         """
-        request_iterable = self.send_to_route_generator(invoice=invoice, route=route)
-        return self.lightning_stub.SendToRoute(request_iterable)
+        session = self.route_payment_session()
+        session.send(ln.SendToRouteRequest(payment_hash=invoice.r_hash, route=route))
+        session.close()
+        return session
 
     # Synchronous non-streaming RPC
     def send_to_route_sync(self, route, **kwargs):
@@ -547,7 +666,7 @@ class Lightning(BaseClient):
         value: int = 0,
         expiry: int = 3600,
         creation_date: int = int(time.time()),
-        **kwargs
+        **kwargs,
     ):
         """
         attempts to add a new invoice to the invoice database. Any duplicated invoices
@@ -562,6 +681,52 @@ class Lightning(BaseClient):
         response = self.lightning_stub.AddInvoice(request)
         return response
 
+    @staticmethod
+    def invoice_request(spec) -> ln.Invoice:
+        """
+        Build an ln.Invoice from a dict of add_invoice() keyword arguments, using the
+        same defaults as add_invoice(). ln.Invoice objects are passed through.
+
+        :return: ln.Invoice
+        """
+        if isinstance(spec, ln.Invoice):
+            return spec
+        spec = dict(spec)
+        spec.setdefault("expiry", 3600)
+        spec.setdefault("creation_date", int(time.time()))
+        return ln.Invoice(**spec)
+
+    def add_invoices_batch(self, specs, max_in_flight: int = 100) -> list:
+        """
+        Custom function which adds many invoices at once. The AddInvoice calls are
+        pipelined as gRPC futures with up to max_in_flight outstanding at any time,
+        so a burst costs roughly one round trip rather than one per invoice.
+
+        :param specs: iterable of dicts of add_invoice() keyword arguments (or
+        ln.Invoice objects)
+        :return: list, in the order of specs, of AddInvoiceResponse for each invoice
+        added or the grpc.RpcError it failed with
+        """
+        window = threading.BoundedSemaphore(max_in_flight)
+        futures = []
+        for spec in specs:
+            request = self.invoice_request(spec)
+            window.acquire()
+            try:
+                future = self.lightning_stub.AddInvoice.future(request)
+            except Exception:
+                window.release()
+                raise
+            future.add_done_callback(lambda _: window.release())
+            futures.append(future)
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except grpc.RpcError as e:
+                results.append(e)
+        return results
+
     def list_invoices(self, reversed: bool = 1, **kwargs):
         """
         returns a list of all the invoices currently stored within the database.
@@ -579,6 +744,44 @@ class Lightning(BaseClient):
         response = self.lightning_stub.ListInvoices(request)
         return response
 
+    def iter_invoices(
+        self,
+        page_size: int = 100,
+        index_offset: int = 0,
+        reversed: bool = False,
+        pending_only: bool = False,
+        prefetch: bool = False,
+    ) -> Paginator:
+        """
+        Custom function which walks all invoices lazily, requesting them from
+        list_invoices() page_size at a time. With prefetch=True the next page is fetched
+        on a background thread while the current one is consumed.
+
+        The returned Paginator's `offset` attribute is the add_index of the last invoice
+        yielded; pass it back as index_offset to resume a scan from that point.
+
+        :return: Paginator, an iterable of Invoices
+        """
+
+        def fetch(offset):
+            response = self.list_invoices(
+                reversed=reversed,
+                index_offset=offset,
+                num_max_invoices=page_size,
+                pending_only=pending_only,
+            )
+            if reversed:
+                return response.invoices, response.first_index_offset
+            return response.invoices, response.last_index_offset
+
+        return Paginator(
+            fetch,
+            lambda page_offset, position, invoice: invoice.add_index,
+            page_size=page_size,
+            offset=index_offset,
+            prefetch=prefetch,
+        )
+
     def lookup_invoice(self, **kwargs):
         """
         attempts to look up an invoice according to its payment hash.
@@ -607,16 +810,65 @@ class Lightning(BaseClient):
         request = ln.InvoiceSubscription(**kwargs)
         return self.lightning_stub.SubscribeInvoices(request)
 
+    def invoice_subscription(
+        self,
+        add_index: int = 0,
+        settle_index: int = 0,
+        callback=None,
+        queue_: queue.Queue = None,
+    ) -> InvoiceSubscription:
+        """
+        Custom function which follows subscribe_invoices() from the given indices,
+        re-subscribing with backoff from the last indices seen whenever the stream
+        drops, and delivering every add and settle event exactly once.
+
+        :param callback: callable called with each Invoice
+        :param queue_: queue.Queue to put each Invoice into
+        :return: a started InvoiceSubscription which, without a callback or queue_,
+        can be iterated over (or async iterated over) for the Invoices
+        """
+        return InvoiceSubscription(
+            self,
+            add_index=add_index,
+            settle_index=settle_index,
+            callback=callback,
+            queue_=queue_,
+        ).start()
+
+    def event_hub(self, add_index: int = 0, settle_index: int = 0) -> EventHub:
+        """
+        Custom function which opens a single invoice, channel event and channel graph
+        subscription each, shared by any number of listeners keyed by payment hash or
+        channel point. Prefer this to a subscribe_single_invoice() stream (and thread)
+        per invoice when watching many invoices.
+
+        :return: a started EventHub
+        """
+        return EventHub(self, add_index=add_index, settle_index=settle_index).start()
+
     def decode_pay_req(self, pay_req: str):
         """
         takes an encoded payment request string and attempts to decode it, returning a
         full description of the conditions encoded within the payment request.
 
+        Payment requests are decoded locally (and the results memoized) where possible,
+        falling back to the DecodePayReq RPC for anything the local decoder does not
+        support or rejects, so that lnd reports the error.
+
         :return: PayReq with 10 attributes
         """
+        if self.pay_req_decoder is not None:
+            try:
+                return self.pay_req_decoder.decode(pay_req, network=self.network)
+            except Bolt11Error:
+                pass
         request = ln.PayReqString(pay_req=pay_req)
-        response = self.lightning_stub.DecodePayReq(request)
-        return response
+        return cached_call(
+            self.response_cache,
+            "decode_pay_req",
+            request,
+            lambda: self.lightning_stub.DecodePayReq(request),
+        )
 
     def list_payments(self):
         """
@@ -639,7 +891,7 @@ class Lightning(BaseClient):
         response = self.lightning_stub.DeleteAllPayments(request)
         return response
 
-    def describe_graph(self, **kwargs):
+    def describe_graph(self, raw: bool = False, **kwargs):
         """
         a description of the latest graph state from the point of view of the node.
         The graph information is partitioned into two components: all the
@@ -647,12 +899,83 @@ class Lightning(BaseClient):
         As this is a directed graph, the edges also contain the node directional
         specific routing policy which includes: the time lock delta, fee information etc
 
+        :param raw: return the serialized ChannelGraph, as a memoryview, without
+        decoding it; wrap it in a lnd_grpc.raw.RawMessage to decode only the parts read
         :return: ChannelGraph object with 2 attributes: 'nodes' and 'edges'
         """
         request = ln.ChannelGraphRequest(**kwargs)
+        if raw:
+            return self.raw_lightning_stub.DescribeGraph(request)
         response = self.lightning_stub.DescribeGraph(request)
         return response
 
+    def snapshot(self, previous: NodeSnapshot = None) -> NodeSnapshot:
+        """
+        Custom function which fetches get_info(), wallet_balance(), channel_balance(),
+        list_channels(), pending_channels(), list_peers() and fee_report() concurrently,
+        costing a single round trip.
+
+        :param previous: an earlier snapshot to diff against
+        :return: immutable NodeSnapshot of the responses, with the time each one took
+        and (if previous was given) the changes since previous
+        """
+        return take_snapshot(self, previous=previous)
+
+    def enable_response_cache(
+        self, ttls: dict = None, max_size: int = None, follow: bool = True
+    ) -> ResponseCache:
+        """
+        Custom function which turns on caching of the responses of get_info(),
+        get_node_info(), get_chan_info(), get_network_info(), fee_report() and
+        decode_pay_req(). If follow, cached entries are invalidated by
+        subscribe_channel_graph() and subscribe_channel_events() events.
+
+        :param ttls: dict of method name to seconds to cache its responses for
+        :return: ResponseCache, whose stats() reports hit rates per method
+        """
+        self.disable_response_cache()
+        cache = ResponseCache(ttls=ttls, max_size=max_size or RESPONSE_CACHE_SIZE)
+        if follow:
+            cache.follow(self)
+        self.response_cache = cache
+        return cache
+
+    def disable_response_cache(self):
+        """
+        Custom function which turns the response cache off again
+        """
+        if self.response_cache is not None:
+            self.response_cache.stop()
+            self.response_cache = None
+
+    def graph_index(self, live: bool = True, include_unannounced: bool = False):
+        """
+        Custom function which builds a local GraphIndex of the channel graph from
+        describe_graph(). If live, the index is kept updated from
+        subscribe_channel_graph() on a background thread (stop it with stop()).
+
+        :return: GraphIndex with lookups by pubkey and chan_id and adjacency lists
+        """
+        index = GraphIndex(self)
+        if live:
+            return index.start(include_unannounced=include_unannounced)
+        return index.load(include_unannounced=include_unannounced)
+
+    def pathfinder(self, graph: GraphIndex = None):
+        """
+        Custom function which returns a Pathfinder computing routes from this node
+        locally over a GraphIndex (a static one is loaded if not given), with no further
+        load on the daemon. Its block_height is taken from get_info() and should be
+        updated by the caller if the pathfinder is kept around.
+
+        :return: Pathfinder whose query_routes() returns lists of ln.Route objects
+        usable with send_to_route_sync()
+        """
+        if graph is None:
+            graph = self.graph_index(live=False)
+        info = self.get_info()
+        return Pathfinder(graph, info.identity_pubkey, block_height=info.block_height)
+
     def get_chan_info(self, chan_id: int):
         """
         the latest authenticated network announcement for the given channel identified
@@ -662,8 +985,13 @@ class Lightning(BaseClient):
         :return: ChannelEdge object with 8 attributes
         """
         request = ln.ChanInfoRequest(chan_id=chan_id)
-        response = self.lightning_stub.GetChanInfo(request)
-        return response
+        return cached_call(
+            self.response_cache,
+            "get_chan_info",
+            request,
+            lambda: self.lightning_stub.GetChanInfo(request),
+            tags=(chan_id,),
+        )
 
     # Uni-directional stream
     def subscribe_channel_events(self):
@@ -688,8 +1016,13 @@ class Lightning(BaseClient):
         """
 
         request = ln.NodeInfoRequest(pub_key=pub_key)
-        response = self.lightning_stub.GetNodeInfo(request)
-        return response
+        return cached_call(
+            self.response_cache,
+            "get_node_info",
+            request,
+            lambda: self.lightning_stub.GetNodeInfo(request),
+            tags=(pub_key,),
+        )
 
     def query_routes(self, pub_key: str, amt: int, **kwargs):
         """
@@ -714,8 +1047,12 @@ class Lightning(BaseClient):
         :return: NetworkInfo object with 10 attributes
         """
         request = ln.NetworkInfoRequest()
-        response = self.lightning_stub.GetNetworkInfo(request)
-        return response
+        return cached_call(
+            self.response_cache,
+            "get_network_info",
+            request,
+            lambda: self.lightning_stub.GetNetworkInfo(request),
+        )
 
     def stop_daemon(self):
         """
@@ -729,7 +1066,9 @@ class Lightning(BaseClient):
         return response
 
     # Response-streaming RPC
-    def subscribe_channel_graph(self):
+    def subscribe_channel_graph(
+        self, max_queue: int = None, overflow: str = BLOCK, key=None
+    ):
         """
         launches a streaming RPC that allows the caller to receive notifications upon
         any changes to the channel graph topology from the point of view of the
@@ -738,11 +1077,22 @@ class Lightning(BaseClient):
         authenticated attributes, new channels being advertised, updates in the routing
         policy for a directional channel edge, and when channels are closed on-chain.
 
+        :param max_queue: if set, read the stream into a BoundedStream of at most this
+        many updates, handling overflow with the given policy. To coalesce, updates
+        are split into their individual NodeUpdates, ChannelEdgeUpdates and
+        ClosedChannelUpdates, keeping only the latest per node, per channel direction
+        and per closed channel unless another key is given.
         :return: iterable of GraphTopologyUpdate with 3 attributes: 'node_updates',
         'channel_updates' and 'closed_chans'
         """
         request = ln.GraphTopologySubscription()
-        return self.lightning_stub.SubscribeChannelGraph(request)
+        return bounded(
+            self.lightning_stub.SubscribeChannelGraph(request),
+            max_queue,
+            overflow=overflow,
+            key=key or graph_update_key,
+            split=graph_update_items if overflow == COALESCE else None,
+        )
 
     def debug_level(self, **kwargs):
         """
@@ -767,8 +1117,12 @@ class Lightning(BaseClient):
         'week_fee_sum' and 'month_fee_sum'
         """
         request = ln.FeeReportRequest()
-        response = self.lightning_stub.FeeReport(request)
-        return response
+        return cached_call(
+            self.response_cache,
+            "fee_report",
+            request,
+            lambda: self.lightning_stub.FeeReport(request),
+        )
 
     def update_channel_policy(
         self,
@@ -824,6 +1178,84 @@ class Lightning(BaseClient):
         response = self.lightning_stub.ForwardingHistory(request)
         return response
 
+    def iter_forwarding_events(
+        self,
+        start_time: int = None,
+        end_time: int = None,
+        page_size: int = 10000,
+        shards: int = 1,
+        max_workers: int = None,
+        prefetch: bool = False,
+        index_offset: int = 0,
+    ):
+        """
+        Custom function which walks all forwarding events between start_time and
+        end_time (unix timestamps, inclusive, defaulting to the past 24 hrs) lazily,
+        requesting them from forwarding_history() page_size at a time.
+
+        With shards > 1 the time range is split into that many windows which are paged
+        concurrently (at most max_workers at once) over the shared channel. Events are
+        still yielded in timestamp order.
+
+        :param index_offset: number of events of the time range to skip, e.g. the
+        `offset` of an earlier scan of the same range to resume it. Only supported
+        with a single shard
+        :return: an iterable of ForwardingEvents. With a single shard this is a
+        Paginator whose `offset` can be used as index_offset to resume the scan
+        """
+        if index_offset and shards > 1:
+            raise ValueError("index_offset can only be used with a single shard")
+        if end_time is None:
+            end_time = int(time.time())
+        if start_time is None:
+            start_time = end_time - 24 * 60 * 60
+
+        def fetch(window, offset):
+            response = self.forwarding_history(
+                start_time=window[0],
+                end_time=window[1],
+                index_offset=offset,
+                num_max_events=page_size,
+            )
+            return response.forwarding_events, response.last_offset_index
+
+        if shards <= 1:
+            return Paginator(
+                lambda offset: fetch((start_time, end_time), offset),
+                lambda page_offset, position, event: page_offset + position + 1,
+                page_size=page_size,
+                offset=index_offset,
+                prefetch=prefetch,
+            )
+
+        # windows share their boundary second as lnd's end_time is inclusive
+        step = max((end_time - start_time) // shards, 1)
+        bounds = list(range(start_time, end_time, step))[:shards] + [end_time]
+        windows = list(zip(bounds[:-1], bounds[1:])) or [(start_time, end_time)]
+        paginator = ShardedPaginator(
+            fetch, windows, page_size=page_size, max_workers=max_workers
+        )
+        return self._dedupe_forwarding_windows(paginator)
+
+    @staticmethod
+    def _dedupe_forwarding_windows(paginator: ShardedPaginator):
+        """
+        Events at exactly the boundary second of two adjacent windows are returned by
+        both windows' queries, at the end of the first and the start of the second.
+        Skip their repeat in the second window.
+        """
+        repeats = 0
+        for (window_start, window_end), events in paginator.iter_shards():
+            boundary_events = 0
+            for event in events:
+                if repeats:
+                    repeats -= 1
+                    continue
+                if event.timestamp == window_end:
+                    boundary_events += 1
+                yield event
+            repeats = boundary_events
+
     """
     Static channel backup
     """
@@ -843,17 +1275,21 @@ class Lightning(BaseClient):
         response = self.lightning_stub.ExportChannelBackup(request)
         return response
 
-    def export_all_channel_backups(self, **kwargs):
+    def export_all_channel_backups(self, raw: bool = False, **kwargs):
         """
         returns static channel backups for all existing channels known to lnd.
         A set of regular singular static channel backups for each channel are returned.
         Additionally, a multi-channel backup is returned as well, which contains a
         single encrypted blob containing the backups of each channel.
 
+        :param raw: return the serialized ChanBackupSnapshot, as a memoryview, without
+        decoding it; wrap it in a lnd_grpc.raw.RawMessage to decode only the parts read
         :return: ChanBackupSnapshot with 2 attributes: 'single_chan_backups' and
         'multi_chan_backup'
         """
         request = ln.ChanBackupExportRequest(**kwargs)
+        if raw:
+            return self.raw_lightning_stub.ExportAllChannelBackups(request)
         response = self.lightning_stub.ExportAllChannelBackups(request)
         return response
 
@@ -896,7 +1332,9 @@ class Lightning(BaseClient):
         return response
 
     # Response-streaming RPC
-    def subscribe_channel_backups(self, **kwargs):
+    def subscribe_channel_backups(
+        self, max_queue: int = None, overflow: str = BLOCK, key=None, **kwargs
+    ):
         """
         allows a client to sub-subscribe to the most up to date information concerning
         the state of all channel backups. Each time a new channel is added, we return
@@ -906,9 +1344,17 @@ class Lightning(BaseClient):
         backups, but the updated set of encrypted multi-chan backups with the closed
         channel(s) removed.
 
+        :param max_queue: if set, read the stream into a BoundedStream of at most this
+        many snapshots, handling overflow with the given policy. Each snapshot
+        supersedes the last, so coalescing keeps only the latest unless another key
+        is given.
         :return: iterable of ChanBackupSnapshot responses, with 2 attributes per
         response: 'single_chan_backups' and 'multi_chan_backup'
         """
         request = ln.ChannelBackupSubscription(**kwargs)
-        response = self.lightning_stub.SubscribeChannelBackups(request)
-        return response
+        return bounded(
+            self.lightning_stub.SubscribeChannelBackups(request),
+            max_queue,
+            overflow=overflow,
+            key=key or (lambda snapshot: None),
+        )
@@ -1,4 +1,5 @@
 from lnd_grpc.base_client import BaseClient
+from lnd_grpc.channel_pool import ROUND_ROBIN
 from lnd_grpc.invoices import Invoices
 from lnd_grpc.lightning import Lightning
 from lnd_grpc.wallet_unlocker import WalletUnlocker
@@ -6,6 +7,16 @@ from lnd_grpc.config import defaultNetwork, defaultRPCHost, defaultRPCPort
 
 
 class Client(Lightning, WalletUnlocker, Invoices):
+    """
+    A client for all of LND's sub-systems.
+
+    With pool_size greater than 1, calls on the Lightning and Invoices sub-systems are
+    spread over a pool of that many connections to LND, picking a connection per call
+    either in turn (pool_strategy='round_robin') or by fewest calls in flight
+    (pool_strategy='least_in_flight'). See channel_pool.stats() for per-connection
+    call counts.
+    """
+
     def __init__(
         self,
         lnd_dir: str = None,
@@ -14,6 +25,8 @@ class Client(Lightning, WalletUnlocker, Invoices):
         network: str = defaultNetwork,
         grpc_host: str = defaultRPCHost,
         grpc_port: str = defaultRPCPort,
+        pool_size: int = 1,
+        pool_strategy: str = ROUND_ROBIN,
     ):
         super().__init__(
             lnd_dir=lnd_dir,
@@ -23,6 +36,8 @@ class Client(Lightning, WalletUnlocker, Invoices):
             grpc_host=grpc_host,
             grpc_port=grpc_port,
         )
+        self.pool_size = pool_size
+        self.pool_strategy = pool_strategy
 
 
 __all__ = ["BaseClient", "WalletUnlocker", "Lightning", "Invoices", "Client"]
@@ -0,0 +1,295 @@
+import bisect
+import threading
+import time
+
+from lnd_grpc.config import LATENCY_BUCKETS, SIZE_BUCKETS
+from lnd_grpc.interceptors import ClientInterceptor, message_size, split_method
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, _escape(str(v))) for k, v in labels)
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names, holding one value per combination
+    of label values
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                "%s takes labels %s, got %s"
+                % (self.name, ", ".join(self.labelnames), ", ".join(labels))
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels):
+        """
+        :return: the current value for the label values given
+        """
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list:
+        """
+        :return: list of (name, labels, value) samples, labels being a tuple of
+        (label name, label value) pairs
+        """
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            (self.name, tuple(zip(self.labelnames, key)), value) for key, value in items
+        ]
+
+    def exposition(self) -> str:
+        """
+        :return: the metric in the Prometheus text exposition format
+        """
+        lines = [
+            "# HELP %s %s" % (self.name, _escape(self.documentation)),
+            "# TYPE %s %s" % (self.name, self.type),
+        ]
+        for name, labels, value in self.samples():
+            lines.append(
+                "%s%s %s" % (name, _format_labels(labels), _format_value(value))
+            )
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("counters can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """
+    Counts observations into cumulative buckets, with their sum and count
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=()):
+        if "le" in labelnames:
+            raise ValueError("histograms cannot have a label named le")
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def value(self, **labels) -> tuple:
+        """
+        :return: (count, sum) of the observations for the label values given
+        """
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+        return (entry[2], entry[1]) if entry else (0, 0.0)
+
+    def samples(self) -> list:
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._values.items()
+            )
+        samples = []
+        for key, (counts, total, count) in items:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(
+                    (
+                        self.name + "_bucket",
+                        labels + (("le", _format_value(bound)),),
+                        cumulative,
+                    )
+                )
+            samples.append((self.name + "_sum", labels, total))
+            samples.append((self.name + "_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    A collection of metrics which can be rendered in the Prometheus text exposition
+    format, e.g. to be served by any HTTP server or written to a file for the node
+    exporter's textfile collector.
+
+    counter(), gauge() and histogram() return the existing metric of that name if there
+    is one, so several interceptors can share a registry.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(
+                    "%s is already registered as a %s" % (name, metric.type)
+                )
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, labelnames, buckets=buckets
+        )
+
+    def get(self, name: str) -> Metric:
+        """
+        :return: the metric registered under name, or None
+        """
+        return self._metrics.get(name)
+
+    def __iter__(self):
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return iter(metric for _, metric in metrics)
+
+    def exposition(self) -> str:
+        """
+        :return: all metrics in the Prometheus text exposition format
+        """
+        return "".join(metric.exposition() for metric in self)
+
+
+class MetricsInterceptor(ClientInterceptor):
+    """
+    A client interceptor recording, per service and method:
+
+    lnd_grpc_client_started_total: calls started
+    lnd_grpc_client_handled_total: calls finished, by status code
+    lnd_grpc_client_in_flight: calls started but not yet finished
+    lnd_grpc_client_handling_seconds: histogram of latency from start to finish
+    lnd_grpc_client_request_bytes: histogram of serialized request message sizes
+    lnd_grpc_client_response_bytes: histogram of serialized response message sizes
+
+    For response-streaming calls the latency is the lifetime of the stream.
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry = None,
+        latency_buckets=LATENCY_BUCKETS,
+        size_buckets=SIZE_BUCKETS,
+    ):
+        self.registry = MetricsRegistry() if registry is None else registry
+        labels = ("grpc_service", "grpc_method")
+        self.started = self.registry.counter(
+            "lnd_grpc_client_started_total", "RPCs started by the client", labels
+        )
+        self.handled = self.registry.counter(
+            "lnd_grpc_client_handled_total",
+            "RPCs completed by the client, by status code",
+            labels + ("grpc_code",),
+        )
+        self.in_flight = self.registry.gauge(
+            "lnd_grpc_client_in_flight", "RPCs started but not yet completed", labels
+        )
+        self.latency = self.registry.histogram(
+            "lnd_grpc_client_handling_seconds",
+            "Time from the start of an RPC until its status is received",
+            labels,
+            buckets=latency_buckets,
+        )
+        self.request_bytes = self.registry.histogram(
+            "lnd_grpc_client_request_bytes",
+            "Serialized size of request messages sent",
+            labels,
+            buckets=size_buckets,
+        )
+        self.response_bytes = self.registry.histogram(
+            "lnd_grpc_client_response_bytes",
+            "Serialized size of response messages received",
+            labels,
+            buckets=size_buckets,
+        )
+
+    def call_started(self, method: str):
+        service, name = split_method(method)
+        labels = {"grpc_service": service, "grpc_method": name}
+        self.started.inc(**labels)
+        self.in_flight.inc(**labels)
+        return labels, time.perf_counter()
+
+    def request_sent(self, state, request):
+        self.request_bytes.observe(message_size(request), **state[0])
+
+    def response_received(self, state, response):
+        self.response_bytes.observe(message_size(response), **state[0])
+
+    def call_finished(self, state, code):
+        labels, started = state
+        self.latency.observe(time.perf_counter() - started, **labels)
+        self.in_flight.dec(**labels)
+        self.handled.inc(grpc_code=code.name, **labels)
+
+    def exposition(self) -> str:
+        """
+        :return: the registry's metrics in the Prometheus text exposition format
+        """
+        return self.registry.exposition()
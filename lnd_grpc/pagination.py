@@ -0,0 +1,201 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Paginator:
+    """
+    Lazily walks a paginated RPC, yielding one item at a time.
+
+    Only the current page (plus the next one, when prefetching) is held in memory, so
+    full scans use constant memory. With prefetch=True the next page is requested on a
+    background thread while the current one is being consumed, hiding the RPC latency.
+
+    After each item is yielded, `offset` holds the index offset from which the scan
+    can be resumed at the following item, so a scan can be saved and resumed later.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        item_offset,
+        page_size: int,
+        offset: int = 0,
+        prefetch: bool = False,
+    ):
+        """
+        :param fetch: callable taking an index offset and returning a tuple of (list of
+        items, index offset of the next page)
+        :param item_offset: callable taking the page's index offset, the item's
+        position in the page and the item, and returning the index offset to resume
+        from after that item
+        """
+        self.fetch = fetch
+        self.item_offset = item_offset
+        self.page_size = page_size
+        self.offset = offset
+        self.prefetch = prefetch
+        self.pages = 0
+
+    def __iter__(self):
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        try:
+            page_offset = self.offset
+            next_page = None
+            while True:
+                if next_page is not None:
+                    items, next_offset = next_page.result()
+                else:
+                    items, next_offset = self.fetch(page_offset)
+                self.pages += 1
+                last_page = len(items) < self.page_size or next_offset == page_offset
+                next_page = None
+                if executor is not None and not last_page:
+                    next_page = executor.submit(self.fetch, next_offset)
+                for position, item in enumerate(items):
+                    self.offset = self.item_offset(page_offset, position, item)
+                    yield item
+                if last_page:
+                    return
+                page_offset = next_offset
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+
+class AioPaginator:
+    """
+    The asyncio counterpart of Paginator: an async iterable of items whose fetch is a
+    coroutine function. With prefetch=True the next page is requested in a task while
+    the current one is being consumed.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        item_offset,
+        page_size: int,
+        offset: int = 0,
+        prefetch: bool = False,
+    ):
+        """
+        :param fetch: coroutine function taking an index offset and returning a tuple
+        of (list of items, index offset of the next page)
+        :param item_offset: as for Paginator
+        """
+        self.fetch = fetch
+        self.item_offset = item_offset
+        self.page_size = page_size
+        self.offset = offset
+        self.prefetch = prefetch
+        self.pages = 0
+
+    async def __aiter__(self):
+        page_offset = self.offset
+        next_page = None
+        try:
+            while True:
+                if next_page is not None:
+                    items, next_offset = await next_page
+                else:
+                    items, next_offset = await self.fetch(page_offset)
+                self.pages += 1
+                last_page = len(items) < self.page_size or next_offset == page_offset
+                next_page = None
+                if self.prefetch and not last_page:
+                    next_page = asyncio.ensure_future(self.fetch(next_offset))
+                for position, item in enumerate(items):
+                    self.offset = self.item_offset(page_offset, position, item)
+                    yield item
+                if last_page:
+                    return
+                page_offset = next_offset
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+
+# marks the end of a shard's pages
+_END = object()
+
+
+class ShardedPaginator:
+    """
+    Walks several independent paginated scans (shards) concurrently, yielding the
+    items of each shard in turn.
+
+    Each shard is paged on a worker thread into a small bounded queue of pages, so
+    later shards are fetched while earlier ones are being consumed but memory stays
+    bounded. Shards are consumed in the order given, so if every shard is ordered and
+    the shards do not overlap the combined output is ordered too.
+    """
+
+    def __init__(
+        self, fetch, shards: list, page_size: int, max_workers: int = None, depth=2
+    ):
+        """
+        :param fetch: callable taking a shard, an index offset and returning a tuple of
+        (list of items, index offset of the next page)
+        :param shards: list of shard descriptions passed to fetch, e.g. time ranges
+        :param depth: number of pages buffered per shard
+        """
+        self.fetch = fetch
+        self.shards = list(shards)
+        self.page_size = page_size
+        self.max_workers = max_workers or len(self.shards)
+        self.depth = depth
+
+    def _produce(self, shard, pages: queue.Queue, stop: threading.Event):
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        offset = 0
+        try:
+            while not stop.is_set():
+                items, next_offset = self.fetch(shard, offset)
+                if not put(items):
+                    return
+                if len(items) < self.page_size or next_offset == offset:
+                    break
+                offset = next_offset
+        except Exception as e:
+            put(e)
+            return
+        put(_END)
+
+    def iter_shards(self):
+        """
+        :return: generator of (shard, iterator of the shard's items)
+        """
+        stop = threading.Event()
+        queues = [queue.Queue(maxsize=self.depth) for _ in self.shards]
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for shard, pages in zip(self.shards, queues):
+                executor.submit(self._produce, shard, pages, stop)
+            for shard, pages in zip(self.shards, queues):
+                yield shard, self._drain(pages)
+        finally:
+            stop.set()
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def _drain(pages: queue.Queue):
+        while True:
+            page = pages.get()
+            if page is _END:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield from page
+
+    def __iter__(self):
+        for shard, items in self.iter_shards():
+            yield from items
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import heapq
+from itertools import count
+
+import lnd_grpc.protos.rpc_pb2 as ln
+from lnd_grpc.graph import GraphIndex
+
+# lnd's default final hop CLTV delta (zpay32.DefaultFinalCLTVDelta)
+DEFAULT_FINAL_CLTV_DELTA = 9
+
+# lnd's time lock risk factor, in billionths of the amount per block of delta
+RISK_FACTOR_BILLIONTHS = 15
+
+
+def forwarding_fee(base_fee_msat: int, fee_rate_milli_msat: int, amt_msat: int) -> int:
+    """
+    :return: fee in msat charged to forward amt_msat under a routing policy
+    """
+    return base_fee_msat + amt_msat * fee_rate_milli_msat // 1000000
+
+
+class NoRouteError(Exception):
+    """
+    Raised when no route to the target can be found
+    """
+
+    pass
+
+
+class Pathfinder:
+    """
+    Client-side pathfinding over a GraphIndex, without any RPC to lnd.
+
+    Paths are found with a Dijkstra search running backwards from the target (as lnd
+    does) so that each hop's fee is computed on the amount it actually forwards. Edges
+    are weighted like lnd's, by fee plus a time lock risk term, and skipped if their
+    capacity, min/max htlc or disabled flag does not allow the amount. Yen's algorithm
+    provides the k shortest loopless paths. Paths are turned into ln.Route objects
+    which can be fed straight into send_to_route_sync().
+    """
+
+    def __init__(self, graph: GraphIndex, source: str, block_height: int = 0):
+        """
+        :param source: pubkey of the node routes start from
+        :param block_height: current block height, used for the routes' time locks
+        """
+        self.graph = graph
+        self.source = source
+        self.block_height = block_height
+
+    def _incoming_edges(self, node: str):
+        """
+        :return: generator of (chan_id, slot, from node, policy direction) of the
+        channels which can forward into node
+        """
+        graph = self.graph
+        for chan_id in graph.channels(node):
+            slot = graph.slot(chan_id)
+            if slot is None:
+                continue
+            if graph.node1[slot] == node:
+                yield chan_id, slot, graph.node2[slot], 1
+            else:
+                yield chan_id, slot, graph.node1[slot], 0
+
+    def shortest_path(
+        self,
+        target: str,
+        amt_msat: int,
+        final_cltv_delta: int = DEFAULT_FINAL_CLTV_DELTA,
+        source: str = None,
+        ignored_nodes=(),
+        ignored_edges=(),
+        fee_limit_msat: int = None,
+        cltv_limit: int = None,
+    ) -> list:
+        """
+        Find the cheapest path from source (default: this pathfinder's source) to
+        target able to deliver amt_msat.
+
+        :param ignored_edges: iterable of (chan_id, from node) directed edges to avoid
+        :return: list of (chan_id, from node, to node) tuples
+        """
+        source = source or self.source
+        charge_source = source != self.source
+        graph = self.graph
+        ignored_nodes = set(ignored_nodes)
+        ignored_edges = set(ignored_edges)
+
+        # per node: (weight, amount arriving at node, cltv at node)
+        best = {target: (0.0, amt_msat, final_cltv_delta)}
+        next_hop = {}
+        tie_breaker = count()
+        heap = [(0.0, next(tie_breaker), target)]
+        while heap:
+            weight, _, node = heapq.heappop(heap)
+            if weight > best[node][0]:
+                continue
+            if node == source:
+                break
+            _, amount, cltv = best[node]
+            for chan_id, slot, peer, direction in self._incoming_edges(node):
+                if peer in ignored_nodes or (chan_id, peer) in ignored_edges:
+                    continue
+                if peer == target or not graph.has_policy[direction][slot]:
+                    continue
+                policy = graph.policies[direction]
+                if policy["disabled"][slot]:
+                    continue
+                if amount > graph.capacity[slot] * 1000:
+                    continue
+                if amount < policy["min_htlc"][slot]:
+                    continue
+                max_htlc = policy["max_htlc_msat"][slot]
+                if max_htlc and amount > max_htlc:
+                    continue
+                if peer == source and not charge_source:
+                    fee = 0
+                    delta = 0
+                else:
+                    fee = forwarding_fee(
+                        policy["fee_base_msat"][slot],
+                        policy["fee_rate_milli_msat"][slot],
+                        amount,
+                    )
+                    delta = policy["time_lock_delta"][slot]
+                peer_amount = amount + fee
+                peer_cltv = cltv + delta
+                if (
+                    fee_limit_msat is not None
+                    and peer_amount - amt_msat > fee_limit_msat
+                ):
+                    continue
+                if cltv_limit is not None and peer_cltv > cltv_limit:
+                    continue
+                peer_weight = (
+                    weight + fee + amount * delta * RISK_FACTOR_BILLIONTHS / 1e9
+                )
+                if peer not in best or peer_weight < best[peer][0]:
+                    best[peer] = (peer_weight, peer_amount, peer_cltv)
+                    next_hop[peer] = (chan_id, node)
+                    heapq.heappush(heap, (peer_weight, next(tie_breaker), peer))
+
+        if source not in next_hop:
+            raise NoRouteError("no route from %s to %s" % (source, target))
+        path = []
+        node = source
+        while node != target:
+            chan_id, to_node = next_hop[node]
+            path.append((chan_id, node, to_node))
+            node = to_node
+        return path
+
+    def k_shortest_paths(
+        self, target: str, amt_msat: int, k: int = 1, **kwargs
+    ) -> list:
+        """
+        Find up to k cheapest loopless paths to target using Yen's algorithm. Keyword
+        arguments are passed on to shortest_path().
+
+        :return: list of paths, each a list of (chan_id, from node, to node) tuples
+        """
+        ignored_nodes = set(kwargs.pop("ignored_nodes", ()))
+        ignored_edges = set(kwargs.pop("ignored_edges", ()))
+        paths = [
+            self.shortest_path(
+                target,
+                amt_msat,
+                ignored_nodes=ignored_nodes,
+                ignored_edges=ignored_edges,
+                **kwargs
+            )
+        ]
+        candidates = []
+        seen = {tuple(paths[0])}
+        tie_breaker = count()
+        while len(paths) < k:
+            previous = paths[-1]
+            for i in range(len(previous)):
+                spur_node = previous[i][1]
+                root = previous[:i]
+                spur_ignored_edges = set(ignored_edges)
+                for path in paths:
+                    if path[:i] == root and len(path) > i:
+                        spur_ignored_edges.add((path[i][0], path[i][1]))
+                spur_ignored_nodes = set(ignored_nodes)
+                spur_ignored_nodes.update(hop[1] for hop in root)
+                try:
+                    spur = self.shortest_path(
+                        target,
+                        amt_msat,
+                        source=spur_node,
+                        ignored_nodes=spur_ignored_nodes,
+                        ignored_edges=spur_ignored_edges,
+                        **kwargs
+                    )
+                except NoRouteError:
+                    continue
+                candidate = root + spur
+                if tuple(candidate) in seen:
+                    continue
+                try:
+                    weight = self.path_weight(candidate, amt_msat)
+                except ValueError:
+                    continue
+                seen.add(tuple(candidate))
+                heapq.heappush(candidates, (weight, next(tie_breaker), candidate))
+            if not candidates:
+                break
+            paths.append(heapq.heappop(candidates)[2])
+        return paths
+
+    def path_weight(self, path: list, amt_msat: int) -> float:
+        """
+        :return: the weight of a path as used by the search: the fees plus the time
+        lock risk of each forwarding hop
+        """
+        weight = 0.0
+        amount = amt_msat
+        for chan_id, from_node, _ in reversed(path[1:]):
+            policy = self.graph.policy(chan_id, from_node)
+            if policy is None:
+                raise ValueError("no policy for channel %d" % chan_id)
+            fee = forwarding_fee(
+                policy.fee_base_msat, policy.fee_rate_milli_msat, amount
+            )
+            weight += (
+                fee + amount * policy.time_lock_delta * RISK_FACTOR_BILLIONTHS / 1e9
+            )
+            amount += fee
+        return weight
+
+    def build_route(
+        self,
+        path: list,
+        amt_msat: int,
+        final_cltv_delta: int = DEFAULT_FINAL_CLTV_DELTA,
+        block_height: int = None,
+    ) -> ln.Route:
+        """
+        Build an ln.Route (as returned by query_routes()) along a path of
+        (chan_id, from node, to node) tuples starting at this pathfinder's source.
+
+        :return: ln.Route
+        """
+        if block_height is None:
+            block_height = self.block_height
+        hops = []
+        amount = amt_msat
+        fee = 0
+        expiry = block_height + final_cltv_delta
+        total_time_lock = expiry
+        for i in range(len(path) - 1, -1, -1):
+            chan_id, from_node, to_node = path[i]
+            slot = self.graph.slot(chan_id)
+            if slot is None:
+                raise ValueError("unknown channel %d" % chan_id)
+            if i < len(path) - 1:
+                # the hop's node forwards over the next channel under its own policy
+                next_chan_id, hop_node, _ = path[i + 1]
+                policy = self.graph.policy(next_chan_id, hop_node)
+                if policy is None:
+                    raise ValueError("no policy for channel %d" % next_chan_id)
+                fee = forwarding_fee(
+                    policy.fee_base_msat, policy.fee_rate_milli_msat, amount
+                )
+                expiry = total_time_lock
+                total_time_lock += policy.time_lock_delta
+            hops.append(
+                ln.Hop(
+                    chan_id=chan_id,
+                    chan_capacity=self.graph.capacity[slot],
+                    amt_to_forward=amount // 1000,
+                    fee=fee // 1000,
+                    expiry=expiry,
+                    amt_to_forward_msat=amount,
+                    fee_msat=fee,
+                    pub_key=to_node,
+                )
+            )
+            amount += fee
+        hops.reverse()
+        total_fees_msat = amount - amt_msat
+        return ln.Route(
+            total_time_lock=total_time_lock,
+            total_fees=total_fees_msat // 1000,
+            total_amt=amount // 1000,
+            hops=hops,
+            total_fees_msat=total_fees_msat,
+            total_amt_msat=amount,
+        )
+
+    def query_routes(
+        self,
+        pub_key: str,
+        amt: int = 0,
+        num_routes: int = 1,
+        final_cltv_delta: int = DEFAULT_FINAL_CLTV_DELTA,
+        amt_msat: int = None,
+        **kwargs
+    ) -> list:
+        """
+        Local equivalent of Lightning.query_routes(): find up to num_routes routes to
+        pub_key able to deliver amt satoshis (or amt_msat).
+
+        :return: list of ln.Route, cheapest first
+        """
+        if amt_msat is None:
+            amt_msat = amt * 1000
+        paths = self.k_shortest_paths(
+            pub_key, amt_msat, k=num_routes, final_cltv_delta=final_cltv_delta, **kwargs
+        )
+        return [
+            self.build_route(path, amt_msat, final_cltv_delta=final_cltv_delta)
+            for path in paths
+        ]
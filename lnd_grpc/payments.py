@@ -0,0 +1,161 @@
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import grpc
+
+# marks the end of the request or response stream
+_END = object()
+
+
+class PaymentSession:
+    """
+    A bi-directional SendPayment (or SendToRoute) stream which many payments can be
+    pushed into.
+
+    Each call to send() returns a concurrent.futures.Future which is resolved with the
+    SendResponse carrying the same payment hash. Responses can also be consumed in the
+    order they arrive by iterating over the session. Once close() has been called the
+    request stream is half-closed as soon as every outstanding payment has been
+    resolved, which lets lnd end the stream cleanly.
+
+    Usage:
+        session = lnd_rpc.payment_session()
+        futures = [session.send(lnd_rpc.send_request(payment_request=p)) for p in reqs]
+        session.close()
+        results = [f.result() for f in futures]
+    """
+
+    def __init__(self, stream_method, payment_hash_resolver=None):
+        """
+        :param stream_method: the stub's stream-stream multi-callable, e.g.
+        LightningStub.SendPayment
+        :param payment_hash_resolver: callable returning the payment hash (bytes) of a
+        payment request string, used to correlate requests which only carry a
+        payment_request
+        """
+        self.payment_hash_resolver = payment_hash_resolver
+        self._requests = queue.Queue()
+        self._responses = queue.Queue()
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._closing = False
+        self._finished = False
+        self._call = stream_method(self._request_iterator())
+        self._reader = threading.Thread(
+            target=self._read_responses, name="payment-session", daemon=True
+        )
+        self._reader.start()
+
+    def _request_iterator(self):
+        while True:
+            request = self._requests.get()
+            if request is _END:
+                return
+            yield request
+
+    def _payment_hash(self, request) -> bytes:
+        if request.payment_hash:
+            return request.payment_hash
+        if request.payment_hash_string:
+            return bytes.fromhex(request.payment_hash_string)
+        payment_request = getattr(request, "payment_request", "")
+        if payment_request and self.payment_hash_resolver is not None:
+            return self.payment_hash_resolver(payment_request)
+        raise ValueError(
+            "cannot correlate a payment without payment_hash, payment_hash_string "
+            "or a resolvable payment_request"
+        )
+
+    def send(self, request) -> Future:
+        """
+        Push a SendRequest (or SendToRouteRequest) into the stream.
+
+        :return: concurrent.futures.Future resolved with the matching SendResponse
+        """
+        payment_hash = self._payment_hash(request)
+        future = Future()
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("cannot send on a closed payment session")
+            if self._finished:
+                raise RuntimeError("payment stream has already terminated")
+            if payment_hash in self._pending:
+                raise ValueError(
+                    "payment %s is already in flight in this session"
+                    % payment_hash.hex()
+                )
+            self._pending[payment_hash] = future
+        self._requests.put(request)
+        return future
+
+    def close(self):
+        """
+        Stop accepting payments and end the request stream once all outstanding
+        payments have been resolved
+        """
+        with self._lock:
+            self._closing = True
+            if not self._pending:
+                self._requests.put(_END)
+
+    def cancel(self):
+        """
+        Cancel the stream immediately, failing any outstanding payments
+        """
+        self._call.cancel()
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: number of payments sent but not yet resolved
+        """
+        return len(self._pending)
+
+    def _resolve(self, response):
+        with self._lock:
+            future = self._pending.pop(response.payment_hash, None)
+            if future is None and not response.payment_hash and self._pending:
+                # responses without a hash are attributed to the oldest payment
+                _, future = self._pending.popitem(last=False)
+            if self._closing and not self._pending:
+                self._requests.put(_END)
+        if future is not None:
+            future.set_result(response)
+
+    def _read_responses(self):
+        error = None
+        try:
+            for response in self._call:
+                self._resolve(response)
+                self._responses.put(response)
+        except grpc.RpcError as e:
+            error = e
+        with self._lock:
+            self._finished = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        self._requests.put(_END)
+        for future in pending:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.cancel()
+        self._responses.put(error if error is not None else _END)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        :return: the next SendResponse received on the stream
+        """
+        response = self._responses.get()
+        if response is _END or isinstance(response, grpc.RpcError):
+            # leave the marker in place for any further calls
+            self._responses.put(response)
+            if response is _END:
+                raise StopIteration
+            raise response
+        return response
@@ -0,0 +1,168 @@
+"""
+Writes the descriptors of rpc.proto, invoices.proto and loop_client.proto, taken from
+the generated modules, to a serialized FileDescriptorSet for
+lnd_grpc.protos.descriptor_set to load.
+
+The set is trimmed: options (the REST annotations) and the google/api imports they need
+are dropped, as are the messages and enums no kept RPC uses. By default every RPC is
+kept; --methods keeps only those named, e.g. for a service which only makes payments:
+
+    python lnd_grpc/protos/build_descriptor_set.py --methods GetInfo SendPaymentSync \
+        Invoices.SubscribeSingleInvoice --output payments.pb
+
+Run from the root of the repository, and again whenever the generated modules are
+regenerated, to update the bundled lnd_descriptors.pb.
+"""
+
+import argparse
+import os
+import sys
+
+# the generated modules can only be read by the pure-Python backend, and must not be
+# replaced by a descriptor set being installed
+os.environ["PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"] = "python"
+os.environ.pop("LND_GRPC_DESCRIPTOR_SET", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from google.protobuf import descriptor_pb2
+
+from lnd_grpc.protos import invoices_pb2, rpc_pb2
+from lnd_grpc.protos.descriptor_set import BUNDLED_DESCRIPTOR_SET
+from loop_rpc.protos import loop_client_pb2
+
+# in dependency order
+GENERATED_MODULES = [rpc_pb2, invoices_pb2, loop_client_pb2]
+DROPPED_DEPENDENCIES = {"google/api/annotations.proto"}
+
+
+def file_descriptor_set() -> descriptor_pb2.FileDescriptorSet:
+    """
+    :return: the files of the generated modules, without options
+    """
+    file_set = descriptor_pb2.FileDescriptorSet()
+    for module in GENERATED_MODULES:
+        file_proto = file_set.file.add()
+        module.DESCRIPTOR.CopyToProto(file_proto)
+        file_proto.ClearField("options")
+        file_proto.ClearField("source_code_info")
+        dependencies = [
+            d for d in file_proto.dependency if d not in DROPPED_DEPENDENCIES
+        ]
+        file_proto.ClearField("dependency")
+        file_proto.dependency.extend(dependencies)
+        for service in file_proto.service:
+            service.ClearField("options")
+            for method in service.method:
+                method.ClearField("options")
+    return file_set
+
+
+def _keep_methods(file_set: descriptor_pb2.FileDescriptorSet, methods: list):
+    """
+    Remove the RPCs not named in methods, as "Service.Method" or "Method"
+    """
+    wanted = set(methods)
+    found = set()
+    for file_proto in file_set.file:
+        for service in file_proto.service:
+            kept = []
+            for method in service.method:
+                names = {method.name, "%s.%s" % (service.name, method.name)}
+                if names & wanted:
+                    kept.append(method)
+                    found |= names & wanted
+            del service.method[:]
+            service.method.extend(kept)
+    unknown = wanted - found
+    if unknown:
+        raise ValueError("unknown methods: %s" % ", ".join(sorted(unknown)))
+
+
+def _fields(message: descriptor_pb2.DescriptorProto):
+    yield from message.field
+    for nested in message.nested_type:
+        yield from _fields(nested)
+
+
+def trim(file_set: descriptor_pb2.FileDescriptorSet, methods: list = None):
+    """
+    Remove the RPCs not named in methods (if given), then the top-level messages and
+    enums which are not used, directly or through other messages, by a remaining RPC.
+    """
+    if methods:
+        _keep_methods(file_set, methods)
+
+    # fully qualified name (".lnrpc.Invoice") of each top-level message and enum
+    types = {}
+    for file_proto in file_set.file:
+        for message in file_proto.message_type:
+            types[".%s.%s" % (file_proto.package, message.name)] = message
+        for enum in file_proto.enum_type:
+            types[".%s.%s" % (file_proto.package, enum.name)] = enum
+
+    def top_level(type_name: str) -> str:
+        # nested types (".lnrpc.Invoice.InvoiceState") are kept with their parent
+        while type_name and type_name not in types:
+            type_name = type_name.rpartition(".")[0]
+        return type_name
+
+    pending = [
+        top_level(type_name)
+        for file_proto in file_set.file
+        for service in file_proto.service
+        for method in service.method
+        for type_name in (method.input_type, method.output_type)
+    ]
+    used = set()
+    while pending:
+        type_name = pending.pop()
+        if type_name in used:
+            continue
+        used.add(type_name)
+        if isinstance(types[type_name], descriptor_pb2.DescriptorProto):
+            pending.extend(
+                top_level(field.type_name)
+                for field in _fields(types[type_name])
+                if field.type_name
+            )
+
+    for file_proto in file_set.file:
+        for container in (file_proto.message_type, file_proto.enum_type):
+            kept = [
+                t for t in container if ".%s.%s" % (file_proto.package, t.name) in used
+            ]
+            del container[:]
+            container.extend(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--methods", nargs="*", help="RPCs to keep, as Method or Service.Method"
+    )
+    parser.add_argument(
+        "--output", default=BUNDLED_DESCRIPTOR_SET, help="file to write the set to"
+    )
+    args = parser.parse_args()
+
+    file_set = file_descriptor_set()
+    before = sum(len(f.message_type) + len(f.enum_type) for f in file_set.file)
+    trim(file_set, args.methods)
+    after = sum(len(f.message_type) + len(f.enum_type) for f in file_set.file)
+    data = file_set.SerializeToString()
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(
+        "wrote %s: %d RPCs, %d of %d messages and enums, %d bytes"
+        % (
+            args.output,
+            sum(len(s.method) for f in file_set.file for s in f.service),
+            after,
+            before,
+            len(data),
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
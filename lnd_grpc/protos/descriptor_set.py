@@ -0,0 +1,252 @@
+"""
+Loads the lnd (and loop) message types from a serialized FileDescriptorSet, as written
+by build_descriptor_set.py, instead of the generated _pb2 modules.
+
+The generated modules construct every descriptor of their .proto in Python when they
+are imported, and cannot be imported at all by the upb backend of protobuf 4.21 and
+later. A descriptor set is parsed by the active backend, after which a message class is
+only built when it is first used, and the stubs only bind the RPCs which are called.
+
+install() replaces the generated modules of a protos package, so it must run before
+they are first imported. The protos packages call install_from_environment() when they
+are imported, which installs the descriptor set when the LND_GRPC_DESCRIPTOR_SET
+environment variable is set (to the path of a descriptor set, or to "1" for the bundled
+one), or when the upb backend is active.
+"""
+
+import importlib
+import os
+import sys
+import types
+
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+from google.protobuf.internal import api_implementation, enum_type_wrapper
+
+ENVIRONMENT_VARIABLE = "LND_GRPC_DESCRIPTOR_SET"
+BUNDLED_DESCRIPTOR_SET = os.path.join(os.path.dirname(__file__), "lnd_descriptors.pb")
+
+# the generated module replaced by each file of the set. The stub classes of the
+# file's services are replaced in the module's _grpc counterpart
+MODULES = {
+    "lnd_grpc/protos/rpc.proto": "lnd_grpc.protos.rpc_pb2",
+    "lnd_grpc/protos/invoices.proto": "lnd_grpc.protos.invoices_pb2",
+    "loop_rpc/protos/loop_client.proto": "loop_rpc.protos.loop_client_pb2",
+}
+
+_descriptor_set = None
+_installed_packages = set()
+
+
+def protobuf_backend() -> str:
+    """
+    :return: the protobuf implementation in use: "upb", "cpp" or "python". The
+    pure-Python backend is many times slower at parsing and serializing large messages
+    such as the ChannelGraph of describe_graph()
+    """
+    return api_implementation.Type()
+
+
+class DescriptorSet:
+    """
+    The files of a serialized FileDescriptorSet, loaded into a private descriptor pool
+    """
+
+    def __init__(self, path: str = BUNDLED_DESCRIPTOR_SET):
+        self.path = path
+        with open(path, "rb") as f:
+            self.file_set = descriptor_pb2.FileDescriptorSet.FromString(f.read())
+        self.pool = descriptor_pool.DescriptorPool()
+        self._factory = message_factory.MessageFactory(self.pool)
+        # files are in dependency order, as written by build_descriptor_set.py
+        for file_proto in self.file_set.file:
+            self.pool.Add(file_proto)
+        self.modules = {
+            file_proto.name: DescriptorSetModule(
+                MODULES.get(file_proto.name, file_proto.name),
+                self.pool.FindFileByName(file_proto.name),
+                self,
+            )
+            for file_proto in self.file_set.file
+        }
+
+    def message_class(self, descriptor):
+        """
+        :return: the message class of descriptor, built on the first call
+        """
+        if hasattr(message_factory, "GetMessageClass"):
+            message_class = message_factory.GetMessageClass(descriptor)
+        else:
+            # protobuf < 4.21 caches the classes it builds per factory
+            message_class = self._factory.GetPrototype(descriptor)
+        # as in generated code, nested messages (e.g. map entries) are class attributes
+        for nested in descriptor.nested_types:
+            if nested.name not in message_class.__dict__:
+                setattr(message_class, nested.name, self.message_class(nested))
+        return message_class
+
+    def message_class_by_name(self, full_name: str):
+        return self.message_class(self.pool.FindMessageTypeByName(full_name))
+
+    def stub_class(self, service_name: str):
+        """
+        :return: a class standing in for the generated stub class of the service named
+        service_name (e.g. "lnrpc.Lightning")
+        """
+        for file_proto in self.file_set.file:
+            for service in file_proto.service:
+                if "%s.%s" % (file_proto.package, service.name) == service_name:
+                    return _stub_class(self, service_name, service.method)
+        raise KeyError("%s is not in %s" % (service_name, self.path))
+
+
+class DescriptorSetModule(types.ModuleType):
+    """
+    A module with the attributes of a generated _pb2 module (message classes, enum
+    wrappers, top-level enum values and DESCRIPTOR), each built on first access
+    """
+
+    def __init__(self, name: str, file_descriptor, descriptor_set: DescriptorSet):
+        super().__init__(name, "Message types of %s" % file_descriptor.name)
+        self.DESCRIPTOR = file_descriptor
+        self._descriptor_set = descriptor_set
+
+    def __getattr__(self, attribute: str):
+        file_descriptor = self.__dict__["DESCRIPTOR"]
+        if attribute in file_descriptor.message_types_by_name:
+            value = self.__dict__["_descriptor_set"].message_class(
+                file_descriptor.message_types_by_name[attribute]
+            )
+        elif attribute in file_descriptor.enum_types_by_name:
+            value = enum_type_wrapper.EnumTypeWrapper(
+                file_descriptor.enum_types_by_name[attribute]
+            )
+        else:
+            for enum in file_descriptor.enum_types_by_name.values():
+                if attribute in enum.values_by_name:
+                    value = enum.values_by_name[attribute].number
+                    break
+            else:
+                raise AttributeError(
+                    "module %r has no attribute %r" % (self.__name__, attribute)
+                )
+        setattr(self, attribute, value)
+        return value
+
+    def __dir__(self):
+        file_descriptor = self.DESCRIPTOR
+        return sorted(
+            set(self.__dict__)
+            | set(file_descriptor.message_types_by_name)
+            | set(file_descriptor.enum_types_by_name)
+            | {
+                value
+                for enum in file_descriptor.enum_types_by_name.values()
+                for value in enum.values_by_name
+            }
+        )
+
+
+def _stub_class(descriptor_set: DescriptorSet, service_name: str, methods):
+    """
+    :return: a stub class for the service, whose multi-callables are created (and the
+    request and response classes built) on first access rather than in __init__
+    """
+    method_protos = {method.name: method for method in methods}
+
+    class Stub:
+        def __init__(self, channel):
+            self._channel = channel
+
+        def __getattr__(self, name: str):
+            method = method_protos.get(name)
+            if method is None:
+                raise AttributeError("%s has no method %r" % (service_name, name))
+            # type names are fully qualified: ".lnrpc.GetInfoRequest"
+            request = descriptor_set.message_class_by_name(method.input_type[1:])
+            response = descriptor_set.message_class_by_name(method.output_type[1:])
+            kind = "%s_%s" % (
+                "stream" if method.client_streaming else "unary",
+                "stream" if method.server_streaming else "unary",
+            )
+            multi_callable = getattr(self._channel, kind)(
+                "/%s/%s" % (service_name, name),
+                request_serializer=request.SerializeToString,
+                response_deserializer=response.FromString,
+            )
+            setattr(self, name, multi_callable)
+            return multi_callable
+
+        def __dir__(self):
+            return sorted(set(self.__dict__) | set(method_protos))
+
+    Stub.__name__ = Stub.__qualname__ = service_name.split(".")[-1] + "Stub"
+    return Stub
+
+
+def load(path: str = None) -> DescriptorSet:
+    """
+    :return: the DescriptorSet read from path (by default the bundled set) on the first
+    call, and on every later call
+    """
+    global _descriptor_set
+    if _descriptor_set is None:
+        _descriptor_set = DescriptorSet(path or BUNDLED_DESCRIPTOR_SET)
+    return _descriptor_set
+
+
+def install(package: str, path: str = None) -> DescriptorSet:
+    """
+    Replace the generated _pb2 modules of package (e.g. "lnd_grpc.protos") with ones
+    loaded from the descriptor set, and the stub classes of its _pb2_grpc modules with
+    lazily bound ones. Installing a package again has no effect.
+
+    :return: the installed DescriptorSet
+    """
+    descriptor_set = load(path)
+    if package in _installed_packages:
+        return descriptor_set
+    modules = [
+        module
+        for module in descriptor_set.modules.values()
+        if module.__name__.rpartition(".")[0] == package
+    ]
+    already = [m.__name__ for m in modules if m.__name__ in sys.modules]
+    if already:
+        raise RuntimeError(
+            "%s already imported, the descriptor set must be installed first"
+            % ", ".join(already)
+        )
+    for module in modules:
+        sys.modules[module.__name__] = module
+        setattr(sys.modules[package], module.__name__.rpartition(".")[2], module)
+    _installed_packages.add(package)
+
+    # the generated _grpc modules import the replaced modules, only their stubs (which
+    # bind every RPC up front) are swapped
+    for module in modules:
+        grpc_module = importlib.import_module(module.__name__ + "_grpc")
+        file_descriptor = module.DESCRIPTOR
+        for service in file_descriptor.services_by_name.values():
+            setattr(
+                grpc_module,
+                service.name + "Stub",
+                descriptor_set.stub_class(service.full_name),
+            )
+    return descriptor_set
+
+
+def install_from_environment(package: str):
+    """
+    Install the descriptor set for package if LND_GRPC_DESCRIPTOR_SET is set or the upb
+    backend, which cannot import the generated modules, is active
+    """
+    path = os.environ.get(ENVIRONMENT_VARIABLE)
+    if path or protobuf_backend() == "upb":
+        install(package, None if path in (None, "", "1") else path)
+
+
+def installed() -> DescriptorSet:
+    """
+    :return: the installed DescriptorSet, or None if the generated modules are in use
+    """
+    return _descriptor_set if _installed_packages else None
@@ -0,0 +1,278 @@
+import struct
+from collections.abc import Sequence
+
+from google.protobuf import message_factory
+from google.protobuf.descriptor import FieldDescriptor
+
+# wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+_SIGNED_VARINTS = {
+    FieldDescriptor.TYPE_INT64,
+    FieldDescriptor.TYPE_INT32,
+    FieldDescriptor.TYPE_ENUM,
+}
+_ZIGZAG_VARINTS = {FieldDescriptor.TYPE_SINT64, FieldDescriptor.TYPE_SINT32}
+_FIXED = {
+    FieldDescriptor.TYPE_FIXED64: struct.Struct("<Q"),
+    FieldDescriptor.TYPE_SFIXED64: struct.Struct("<q"),
+    FieldDescriptor.TYPE_DOUBLE: struct.Struct("<d"),
+    FieldDescriptor.TYPE_FIXED32: struct.Struct("<I"),
+    FieldDescriptor.TYPE_SFIXED32: struct.Struct("<i"),
+    FieldDescriptor.TYPE_FLOAT: struct.Struct("<f"),
+}
+
+
+def _serialize(request) -> bytes:
+    return request.SerializeToString()
+
+
+class RawStub:
+    """
+    Stands in for a stub of a service, its unary methods returning the serialized
+    response as a memoryview over the bytes received rather than a decoded message
+    """
+
+    def __init__(self, channel, service: str):
+        """
+        :param service: full service name, e.g. "lnrpc.Lightning"
+        """
+        self.channel = channel
+        self.service = service
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        multi_callable = self.channel.unary_unary(
+            "/%s/%s" % (self.service, name),
+            request_serializer=_serialize,
+            response_deserializer=memoryview,
+        )
+        setattr(self, name, multi_callable)
+        return multi_callable
+
+
+def _varint(data, position: int) -> tuple:
+    """
+    :return: (value, position after it) of the varint at position
+    """
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def _scan(data) -> dict:
+    """
+    :return: dict of field number to a list of (wire type, value) per occurrence, the
+    value being the number for varints and the (start, end) of the bytes otherwise
+    """
+    fields = {}
+    position, end = 0, len(data)
+    while position < end:
+        key, position = _varint(data, position)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == VARINT:
+            value, position = _varint(data, position)
+        elif wire_type == LENGTH_DELIMITED:
+            length, position = _varint(data, position)
+            value = (position, position + length)
+            position += length
+        elif wire_type == FIXED64:
+            value = (position, position + 8)
+            position += 8
+        elif wire_type == FIXED32:
+            value = (position, position + 4)
+            position += 4
+        else:
+            raise ValueError("unsupported wire type %d" % wire_type)
+        fields.setdefault(number, []).append((wire_type, value))
+    if position != end:
+        raise ValueError("truncated message")
+    return fields
+
+
+def _decode_varint(field, value: int):
+    if field.type == FieldDescriptor.TYPE_BOOL:
+        return bool(value)
+    if field.type in _ZIGZAG_VARINTS:
+        return (value >> 1) ^ -(value & 1)
+    if field.type in _SIGNED_VARINTS and value >= 1 << 63:
+        # negative values are sign-extended to 64 bits
+        return value - (1 << 64)
+    return value
+
+
+def _class_of(descriptor):
+    if hasattr(message_factory, "GetMessageClass"):
+        return message_factory.GetMessageClass(descriptor)
+    # protobuf < 4.21 keeps the class built for a descriptor on it
+    return descriptor._concrete_class
+
+
+def _default(field):
+    if field.type == FieldDescriptor.TYPE_MESSAGE:
+        return RawMessage(b"", _class_of(field.message_type))
+    if field.type == FieldDescriptor.TYPE_BYTES:
+        return memoryview(b"")
+    return field.default_value
+
+
+class RawMessage:
+    """
+    A read-only view of a serialized message which decodes only the fields read, e.g.
+    to pick a few nodes out of describe_graph(raw=True) or to archive the backups of
+    export_all_channel_backups(raw=True) without building the whole message:
+
+    graph = RawMessage(lnd_rpc.describe_graph(raw=True), ln.ChannelGraph)
+    aliases = [node.alias for node in graph.nodes]
+
+    Fields are read as attributes, named as on message_class. Sub-messages are
+    RawMessages and repeated sub-messages RawRepeated sequences, sharing the memory of
+    the original buffer; bytes fields are memoryviews of it (bytes() copies them out).
+    Maps are decoded into dicts. decode() returns the full message_class instance.
+    """
+
+    def __init__(self, data, message_class):
+        self._data = memoryview(data)
+        self._message_class = message_class
+        self._fields = None
+
+    @property
+    def DESCRIPTOR(self):
+        return self._message_class.DESCRIPTOR
+
+    def _occurrences(self, number: int) -> list:
+        if self._fields is None:
+            self._fields = _scan(self._data)
+        return self._fields.get(number, [])
+
+    def _slice(self, value: tuple) -> memoryview:
+        return self._data[value[0] : value[1]]
+
+    def _scalar(self, field, wire_type: int, value):
+        if wire_type == VARINT:
+            return _decode_varint(field, value)
+        if field.type in _FIXED:
+            return _FIXED[field.type].unpack(self._slice(value))[0]
+        if field.type == FieldDescriptor.TYPE_STRING:
+            return str(self._slice(value), "utf-8")
+        if field.type == FieldDescriptor.TYPE_BYTES:
+            return self._slice(value)
+        return RawMessage(self._slice(value), _class_of(field.message_type))
+
+    def _packed(self, field, value: tuple) -> list:
+        data = self._slice(value)
+        if field.type in _FIXED:
+            return [unpacked[0] for unpacked in _FIXED[field.type].iter_unpack(data)]
+        values, position = [], 0
+        while position < len(data):
+            number, position = _varint(data, position)
+            values.append(_decode_varint(field, number))
+        return values
+
+    def _value(self, field):
+        occurrences = self._occurrences(field.number)
+        if field.label != FieldDescriptor.LABEL_REPEATED:
+            if not occurrences:
+                return _default(field)
+            # the last occurrence of a singular field wins
+            return self._scalar(field, *occurrences[-1])
+        if field.type == FieldDescriptor.TYPE_MESSAGE:
+            entries = RawRepeated(
+                self._data,
+                [value for _, value in occurrences],
+                _class_of(field.message_type),
+            )
+            if field.message_type.GetOptions().map_entry:
+                return {entry.key: entry.value for entry in entries}
+            return entries
+        values = []
+        for wire_type, value in occurrences:
+            if (
+                wire_type == LENGTH_DELIMITED
+                and field.type != FieldDescriptor.TYPE_STRING
+                and field.type != FieldDescriptor.TYPE_BYTES
+            ):
+                values.extend(self._packed(field, value))
+            else:
+                values.append(self._scalar(field, wire_type, value))
+        return values
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        field = self._message_class.DESCRIPTOR.fields_by_name.get(name)
+        if field is None:
+            raise AttributeError(
+                "%s has no field %r" % (self._message_class.DESCRIPTOR.full_name, name)
+            )
+        value = self._value(field)
+        setattr(self, name, value)
+        return value
+
+    def HasField(self, name: str) -> bool:
+        """
+        :return: whether the field is present in the serialized message
+        """
+        field = self._message_class.DESCRIPTOR.fields_by_name[name]
+        return bool(self._occurrences(field.number))
+
+    def decode(self):
+        """
+        :return: the whole message, decoded into an instance of message_class
+        """
+        return self._message_class.FromString(self._data.tobytes())
+
+    def tobytes(self) -> bytes:
+        return self._data.tobytes()
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def __repr__(self):
+        return "RawMessage(%s, %d bytes)" % (
+            self._message_class.DESCRIPTOR.full_name,
+            self._data.nbytes,
+        )
+
+
+class RawRepeated(Sequence):
+    """
+    The occurrences of a repeated sub-message field of a RawMessage, each one only
+    scanned when it is read
+    """
+
+    def __init__(self, data: memoryview, spans: list, message_class):
+        self.data = data
+        self.spans = spans
+        self.message_class = message_class
+
+    def raw(self, index: int) -> memoryview:
+        """
+        :return: the serialized sub-message at index, e.g. to forward it unchanged
+        """
+        start, end = self.spans[index]
+        return self.data[start:end]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.spans)))]
+        return RawMessage(self.raw(index), self.message_class)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __repr__(self):
+        return "RawRepeated(%s, %d messages)" % (
+            self.message_class.DESCRIPTOR.full_name,
+            len(self.spans),
+        )
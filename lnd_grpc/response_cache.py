@@ -0,0 +1,326 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+import grpc
+
+from lnd_grpc.config import (
+    RECONNECT_BACKOFF_BASE,
+    RECONNECT_BACKOFF_MAX,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTLS,
+)
+
+
+def cached_call(cache, method: str, request, fetch, tags=()):
+    """
+    Call fetch() through the cache, or directly if cache is None
+    """
+    if cache is None:
+        return fetch()
+    return cache.call(method, request, fetch, tags)
+
+
+def _copy(response):
+    # callers get their own copy of a cached message, which they may modify
+    result = type(response)()
+    result.CopyFrom(response)
+    return result
+
+
+class ResponseCache:
+    """
+    A TTL and LRU bounded cache of responses to read-mostly RPCs.
+
+    Entries are keyed by method name and serialized request, and expire after the
+    method's TTL (methods without a TTL are never cached). Once `max_size` entries are
+    held the least recently used one is evicted.
+
+    Entries can be tagged with the pubkey or chan_id they describe so that graph and
+    channel events can invalidate just the affected entries. follow() keeps the cache
+    consistent with lnd by consuming subscribe_channel_graph() and
+    subscribe_channel_events() on background threads.
+    """
+
+    def __init__(self, ttls: dict = None, max_size: int = RESPONSE_CACHE_SIZE):
+        """
+        :param ttls: dict of method name to time to live in seconds, defaulting to
+        RESPONSE_CACHE_TTLS
+        """
+        self.ttls = dict(RESPONSE_CACHE_TTLS if ttls is None else ttls)
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+        # bumped by every invalidation, overall and per method
+        self._generation = 0
+        self._method_generations = {}
+        self._stop = threading.Event()
+        self._threads = []
+        # the current subscription of each followed stream
+        self._subscriptions = {}
+
+    def _count(self, method: str, stat: str):
+        stats = self._stats.setdefault(
+            method, {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        )
+        stats[stat] += 1
+
+    def call(self, method: str, request, fetch, tags=()):
+        """
+        Return the cached response to a request if there is a fresh one, otherwise
+        fetch, cache and return it.
+
+        :param fetch: callable performing the RPC
+        :param tags: pubkeys or chan_ids the response describes
+        """
+        ttl = self.ttls.get(method)
+        if not ttl:
+            return fetch()
+        key, now, cached, generation = self._lookup(method, request)
+        if cached is not None:
+            return cached
+        return self._store(method, key, now + ttl, fetch(), tags, generation)
+
+    def _lookup(self, method: str, request) -> tuple:
+        """
+        :return: tuple of the request's key, the current time, a copy of its fresh
+        cached response (or None) and the invalidation generation it is fetched in
+        """
+        key = (method, request.SerializeToString(deterministic=True))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._count(method, "hits")
+                return key, now, _copy(entry[1]), None
+            self._count(method, "misses")
+            generation = self._generation, self._method_generations.get(method)
+        return key, now, None, generation
+
+    def _store(self, method: str, key, expiry: float, response, tags, generation):
+        with self._lock:
+            if generation != (self._generation, self._method_generations.get(method)):
+                # invalidated whilst fetching, the response may already be stale
+                return response
+            self._entries[key] = (expiry, response, frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                (evicted, _), _ = self._entries.popitem(last=False)
+                self._count(evicted, "evictions")
+        return _copy(response)
+
+    def invalidate(self, method: str = None, tag=None):
+        """
+        Drop cached responses, optionally only those of a method and/or with a tag
+        """
+        with self._lock:
+            if method is None:
+                self._generation += 1
+            else:
+                self._method_generations[method] = (
+                    self._method_generations.get(method, 0) + 1
+                )
+            for key in list(self._entries):
+                if method is not None and key[0] != method:
+                    continue
+                if tag is not None and tag not in self._entries[key][2]:
+                    continue
+                del self._entries[key]
+                self._count(key[0], "invalidations")
+
+    def clear(self):
+        """
+        Drop all cached responses
+        """
+        self.invalidate()
+
+    def stats(self) -> dict:
+        """
+        :return: dict of method name to its hits, misses, evictions, invalidations
+        and hit_rate
+        """
+        with self._lock:
+            stats = {method: dict(counts) for method, counts in self._stats.items()}
+        for counts in stats.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = counts["hits"] / lookups if lookups else 0.0
+        return stats
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :return: fraction of all lookups which were served from the cache
+        """
+        with self._lock:
+            hits = sum(counts["hits"] for counts in self._stats.values())
+            misses = sum(counts["misses"] for counts in self._stats.values())
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Invalidation
+
+    def apply_graph_update(self, update):
+        """
+        Invalidate the entries affected by a GraphTopologyUpdate
+        """
+        for node_update in update.node_updates:
+            self.invalidate("get_node_info", node_update.identity_key)
+        for channel_update in update.channel_updates:
+            self.invalidate("get_chan_info", channel_update.chan_id)
+            self.invalidate("get_node_info", channel_update.advertising_node)
+            self.invalidate("get_node_info", channel_update.connecting_node)
+        for closed in update.closed_chans:
+            self.invalidate("get_chan_info", closed.chan_id)
+        if update.channel_updates or update.closed_chans:
+            # our own policies and the network totals may have changed
+            self.invalidate("fee_report")
+            self.invalidate("get_network_info")
+
+    def apply_channel_event(self, event):
+        """
+        Invalidate the entries affected by a ChannelEventUpdate
+        """
+        for channel in (event.open_channel, event.closed_channel):
+            if channel.chan_id:
+                self.invalidate("get_chan_info", channel.chan_id)
+            if channel.remote_pubkey:
+                self.invalidate("get_node_info", channel.remote_pubkey)
+        self.invalidate("get_info")
+        self.invalidate("fee_report")
+        self.invalidate("get_network_info")
+
+    def follow(self, client):
+        """
+        Invalidate entries from subscribe_channel_graph() and
+        subscribe_channel_events() on daemon threads. If either subscription drops the
+        whole cache is cleared, as events may have been missed, and the subscription
+        is retried with exponential backoff.
+        """
+        if self._threads:
+            return self
+        self._stop.clear()
+        for subscribe, apply in (
+            (client.subscribe_channel_graph, self.apply_graph_update),
+            (client.subscribe_channel_events, self.apply_channel_event),
+        ):
+            thread = threading.Thread(
+                target=self._follow,
+                args=(subscribe, apply),
+                name="response-cache",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _follow(self, subscribe, apply):
+        backoff = RECONNECT_BACKOFF_BASE
+        while not self._stop.is_set():
+            try:
+                subscription = subscribe()
+                self._subscriptions[subscribe] = subscription
+                if self._stop.is_set():
+                    subscription.cancel()
+                # anything cached before the subscription started may be stale
+                self.clear()
+                backoff = RECONNECT_BACKOFF_BASE
+                for event in subscription:
+                    apply(event)
+            except grpc.RpcError:
+                pass
+            self.clear()
+            if self._stop.wait(backoff):
+                return
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    def stop(self):
+        """
+        Stop following graph and channel events
+        """
+        self._stop.set()
+        for subscription in list(self._subscriptions.values()):
+            subscription.cancel()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._subscriptions = {}
+
+
+class AioResponseCache(ResponseCache):
+    """
+    The asyncio counterpart of ResponseCache, for lnd_grpc.aio.Client: call() is a
+    coroutine awaiting the fetched call, and follow() consumes the subscriptions in
+    tasks rather than threads.
+    """
+
+    def __init__(self, ttls: dict = None, max_size: int = RESPONSE_CACHE_SIZE):
+        super().__init__(ttls=ttls, max_size=max_size)
+        self._tasks = []
+
+    async def call(self, method: str, request, fetch, tags=()):
+        """
+        Return the cached response to a request if there is a fresh one, otherwise
+        fetch, cache and return it.
+
+        :param fetch: callable returning an awaitable of the RPC's response
+        :param tags: pubkeys or chan_ids the response describes
+        """
+        ttl = self.ttls.get(method)
+        if not ttl:
+            return await fetch()
+        key, now, cached, generation = self._lookup(method, request)
+        if cached is not None:
+            return cached
+        response = await fetch()
+        return self._store(method, key, now + ttl, response, tags, generation)
+
+    def follow(self, client):
+        """
+        Invalidate entries from subscribe_channel_graph() and
+        subscribe_channel_events() in tasks. If either subscription drops the whole
+        cache is cleared, as events may have been missed, and the subscription is
+        retried with exponential backoff.
+        """
+        if self._tasks:
+            return self
+        self._tasks = [
+            asyncio.ensure_future(self._follow(subscribe, apply))
+            for subscribe, apply in (
+                (client.subscribe_channel_graph, self.apply_graph_update),
+                (client.subscribe_channel_events, self.apply_channel_event),
+            )
+        ]
+        return self
+
+    async def _follow(self, subscribe, apply):
+        backoff = RECONNECT_BACKOFF_BASE
+        while True:
+            try:
+                subscription = subscribe()
+                self._subscriptions[subscribe] = subscription
+                # anything cached before the subscription started may be stale
+                self.clear()
+                backoff = RECONNECT_BACKOFF_BASE
+                async for event in subscription:
+                    apply(event)
+            except grpc.RpcError:
+                pass
+            self.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    def stop(self):
+        """
+        Stop following graph and channel events
+        """
+        for subscription in list(self._subscriptions.values()):
+            subscription.cancel()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._subscriptions = {}
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+# snapshot field name, client method, and the key identifying items of list fields
+SNAPSHOT_CALLS = (
+    ("info", "get_info", None),
+    ("wallet_balance", "wallet_balance", None),
+    ("channel_balance", "channel_balance", None),
+    ("channels", "list_channels", "channel_point"),
+    ("pending_channels", "pending_channels", None),
+    ("peers", "list_peers", "pub_key"),
+    ("fee_report", "fee_report", None),
+)
+
+
+def _message_changes(old, new) -> dict:
+    changes = {}
+    for field in new.DESCRIPTOR.fields:
+        old_value = getattr(old, field.name)
+        new_value = getattr(new, field.name)
+        if old_value != new_value:
+            changes[field.name] = (old_value, new_value)
+    return changes
+
+
+def _list_changes(old, new, key: str) -> dict:
+    old_items = {getattr(item, key): item for item in old}
+    new_items = {getattr(item, key): item for item in new}
+    return {
+        "added": [new_items[k] for k in new_items if k not in old_items],
+        "removed": [old_items[k] for k in old_items if k not in new_items],
+        "changed": {
+            k: _message_changes(old_items[k], new_items[k])
+            for k in new_items
+            if k in old_items and old_items[k] != new_items[k]
+        },
+    }
+
+
+class NodeSnapshot(
+    namedtuple(
+        "NodeSnapshot",
+        [name for name, _, _ in SNAPSHOT_CALLS] + ["timings", "taken_at", "changes"],
+    )
+):
+    """
+    An immutable view of a node's state gathered by Lightning.snapshot().
+
+    `timings` maps each field to the seconds its RPC took from the start of the
+    fan-out, `taken_at` is the (epoch) time the snapshot was started and `changes` is
+    the diff against the previous snapshot, if one was given.
+    """
+
+    __slots__ = ()
+
+    def diff(self, previous) -> dict:
+        """
+        Compare with an earlier snapshot.
+
+        :return: dict of the fields which changed. Message fields map to a dict of
+        sub-field name to (old, new) values; list fields (channels, peers) map to a
+        dict of 'added' and 'removed' items and 'changed' items (by channel point or
+        pubkey) with their own sub-field changes.
+        """
+        changes = {}
+        for name, _, key in SNAPSHOT_CALLS:
+            old = getattr(previous, name)
+            new = getattr(self, name)
+            if key is not None:
+                list_changes = _list_changes(old, new, key)
+                if any(list_changes.values()):
+                    changes[name] = list_changes
+            elif old != new:
+                changes[name] = _message_changes(old, new)
+        return changes
+
+
+def take_snapshot(client, previous: NodeSnapshot = None) -> NodeSnapshot:
+    """
+    Issue all of the snapshot RPCs at once over the client's channel and wait for
+    them to complete.
+
+    :return: NodeSnapshot
+    """
+    taken_at = time.time()
+    start = time.monotonic()
+    timings = {}
+    lock = threading.Lock()
+    timed = threading.Event()
+
+    def timer(name):
+        def done(_):
+            with lock:
+                timings[name] = time.monotonic() - start
+                if len(timings) == len(SNAPSHOT_CALLS):
+                    timed.set()
+
+        return done
+
+    futures = {}
+    for name, method, _ in SNAPSHOT_CALLS:
+        futures[name] = getattr(client.future, method)()
+        futures[name].add_done_callback(timer(name))
+    results = {name: future.result() for name, future in futures.items()}
+    # done callbacks may still be running once the results are available
+    timed.wait()
+    return make_snapshot(results, timings, taken_at, previous=previous)
+
+
+def make_snapshot(
+    results: dict, timings: dict, taken_at: float, previous: NodeSnapshot = None
+) -> NodeSnapshot:
+    """
+    :param results: dict of snapshot field name to the response of its RPC
+    :return: NodeSnapshot of the results, diffed against previous if given
+    """
+    for name, _, key in SNAPSHOT_CALLS:
+        if key is not None:
+            results[name] = tuple(results[name])
+    snapshot = NodeSnapshot(
+        timings=MappingProxyType(timings), taken_at=taken_at, changes=None, **results
+    )
+    if previous is not None:
+        snapshot = snapshot._replace(changes=MappingProxyType(snapshot.diff(previous)))
+    return snapshot
@@ -0,0 +1,256 @@
+import contextvars
+import json
+import secrets
+import threading
+import time
+
+import grpc
+
+from lnd_grpc.config import TRACE_BATCH_SIZE
+from lnd_grpc.interceptors import ClientInterceptor, message_size, split_method
+
+OK = "OK"
+ERROR = "ERROR"
+
+# the span of the operation in progress in the current thread or asyncio task
+_current_span = contextvars.ContextVar("lnd_grpc_current_span", default=None)
+
+
+def current_span():
+    """
+    :return: the Span in progress in the current context, or None
+    """
+    return _current_span.get()
+
+
+def propagate(fn):
+    """
+    Bind fn to a copy of the current context, so that spans it starts are children of
+    the current span even when it is run on another thread, e.g.
+    threading.Thread(target=propagate(worker)) or executor.submit(propagate(fn)).
+
+    asyncio tasks inherit the context they are created in without this, but
+    loop.run_in_executor() does not.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+
+    return run
+
+
+class Span:
+    """
+    A timed operation belonging to a trace, with attributes and a status. Used as a
+    context manager it is the current span, and so the parent of any spans started,
+    until it is ended on exit.
+    """
+
+    def __init__(self, tracer, name: str, parent=None, attributes: dict = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = None
+        self.start_time = time.time()
+        self.end_time = None
+        self._started = time.perf_counter()
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount=1):
+        """
+        Add to a numeric attribute
+        """
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration(self) -> float:
+        """
+        :return: seconds from start to end (or to now, if the span has not ended)
+        """
+        if self.end_time is not None:
+            return self.end_time - self.start_time
+        return time.perf_counter() - self._started
+
+    def end(self, status: str = OK):
+        """
+        End the span and export it. Ending a span more than once has no effect.
+        """
+        if self.end_time is not None:
+            return
+        self.status = status
+        self.end_time = self.start_time + time.perf_counter() - self._started
+        self.tracer.exporter.export(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.set_attribute("error", repr(exc_val))
+        self.end(OK if exc_type is None else ERROR)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+    def __repr__(self):
+        return "Span(%r, %s, %.6fs)" % (self.name, self.status, self.duration)
+
+
+class Tracer:
+    """
+    Starts spans and hands them to an exporter once they end
+    """
+
+    def __init__(self, exporter=None):
+        """
+        :param exporter: object with an export(span) method, by default an
+        InMemoryExporter
+        """
+        self.exporter = InMemoryExporter() if exporter is None else exporter
+
+    def start_span(self, name: str, parent=None, attributes: dict = None) -> Span:
+        """
+        Start a span, as a child of parent or else of the current span. It is not made
+        the current span: end() must be called on it.
+        """
+        if parent is None:
+            parent = current_span()
+        return Span(self, name, parent=parent, attributes=attributes)
+
+    def span(self, name: str, **attributes) -> Span:
+        """
+        Start a span to be used as a context manager, e.g. to group the calls of a
+        business operation:
+
+        with tracer.span("pay invoice"):
+            client.send_payment_sync(payment_request=pay_req)
+        """
+        return self.start_span(name, attributes=attributes)
+
+
+class InMemoryExporter:
+    """
+    Collects ended spans in a list
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def find(self, name: str) -> list:
+        """
+        :return: the collected spans named name
+        """
+        with self._lock:
+            return [span for span in self.spans if span.name == name]
+
+    def children(self, span: Span) -> list:
+        """
+        :return: the collected spans whose parent is span
+        """
+        with self._lock:
+            return [s for s in self.spans if s.parent_id == span.span_id]
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+
+class JsonLinesExporter:
+    """
+    Appends each ended span to a file as a line of JSON
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class TracingInterceptor(ClientInterceptor):
+    """
+    A client interceptor opening a span per call, named after the full method name and
+    carrying the service, method, request and response message counts and sizes and
+    the status code.
+
+    For response-streaming calls each run of up to batch_size responses is also given
+    a child span ("<method> batch"), from the first response of the batch being
+    consumed to the last.
+    """
+
+    def __init__(self, tracer: Tracer, batch_size: int = TRACE_BATCH_SIZE):
+        self.tracer = tracer
+        self.batch_size = batch_size
+
+    def call_started(self, method: str):
+        service, name = split_method(method)
+        span = self.tracer.start_span(
+            method, attributes={"rpc.service": service, "rpc.method": name}
+        )
+        # [call span, open batch span]
+        return [span, None]
+
+    def request_sent(self, state, request):
+        state[0].add("rpc.request.messages")
+        state[0].add("rpc.request.bytes", message_size(request))
+
+    def response_received(self, state, response):
+        span, batch = state
+        size = message_size(response)
+        span.add("rpc.response.messages")
+        span.add("rpc.response.bytes", size)
+        if not self._streaming(span):
+            return
+        if batch is None:
+            batch = state[1] = self.tracer.start_span(span.name + " batch", parent=span)
+        batch.add("rpc.response.messages")
+        batch.add("rpc.response.bytes", size)
+        if batch.attributes["rpc.response.messages"] >= self.batch_size:
+            batch.end()
+            state[1] = None
+
+    def _streaming(self, span) -> bool:
+        return span.attributes.get("rpc.streaming", False)
+
+    def stream_started(self, state):
+        state[0].set_attribute("rpc.streaming", True)
+
+    def call_finished(self, state, code: grpc.StatusCode):
+        span, batch = state
+        if batch is not None:
+            batch.end()
+        span.set_attribute("rpc.grpc.status_code", code.name)
+        span.end(OK if code == grpc.StatusCode.OK else ERROR)
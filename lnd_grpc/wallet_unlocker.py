@@ -1,7 +1,5 @@
 from os import environ
 
-import grpc
-
 import lnd_grpc.protos.rpc_pb2 as ln
 import lnd_grpc.protos.rpc_pb2_grpc as lnrpc
 from lnd_grpc.base_client import BaseClient
@@ -42,20 +40,17 @@ class WalletUnlocker(BaseClient):
 
     @property
     def wallet_unlocker_stub(self) -> lnrpc.WalletUnlockerStub:
-        if self._w_stub is None:
-            ssl_creds = grpc.ssl_channel_credentials(self.tls_cert)
-            self._w_channel = grpc.secure_channel(
-                target=self.grpc_address,
-                credentials=ssl_creds,
-                options=self.grpc_options,
-            )
+        channel = self.tls_channel
+        if self._w_stub is None or self._w_channel is not channel:
+            self._w_channel = channel
             self._w_stub = lnrpc.WalletUnlockerStub(self._w_channel)
+        return self._w_stub
 
-        # simulate connection status change after wallet stub used (typically wallet unlock) which
-        # stimulates lightning stub regeneration when necessary
+    def _wallet_unlocked(self, response):
+        # the Lightning sub-system only starts once the wallet is unlocked, so the
+        # authenticated channel is rebuilt on its next use
         self.connection_status_change = True
-
-        return self._w_stub
+        return response
 
     def gen_seed(self, **kwargs):
         """
@@ -88,7 +83,7 @@ class WalletUnlocker(BaseClient):
             wallet_password=wallet_password.encode("utf-8"), **kwargs
         )
         response = self.wallet_unlocker_stub.InitWallet(request)
-        return response
+        return self._wallet_unlocked(response)
 
     def unlock_wallet(self, wallet_password: str, recovery_window: int = 0):
         """
@@ -101,7 +96,7 @@ class WalletUnlocker(BaseClient):
             recovery_window=recovery_window,
         )
         response = self.wallet_unlocker_stub.UnlockWallet(request)
-        return response
+        return self._wallet_unlocked(response)
 
     def change_password(self, current_password: str, new_password: str):
         """
@@ -115,4 +110,4 @@ class WalletUnlocker(BaseClient):
             new_password=new_password.encode("utf-8"),
         )
         response = self.wallet_unlocker_stub.ChangePassword(request)
-        return response
+        return self._wallet_unlocked(response)
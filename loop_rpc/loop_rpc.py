@@ -1,4 +1,5 @@
-from grpc import insecure_channel
+from grpc import insecure_channel, intercept_channel
+from lnd_grpc.backpressure import BLOCK, bounded
 from loop_rpc.protos import loop_client_pb2 as loop, loop_client_pb2_grpc as looprpc
 
 
@@ -15,25 +16,45 @@ class LoopClient:
         self._loop_stub: looprpc.SwapClientStub = None
         self.loop_host = loop_host
         self.loop_port = loop_port
+        self.interceptors = []
 
     @property
     def loop_stub(self) -> looprpc.SwapClientStub:
         if self._loop_stub is None:
             loop_channel = insecure_channel(self.loop_host + ":" + self.loop_port)
+            if self.interceptors:
+                loop_channel = intercept_channel(loop_channel, *self.interceptors)
             self._loop_stub = looprpc.SwapClientStub(loop_channel)
         return self._loop_stub
 
+    def add_interceptor(self, interceptor):
+        """
+        Install a grpc client interceptor, e.g. a lnd_grpc.metrics.MetricsInterceptor,
+        on the loopd channel. The stub is rebuilt on its next use.
+        """
+        self.interceptors.append(interceptor)
+        self._loop_stub = None
+
     def loop_out(self, amt: int, **kwargs):
         request = loop.LoopOutRequest(amt=amt, **kwargs)
         response = self.loop_stub.LoopOut(request)
         return response
 
-    def monitor(self):
+    def monitor(self, max_queue: int = None, overflow: str = BLOCK, key=None):
         """
         returns an iterable stream
+
+        :param max_queue: if set, read the stream into a BoundedStream of at most this
+        many SwapStatus updates, handling overflow with the given policy (coalescing by
+        swap id unless another key is given)
         """
         request = loop.MonitorRequest()
-        return self.loop_stub.Monitor(request)
+        return bounded(
+            self.loop_stub.Monitor(request),
+            max_queue,
+            overflow=overflow,
+            key=key or (lambda status: status.id),
+        )
 
     def loop_out_terms(self):
         request = loop.TermsRequest()
@@ -0,0 +1,5 @@
+from lnd_grpc.protos import descriptor_set
+
+# load the message types from the descriptor set rather than the generated modules, if
+# configured to or if the protobuf backend cannot import those
+descriptor_set.install_from_environment(__name__)
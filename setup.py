@@ -8,17 +8,18 @@ setuptools.setup(
     version="0.4.0",
     author="Will Clark",
     author_email="will8clark@gmail.com",
-    description="An LND gRPC client for Python 3.6",
+    description="An LND gRPC client for Python 3.7",
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/willcl-ark/lnd_grpc",
     packages=setuptools.find_packages(exclude=["googleapis", "misc"]),
+    package_data={"lnd_grpc.protos": ["lnd_descriptors.pb"]},
     classifiers=[
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
     keywords="lnd grpc",
-    install_requires=["grpcio", "grpcio-tools", "googleapis-common-protos"],
-    python_requires=">=3.6",
+    install_requires=["grpcio>=1.32.0", "grpcio-tools", "googleapis-common-protos"],
+    python_requires=">=3.7",
 )
@@ -4,9 +4,19 @@ import threading
 import queue
 from hashlib import sha256
 from secrets import token_bytes
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncio
 
 import grpc
 
+import lnd_grpc.aio
+from lnd_grpc import bolt11
+from lnd_grpc.channel_closer import ChannelCloser
+from lnd_grpc.invoice_subscription import InvoiceSubscription
+from lnd_grpc.protos.descriptor_set import DescriptorSet
+from lnd_grpc.raw import RawMessage
+from lnd_grpc.tracing import propagate
 from lnd_grpc.protos import invoices_pb2 as invoices_pb2, rpc_pb2
 from loop_rpc.protos import loop_client_pb2
 from test_utils.fixtures import *
@@ -347,6 +357,24 @@ class TestNonInteractiveLightning:
         #
         # assert any(isinstance(update) == rpc_pb2.Transaction for update in get_updates(transaction_updates))
 
+    def test_bounded_subscription(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        subscription = alice.subscribe_transactions(max_queue=1, overflow="coalesce")
+        try:
+            alice.add_funds(alice.bitcoin, 1)
+            transaction = next(subscription)
+            assert isinstance(transaction, rpc_pb2.Transaction)
+            stats = subscription.stats()
+            assert stats["high_water"] <= 1
+            assert stats["received"] == (
+                stats["delivered"] + stats["coalesced"] + stats["pending"]
+            )
+        finally:
+            subscription.cancel()
+        assert list(subscription) == []
+        with pytest.raises(ValueError):
+            alice.subscribe_transactions(max_queue=1, overflow="unbounded")
+
     def test_new_address(self, alice):
         gen_and_sync_lnd(alice.bitcoin, [alice])
         p2wkh_address, np2wkh_address = get_addresses(alice, "response")
@@ -376,10 +404,98 @@ class TestNonInteractiveLightning:
         invoice = alice.add_invoice(value=SEND_AMT)
         assert isinstance(invoice, rpc_pb2.AddInvoiceResponse)
 
+    def test_add_invoices_batch(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        _, preimage = random_32_byte_hash()
+        specs = [{"value": SEND_AMT, "memo": str(i)} for i in range(20)]
+        # the second invoice with a duplicate preimage is rejected
+        specs[10]["r_preimage"] = specs[11]["r_preimage"] = preimage
+        results = alice.add_invoices_batch(specs, max_in_flight=5)
+        assert len(results) == 20
+        assert isinstance(results[11], grpc.RpcError)
+        invoices = [r for r in results if isinstance(r, rpc_pb2.AddInvoiceResponse)]
+        assert len(invoices) == 19
+        for spec, result in zip(specs, results):
+            if result is not results[11]:
+                assert alice.lookup_invoice(r_hash=result.r_hash).memo == spec["memo"]
+
+    def test_invoice_subscription(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        first = alice.add_invoice(value=SEND_AMT)
+        second = alice.add_invoice(value=SEND_AMT)
+        # resuming from the first invoice replays only the second
+        subscription = alice.invoice_subscription(add_index=first.add_index)
+        try:
+            third = alice.add_invoice(value=SEND_AMT)
+            invoices = iter(subscription)
+            assert next(invoices).add_index == second.add_index
+            assert next(invoices).add_index == third.add_index
+            assert subscription.add_index == third.add_index
+        finally:
+            subscription.stop()
+        assert list(subscription) == []
+
+        # a callback which raises does not end the subscription
+        delivered = []
+
+        def callback(invoice):
+            delivered.append(invoice.add_index)
+            raise ValueError("callback failed")
+
+        subscription = alice.invoice_subscription(
+            add_index=third.add_index, callback=callback
+        )
+        try:
+            fourth = alice.add_invoice(value=SEND_AMT)
+            fifth = alice.add_invoice(value=SEND_AMT)
+            wait_for(lambda: len(delivered) == 2)
+            assert delivered == [fourth.add_index, fifth.add_index]
+            assert subscription.callback_errors == 2
+        finally:
+            subscription.stop()
+
+    def test_invoice_subscription_replay(self):
+        delivered = []
+        subscription = InvoiceSubscription(
+            None, add_index=3, settle_index=3, callback=delivered.append
+        )
+        # whilst disconnected B (add_index 2) settles with settle_index 4, then A is
+        # added and settles with settle_index 5. On resubscribing lnd replays the add
+        # backlog (A, already settled) and then the settle backlog (B, A)
+        a = rpc_pb2.Invoice(
+            memo="A", add_index=4, settle_index=5, state=rpc_pb2.Invoice.SETTLED
+        )
+        b = rpc_pb2.Invoice(
+            memo="B", add_index=2, settle_index=4, state=rpc_pb2.Invoice.SETTLED
+        )
+        for invoice in (a, b, a):
+            subscription._process(invoice)
+        assert [invoice.memo for invoice in delivered] == ["A", "B"]
+        assert subscription.duplicates == 1
+        assert (subscription.add_index, subscription.settle_index) == (4, 5)
+
     def test_list_invoices(self, alice):
         gen_and_sync_lnd(alice.bitcoin, [alice])
         assert isinstance(alice.list_invoices(), rpc_pb2.ListInvoiceResponse)
 
+    def test_iter_invoices(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        for _ in range(5):
+            alice.add_invoice(value=SEND_AMT)
+        total = len(alice.list_invoices(num_max_invoices=10000).invoices)
+
+        invoices = alice.iter_invoices(page_size=2, prefetch=True)
+        add_indexes = [invoice.add_index for invoice in invoices]
+        assert len(add_indexes) == total
+        assert add_indexes == sorted(add_indexes)
+
+        # resume a scan from a saved offset
+        scan = alice.iter_invoices(page_size=2)
+        for _ in zip(range(3), scan):
+            pass
+        resumed = alice.iter_invoices(page_size=2, index_offset=scan.offset)
+        assert [invoice.add_index for invoice in resumed] == add_indexes[3:]
+
     def test_lookup_invoice(self, alice):
         gen_and_sync_lnd(alice.bitcoin, [alice])
         payment_hash = alice.add_invoice(value=SEND_AMT).r_hash
@@ -419,6 +535,17 @@ class TestNonInteractiveLightning:
         decoded_req = alice.decode_pay_req(pay_req=pay_req)
         assert isinstance(decoded_req, rpc_pb2.PayReq)
 
+    def test_decode_payment_request_locally(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        pay_req = alice.add_invoice(
+            value=SEND_AMT, memo="local", expiry=600, cltv_expiry=40
+        ).payment_request
+        decoded_req = alice.decode_pay_req(pay_req=pay_req)
+        assert alice.pay_req_decoder.misses == 1
+        assert decoded_req == alice.future.decode_pay_req(pay_req=pay_req).result()
+        assert alice.decode_pay_req(pay_req=pay_req) == decoded_req
+        assert alice.pay_req_decoder.hits == 1
+
     def test_list_payments(self, alice):
         gen_and_sync_lnd(alice.bitcoin, [alice])
         assert isinstance(alice.list_payments(), rpc_pb2.ListPaymentsResponse)
@@ -433,6 +560,17 @@ class TestNonInteractiveLightning:
         gen_and_sync_lnd(alice.bitcoin, [alice])
         assert isinstance(alice.describe_graph(), rpc_pb2.ChannelGraph)
 
+    def test_describe_graph_raw(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        raw = alice.describe_graph(raw=True)
+        assert isinstance(raw, memoryview)
+        graph = RawMessage(raw, rpc_pb2.ChannelGraph)
+        decoded = alice.describe_graph()
+        assert [node.pub_key for node in graph.nodes] == [
+            node.pub_key for node in decoded.nodes
+        ]
+        assert graph.decode() == rpc_pb2.ChannelGraph.FromString(raw.tobytes())
+
     # Skipping get_chan_info, subscribe_chan_events, get_alice_info, query_routes
 
     def test_get_network_info(self, alice):
@@ -468,6 +606,18 @@ class TestNonInteractiveLightning:
         gen_and_sync_lnd(alice.bitcoin, [alice])
         assert isinstance(alice.forwarding_history(), rpc_pb2.ForwardingHistoryResponse)
 
+    def test_iter_forwarding_events(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        end_time = int(time.time())
+        start_time = end_time - 7 * 24 * 60 * 60
+        events = alice.forwarding_history(
+            start_time=start_time, end_time=end_time
+        ).forwarding_events
+        assert list(alice.iter_forwarding_events(start_time, end_time)) == list(events)
+        assert list(
+            alice.iter_forwarding_events(start_time, end_time, shards=4)
+        ) == list(events)
+
     def test_lightning_stub(self, alice):
         gen_and_sync_lnd(alice.bitcoin, [alice])
         original_stub = alice.lightning_stub
@@ -479,6 +629,233 @@ class TestNonInteractiveLightning:
         new_stub = alice.lightning_stub
         assert original_stub != new_stub
 
+    def test_credential_cache(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        alice.get_info()
+        misses = alice.credential_cache.misses
+        for _ in range(10):
+            alice.get_info()
+        assert alice.credential_cache.misses == misses
+        assert alice.credential_cache.hits >= 10
+
+        alice.reload_credentials()
+        assert isinstance(alice.get_info(), rpc_pb2.GetInfoResponse)
+        assert alice.credential_cache.misses == misses + 1
+
+    def test_shared_channel(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        alice.get_info()
+        alice.invoice_stub
+        # Lightning and Invoices multiplex over one channel, WalletUnlocker has its own
+        assert alice._inv_channel is alice.channel
+        assert alice.wallet_unlocker_stub
+        assert len(alice.channel_manager) == 2
+
+    def test_channel_reuse(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        stub = alice.lightning_stub
+        reconnects = alice.reconnect_count
+        for _ in range(5):
+            alice.get_info()
+        # a healthy channel is never rebuilt, whatever the connectivity callback state
+        assert alice.lightning_stub is stub
+        assert alice.reconnect_count == reconnects
+        # nor by using the WalletUnlocker, unless the wallet is actually unlocked
+        with pytest.raises(grpc.RpcError):
+            alice.unlock_wallet(wallet_password="wrong password")
+        assert alice.lightning_stub is stub
+        assert alice.reconnect_count == reconnects
+
+    def test_channel_retired(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        subscription = alice.subscribe_invoices()
+        alice.regenerate_channel()
+        alice.get_info()
+        # the replaced channel stays open for the subscription still in flight on it
+        assert len(alice.channel_manager._retired) == 1
+        subscription.cancel()
+        wait_for(lambda: not alice.channel_manager._retired)
+
+    def test_future_calls(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        info = alice.future.get_info()
+        balance = alice.future.wallet_balance()
+        peers = alice.future.list_peers()
+        assert isinstance(info, grpc.Future)
+        assert info.result().identity_pubkey == alice.id()
+        assert isinstance(balance.result(), rpc_pb2.WalletBalanceResponse)
+        assert list(peers.result()) == list(alice.list_peers())
+        with pytest.raises(TypeError):
+            alice.future.subscribe_invoices()
+        # wrappers built on other client methods still return a future
+        invoice = alice.add_invoice(value=1000)
+        payment_hash = alice.future.payment_hash_of(invoice.payment_request)
+        assert isinstance(payment_hash, grpc.Future)
+        assert payment_hash.result() == invoice.r_hash
+
+    def test_snapshot(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        first = alice.snapshot()
+        assert first.info.identity_pubkey == alice.id()
+        assert isinstance(first.fee_report, rpc_pb2.FeeReportResponse)
+        assert set(first.timings) == {
+            "info",
+            "wallet_balance",
+            "channel_balance",
+            "channels",
+            "pending_channels",
+            "peers",
+            "fee_report",
+        }
+        assert first.changes is None
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        second = alice.snapshot(previous=first)
+        assert "block_height" in second.changes["info"]
+
+    def test_response_cache(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        cache = alice.enable_response_cache(follow=False)
+        try:
+            info = alice.get_info()
+            for _ in range(4):
+                assert alice.get_info() == info
+            assert cache.stats()["get_info"]["hits"] == 4
+            # each caller gets a copy, so modifying one leaves the cache intact
+            info.alias = "modified"
+            assert alice.get_info().alias != "modified"
+            cache.invalidate("get_info")
+            assert alice.get_info() is not info
+            assert cache.hit_rate == 5 / 7
+        finally:
+            alice.disable_response_cache()
+        assert alice.get_info() is not info
+
+    def test_channel_pool(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        client = lnd_grpc.Client(
+            lnd_dir=alice.lnd_dir,
+            grpc_port=alice.grpc_port,
+            network="regtest",
+            tls_cert_path=alice.tls_cert_path,
+            macaroon_path=alice.macaroon_path,
+            pool_size=3,
+            pool_strategy="least_in_flight",
+        )
+        with ThreadPoolExecutor(max_workers=9) as executor:
+            infos = list(executor.map(lambda _: client.get_info(), range(30)))
+        assert all(info.identity_pubkey == alice.id() for info in infos)
+        stats = client.channel_pool.stats()
+        assert len(stats) == 3
+        assert all(channel["calls"] > 0 for channel in stats)
+        assert client.channel_pool.in_flight == [0, 0, 0]
+
+    def test_metrics(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        client = lnd_grpc.Client(
+            lnd_dir=alice.lnd_dir,
+            grpc_port=alice.grpc_port,
+            network="regtest",
+            tls_cert_path=alice.tls_cert_path,
+            macaroon_path=alice.macaroon_path,
+        )
+        metrics = client.enable_metrics()
+        labels = {"grpc_service": "lnrpc.Lightning", "grpc_method": "GetInfo"}
+        client.get_info()
+        client.get_info()
+        with pytest.raises(grpc.RpcError):
+            client.lookup_invoice(r_hash_str="00" * 32)
+        assert metrics.handled.value(grpc_code="OK", **labels) == 2
+        assert metrics.latency.value(**labels)[0] == 2
+        assert metrics.in_flight.value(**labels) == 0
+        assert metrics.response_bytes.value(**labels)[1] > 0
+        exposition = metrics.exposition()
+        assert "# TYPE lnd_grpc_client_handling_seconds histogram" in exposition
+        assert 'grpc_method="LookupInvoice",grpc_code="UNKNOWN"' in exposition
+
+    def test_tracing(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        client = lnd_grpc.Client(
+            lnd_dir=alice.lnd_dir,
+            grpc_port=alice.grpc_port,
+            network="regtest",
+            tls_cert_path=alice.tls_cert_path,
+            macaroon_path=alice.macaroon_path,
+        )
+        tracer = client.enable_tracing()
+        with tracer.span("operation") as operation:
+            client.get_info()
+            worker = threading.Thread(target=propagate(client.wallet_balance))
+            worker.start()
+            worker.join()
+        calls = tracer.exporter.children(operation)
+        assert sorted(span.name for span in calls) == [
+            "/lnrpc.Lightning/GetInfo",
+            "/lnrpc.Lightning/WalletBalance",
+        ]
+        assert all(span.trace_id == operation.trace_id for span in calls)
+        assert all(span.attributes["rpc.grpc.status_code"] == "OK" for span in calls)
+        assert all(span.attributes["rpc.response.bytes"] > 0 for span in calls)
+
+    def test_descriptor_set(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+        assert lnd_grpc.protobuf_backend() in ("upb", "cpp", "python")
+        # a set of its own, whether or not the bundled one is installed
+        descriptor_set = DescriptorSet()
+        messages = descriptor_set.modules["lnd_grpc/protos/rpc.proto"]
+        stub = descriptor_set.stub_class("lnrpc.Lightning")(alice.authenticated_channel)
+        info = stub.GetInfo(messages.GetInfoRequest())
+        assert info.identity_pubkey == alice.get_info().identity_pubkey
+        # RPCs are bound on first use
+        assert "GetInfo" in vars(stub) and "DescribeGraph" not in vars(stub)
+        graph = stub.DescribeGraph(messages.ChannelGraphRequest())
+        assert isinstance(graph, messages.ChannelGraph)
+        assert graph.SerializeToString() == alice.describe_graph().SerializeToString()
+
+    def test_aio_client(self, alice):
+        gen_and_sync_lnd(alice.bitcoin, [alice])
+
+        async def run():
+            async with lnd_grpc.aio.Client(
+                lnd_dir=alice.lnd_dir,
+                grpc_port=alice.grpc_port,
+                network="regtest",
+                tls_cert_path=alice.tls_cert_path,
+                macaroon_path=alice.macaroon_path,
+            ) as client:
+                infos = await asyncio.gather(*(client.get_info() for _ in range(10)))
+                metrics = client.enable_metrics()
+                tracer = client.enable_tracing()
+                with tracer.span("add invoice") as parent:
+                    # spans are carried into tasks
+                    invoice = await asyncio.ensure_future(
+                        client.add_invoice(value=SEND_AMT)
+                    )
+                assert 'grpc_method="AddInvoice"' in metrics.exposition()
+                spans = {span.name: span for span in tracer.exporter.spans}
+                add_invoice = spans["/lnrpc.Lightning/AddInvoice"]
+                assert add_invoice.parent_id == parent.span_id
+                snapshot = await client.snapshot()
+                invoices = [i async for i in client.iter_invoices(page_size=2)]
+                hub = client.event_hub()
+                settled = asyncio.ensure_future(hub.wait_invoice(invoice.r_hash))
+                lookup = client.future.lookup_invoice(r_hash=invoice.r_hash)
+                assert (await lookup).r_hash == invoice.r_hash
+                assert not settled.done()
+                settled.cancel()
+                hub.stop()
+                graph = await client.graph_index(live=False)
+                assert (await client.pathfinder(graph)).graph is graph
+                subscription = client.subscribe_invoices(add_index=invoice.add_index - 1)
+                async for update in subscription:
+                    subscription.cancel()
+                    return infos, snapshot, invoices, update
+
+        infos, snapshot, invoices, update = asyncio.run(run())
+        assert all(isinstance(info, rpc_pb2.GetInfoResponse) for info in infos)
+        assert snapshot.info.identity_pubkey == infos[0].identity_pubkey
+        assert invoices[-1].add_index == update.add_index
+        assert isinstance(update, rpc_pb2.Invoice)
+
 
 class TestInteractiveLightning:
     def test_peer_connection(self, bob, carol, dave, bitcoind):
@@ -587,6 +964,30 @@ class TestInteractiveLightning:
         assert bob.check_channel(carol) is False
         assert carol.check_channel(bob) is False
 
+    def test_close_all_channels(self, bitcoind, bob, carol):
+        bob, carol = setup_nodes(bitcoind, [bob, carol])
+
+        channel_points = [channel.channel_point for channel in bob.list_channels()]
+        closer = bob.close_all_channels(max_parallel=2)
+        updates = list(closer)
+        assert closer.wait(timeout=60)
+        assert {update.channel_point for update in updates} == set(channel_points)
+        assert closer.summary()["pending"] == channel_points
+        # malformed and repeated channel points fail or close once, without hanging
+        closer = ChannelCloser(bob.close_channel, ["malformed", "malformed"])
+        assert closer.wait(timeout=60)
+        assert closer.summary()["failed"] == ["malformed"]
+        assert isinstance(closer.errors["malformed"], ValueError)
+        # a stream ending before the close is pending fails rather than hanging
+        closer = ChannelCloser(lambda channel_point: iter(()), ["unknown:0"])
+        assert closer.wait(timeout=60)
+        assert closer.summary()["failed"] == ["unknown:0"]
+        generate(bitcoind, 6)
+        gen_and_sync_lnd(bitcoind, [bob, carol])
+
+        assert bob.check_channel(carol) is False
+        assert carol.check_channel(bob) is False
+
     def test_send_payment_sync(self, bitcoind, bob, carol):
         bob, carol = setup_nodes(bitcoind, [bob, carol])
 
@@ -682,6 +1083,30 @@ class TestInteractiveLightning:
         assert inv_paid.settled is True
         assert inv_paid.amt_paid_sat == SEND_AMT
 
+    def test_payment_session(self, bitcoind, bob, carol):
+        bob, carol = setup_nodes(bitcoind, [bob, carol])
+        invoices = [carol.add_invoice(value=SEND_AMT) for _ in range(5)]
+
+        session = bob.payment_session()
+        futures = [
+            session.send(bob.send_request(payment_request=invoice.payment_request))
+            for invoice in invoices
+        ]
+        session.close()
+        responses = [future.result(timeout=60) for future in futures]
+
+        # each response is correlated to the payment which was sent
+        for invoice, response in zip(invoices, responses):
+            assert response.payment_hash == invoice.r_hash
+            assert response.payment_error == ""
+        assert session.pending == 0
+        assert len(list(session)) == len(invoices)
+
+        # the generators the session replaced still work, with a warning
+        with pytest.warns(DeprecationWarning):
+            requests = bob.send_request_generator(payment_request="lnbcrt1")
+        assert next(requests).payment_request == "lnbcrt1"
+
     def test_send_to_route_sync(self, bitcoind, bob, carol, dave):
         bob, carol, dave = setup_nodes(bitcoind, [bob, carol, dave])
         gen_and_sync_lnd(bitcoind, [bob, carol, dave])
@@ -695,6 +1120,46 @@ class TestInteractiveLightning:
         assert payment_hash in [p.payment_hash for p in bob.list_payments().payments]
         assert dave.lookup_invoice(r_hash_str=payment_hash).settled is True
 
+    def test_forwarding_events_resume(self, bitcoind, bob, carol, dave):
+        bob, carol, dave = setup_nodes(bitcoind, [bob, carol, dave])
+        gen_and_sync_lnd(bitcoind, [bob, carol, dave])
+        start_time = int(time.time()) - 60
+        for _ in range(3):
+            invoice = dave.add_invoice(value=SEND_AMT)
+            bob.send_payment_sync(payment_request=invoice.payment_request)
+        end_time = int(time.time()) + 60
+        events = list(carol.iter_forwarding_events(start_time, end_time))
+        assert len(events) == 3
+
+        # one event per page, stopping after the first
+        paginator = carol.iter_forwarding_events(start_time, end_time, page_size=1)
+        assert next(iter(paginator)) == events[0]
+        resumed = carol.iter_forwarding_events(
+            start_time, end_time, page_size=1, index_offset=paginator.offset
+        )
+        assert list(resumed) == events[1:]
+        assert resumed.pages >= 2
+
+    def test_pathfinder(self, bitcoind, bob, carol, dave):
+        bob, carol, dave = setup_nodes(bitcoind, [bob, carol, dave])
+        gen_and_sync_lnd(bitcoind, [bob, carol, dave])
+        invoice = dave.add_invoice(value=SEND_AMT)
+        pathfinder = bob.pathfinder()
+        route = pathfinder.query_routes(
+            pub_key=dave.id(), amt=SEND_AMT, final_cltv_delta=144
+        )[0]
+        expected = bob.query_routes(
+            pub_key=dave.id(), amt=SEND_AMT, final_cltv_delta=144
+        )[0]
+        assert [hop.chan_id for hop in route.hops] == [
+            hop.chan_id for hop in expected.hops
+        ]
+        assert route.total_fees_msat == expected.total_fees_msat
+        assert route.total_time_lock == expected.total_time_lock
+        bob.send_to_route_sync(payment_hash=invoice.r_hash, route=route)
+        payment_hash = dave.decode_pay_req(invoice.payment_request).payment_hash
+        assert dave.lookup_invoice(r_hash_str=payment_hash).settled is True
+
     def test_send_to_route(self, bitcoind, bob, carol, dave):
         bob, carol, dave = setup_nodes(bitcoind, [bob, carol, dave])
         gen_and_sync_lnd(bitcoind, [bob, carol, dave])
@@ -752,6 +1217,37 @@ class TestInteractiveLightning:
 
         assert isinstance(subscription.__next__(), rpc_pb2.GraphTopologyUpdate)
 
+    def test_graph_index(self, bitcoind, bob, carol):
+        bob, carol = setup_nodes(bitcoind, [bob, carol])
+        index = bob.graph_index()
+        try:
+            chan_id = bob.list_channels()[0].chan_id
+            assert index.edge(chan_id) == bob.get_chan_info(chan_id)
+            assert index.node(carol.id()).pub_key == carol.id()
+            assert index.neighbours(bob.id()) == {carol.id(): [chan_id]}
+
+            carol.update_channel_policy(
+                chan_point=None,
+                base_fee_msat=5555,
+                fee_rate=0.5555,
+                time_lock_delta=9,
+                is_global=True,
+            )
+            wait_for(lambda: index.policy(chan_id, carol.id()).fee_base_msat == 5555)
+        finally:
+            index.stop()
+
+        # a graph which cannot be loaded fails start() rather than blocking it
+        offline = lnd_grpc.Client(
+            lnd_dir=bob.lnd_dir,
+            macaroon_path=bob.macaroon_path,
+            tls_cert_path=bob.tls_cert_path,
+            network="regtest",
+            grpc_port=1,
+        )
+        with pytest.raises(grpc.RpcError):
+            offline.graph_index()
+
     def test_update_channel_policy(self, bitcoind, bob, carol):
         bob, carol = setup_nodes(bitcoind, [bob, carol])
         update = bob.update_channel_policy(
@@ -795,6 +1291,21 @@ class TestChannelBackup:
             "a contract has been fully resolved!", timeout=120
         )
 
+    def test_export_raw(self, bitcoind, bob, carol):
+        bob, carol = setup_nodes(bitcoind, [bob, carol])
+        raw = bob.export_all_channel_backups(raw=True)
+        assert isinstance(raw, memoryview)
+        snapshot = RawMessage(raw, rpc_pb2.ChanBackupSnapshot)
+        backups = snapshot.single_chan_backups.chan_backups
+        assert len(backups) == len(bob.list_channels()) == 1
+        assert isinstance(backups[0].chan_backup, memoryview)
+        assert bob.verify_chan_backup(
+            single_chan_backups=snapshot.single_chan_backups.decode()
+        )
+        assert bob.verify_chan_backup(
+            multi_chan_backup=snapshot.multi_chan_backup.decode()
+        )
+
     def test_export_verify_restore_single(self, bitcoind, bob, carol):
         bob, carol = setup_nodes(bitcoind, [bob, carol])
         funding_txid, output_index = bob.list_channels()[0].channel_point.split(":")
@@ -880,6 +1391,40 @@ class TestInvoices:
 
         assert any(invoice.settled is True for invoice in get_updates(invoice_queue))
 
+    def test_event_hub(self, bitcoind, bob, carol):
+        bob, carol = setup_nodes(bitcoind, [bob, carol])
+        hub = carol.event_hub()
+        updates = []
+        try:
+            invoices = []
+            for _ in range(3):
+                _hash, preimage = random_32_byte_hash()
+                hub.add_invoice_listener(updates.append, payment_hash=_hash)
+                carol.add_invoice(value=SEND_AMT, r_preimage=preimage)
+                invoices.append(_hash)
+            assert hub.listener_count() == 3
+
+            pay_req = carol.lookup_invoice(r_hash=invoices[1]).payment_request
+            bob.send_payment_sync(payment_request=pay_req)
+            settled = hub.wait_invoice(invoices[1], timeout=30)
+            assert settled.state == rpc_pb2.Invoice.SETTLED
+            settles = [u.r_hash for u in updates if u.state == rpc_pb2.Invoice.SETTLED]
+            assert settles == [invoices[1]]
+
+            # cancellation of a hold invoice is only reported to hold listeners
+            _hash, preimage = random_32_byte_hash()
+            states = []
+            hub.add_invoice_listener(
+                lambda invoice: states.append(invoice.state), _hash, hold=True
+            )
+            carol.add_hold_invoice(hash=_hash, value=SEND_AMT)
+            carol.cancel_invoice(payment_hash=_hash)
+            canceled = hub.wait_invoice(_hash, timeout=30)
+            assert canceled.state == rpc_pb2.Invoice.CANCELED
+            wait_for(lambda: rpc_pb2.Invoice.CANCELED in states)
+        finally:
+            hub.stop()
+
 
 class TestLoop:
     @pytest.mark.skip(reason="waiting to configure loop swapserver")
@@ -905,3 +1450,90 @@ class TestLoop:
             assert isinstance(terms, loop_client_pb2.TermsResponse)
         else:
             logging.info("test_loop_out() skipped as invoice RPC not detected")
+
+
+class TestBolt11:
+    """
+    Local decoding against the examples of the BOLT11 specification
+    """
+
+    PAYEE = "03e7156ae33b0a208d0744199163177e909e80176e55d97a2f221ede0f934dd9ad"
+    PAYMENT_HASH = "0001020304050607080900010203040506070809000102030405060708090102"
+
+    def test_decode_donation(self):
+        pay_req = bolt11.decode(
+            "lnbc1pvjluezsp5zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zygspp5qqqsyq"
+            "cyq5rqwzqfqqqsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqypqdpl2pkx2ctnv5sxxmmwwd5kgetjypeh"
+            "2ursdae8g6twvus8g6rfwvs8qun0dfjkxaq9qrsgq357wnc5r2ueh7ck6q93dj32dlqnls087fxd"
+            "wk8qakdyafkq3yap9us6v52vjjsrvywa6rt52cm9r9zqt8r2t7mlcwspyetp5h2tztugp9lfyql"
+        )
+        assert pay_req.destination == self.PAYEE
+        assert pay_req.payment_hash == self.PAYMENT_HASH
+        assert pay_req.num_satoshis == 0
+        assert pay_req.timestamp == 1496314658
+        assert pay_req.description == "Please consider supporting this project"
+
+    def test_decode_coffee(self):
+        # the signed data is not a whole number of bytes, so must be zero padded
+        pay_req = bolt11.decode(
+            "lnbc2500u1pvjluezsp5zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zygspp5qq"
+            "qsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqypqdq5xysxxatsyp3k7enxv4jsxqzp"
+            "u9qrsgquk0rl77nj30yxdy8j9vdx85fkpmdla2087ne0xh8nhedh8w27kyke0lp53ut353s06fv3q"
+            "fegext0eh0ymjpf39tuven09sam30g4vgpfna3rh",
+            network="mainnet",
+        )
+        assert pay_req.destination == self.PAYEE
+        assert pay_req.num_satoshis == 250000
+        assert pay_req.expiry == 60
+        assert pay_req.description == "1 cup coffee"
+
+    def test_decode_unicode_description(self):
+        pay_req = bolt11.decode(
+            "lnbc2500u1pvjluezsp5zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zygspp5qq"
+            "qsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqypqdpquwpc4curk03c9wlrswe78q4e"
+            "yqc7d8d0xqzpu9qrsgqhtjpauu9ur7fw2thcl4y9vfvh4m9wlfyz2gem29g5ghe2aak2pm3ps8fdh"
+            "tceqsaagty2vph7utlgj48u0ged6a337aewvraedendscp573dxr"
+        )
+        assert pay_req.destination == self.PAYEE
+        assert pay_req.description == "ナンセンス 1杯"
+
+    def test_decode_description_hash(self):
+        pay_req = bolt11.decode(
+            "lnbc20m1pvjluezsp5zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zygspp5qqqs"
+            "yqcyq5rqwzqfqqqsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqypqhp58yjmdan79s6qqdhdzgynm4zwqd"
+            "5d7xmw5fk98klysy043l2ahrqs9qrsgq7ea976txfraylvgzuxs8kgcw23ezlrszfnh8r6qtfpr6c"
+            "xga50aj6txm9rxrydzd06dfeawfk6swupvz4erwnyutnjq7x39ymw6j38gp7ynn44"
+        )
+        assert pay_req.destination == self.PAYEE
+        assert pay_req.num_satoshis == 2000000
+        assert pay_req.description_hash == (
+            "3925b6f67e2c340036ed12093dd44e0368df1b6ea26c53dbe4811f58fd5db8c1"
+        )
+
+    def test_decode_rejected(self):
+        # fallback addresses are left to lnd
+        with pytest.raises(bolt11.Bolt11Error):
+            bolt11.decode(
+                "lntb20m1pvjluezsp5zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zygshp5"
+                "8yjmdan79s6qqdhdzgynm4zwqd5d7xmw5fk98klysy043l2ahrqspp5qqqsyqcyq5rqwzqfqq"
+                "qsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqypqfpp3x9et2e20v6pu37c5d9vax37wxq72un989qr"
+                "sgqdj545axuxtnfemtpwkc45hx9d2ft7x04mt8q7y6t0k2dge9e7h8kpy9p34ytyslj3yu569"
+                "aalz2xdk8xkd7ltxqld94u8h2esmsmacgpghe9k8"
+            )
+        # both a description and a description hash, which lnd rejects
+        with pytest.raises(bolt11.Bolt11Error):
+            bolt11.decode(
+                "lnbc20m1pvjluezpp5qqqsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqypqdq5"
+                "xysxxatsyp3k7enxv4jshp58yjmdan79s6qqdhdzgynm4zwqd5d7xmw5fk98klysy043l2ahr"
+                "qsl3wu0p8rkcsu8awmw9c7dzn7kmgm2wesus35ee99q0sq3r00ckny0e3cvv0sararygphgwj"
+                "pgecpwlkn00feasxzph0yuxjsl8av62gq20qw9v"
+            )
+        # the coffee example is a mainnet request
+        with pytest.raises(bolt11.Bolt11Error):
+            bolt11.decode(
+                "lnbc2500u1pvjluezsp5zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zyg3zygspp"
+                "5qqqsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqqqsyqcyq5rqwzqfqypqdq5xysxxatsyp3k7enxv"
+                "4jsxqzpu9qrsgquk0rl77nj30yxdy8j9vdx85fkpmdla2087ne0xh8nhedh8w27kyke0lp53u"
+                "t353s06fv3qfegext0eh0ymjpf39tuven09sam30g4vgpfna3rh",
+                network="regtest",
+            )